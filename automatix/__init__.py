@@ -3,25 +3,27 @@ import argparse
 import os
 import subprocess
 import sys
-from time import time, strftime, gmtime
-
-from .batch_runner import get_script_and_batch_items, run_batch_items
-from .config import init_logger, CONFIG, LOG, VERSION, arguments, MAGIC_SELECTION_INT
-from .helpers import empty_queued_input_data, selector
-from .parallel_runner import run_parallel_screens
+from importlib import metadata
+from time import monotonic, perf_counter, time, strftime, gmtime
+
+from .batch_runner import check_undefined_vars, get_script_and_batch_items, run_batch_items
+from .config import init_logger, CONFIG, LOG, VERSION, arguments, MAGIC_SELECTION_INT, DEFAULT_PROFILE_DIR
+from .events import EVENTS, init_events
+from .helpers import StartupTimer, empty_queued_input_data, selector
+from .profiling import PROFILER, clear_profiles, summarize
 from .progress_bar import setup_scroll_area, destroy_scroll_area
 
 
 def check_for_original_automatix():
-    p = subprocess.run('pip list | grep automatix', shell=True, stdout=subprocess.PIPE)
-
-    for line in p.stdout.decode().split('\n'):
-        if line.strip().split(' ', maxsplit=1)[0].strip() == 'automatix_cmd':
-            raise Exception(
-                'This package MUST NOT be installed along with the "automatix_cmd" package.'
-                ' Both packages use the same entry point and module names and therefore'
-                ' are conflicting. Please uninstall automatix AND automatix_cmd first,'
-                ' THEN reinstall the package you want to use!')
+    try:
+        metadata.distribution('automatix_cmd')
+    except metadata.PackageNotFoundError:
+        return
+    raise Exception(
+        'This package MUST NOT be installed along with the "automatix_cmd" package.'
+        ' Both packages use the same entry point and module names and therefore'
+        ' are conflicting. Please uninstall automatix AND automatix_cmd first,'
+        ' THEN reinstall the package you want to use!')
 
 
 def run_startup_script():
@@ -64,7 +66,10 @@ def check_screen():
 
 
 def main():
+    # Imports are not included, use `python -X importtime` for them
+    timer = StartupTimer(start=perf_counter())
     check_for_original_automatix()
+    timer.lap('package check')
 
     if os.getenv('AUTOMATIX_SHELL'):
         print('You are running Automatix from an interactive shell of an already running Automatix!')
@@ -74,12 +79,37 @@ def main():
             sys.exit(0)
 
     args = arguments()
+    timer.lap('arguments')
+    if args.profile or args.profile_steps:
+        # Absolute path, because the parallel processes get the arguments as well
+        args.profile = os.path.abspath(args.profile or DEFAULT_PROFILE_DIR)
+        clear_profiles(directory=args.profile)
+        PROFILER.start(directory=args.profile, steps=args.profile_steps)
     run_startup_script()
+    timer.lap('startup script')
 
     starttime = setup(args=args)
+    timer.lap('logger setup')
 
     script, batch_items = get_script_and_batch_items(args=args)
+    timer.lap('script loading')
+    LOG.debug(timer.summary())
+    check_undefined_vars(script=script, batch_items=batch_items)
+
+    init_events(config=CONFIG, main=True)
+    run_start = monotonic()
+    EVENTS.emit('run_start', script=os.path.basename(script['_script_file_path']), version=VERSION,
+                parallel=bool(args.vars_file and args.parallel))
+    try:
+        run(script=script, batch_items=batch_items, args=args, starttime=starttime)
+    finally:
+        EVENTS.emit('run_end', script=os.path.basename(script['_script_file_path']), duration=monotonic() - run_start)
+        if PROFILER.enabled:
+            PROFILER.stop()
+            LOG.info(summarize(directory=args.profile))
+
 
+def run(script: dict, batch_items, args: argparse.Namespace, starttime: float):
     if args.jump_to == MAGIC_SELECTION_INT:
         # next(iter(pi.items())) is here needed, because the pipeline items are all dictionaries with only one key.
         pipeline_items = [next(iter(pi.items())) for pi in script['pipeline']]
@@ -92,7 +122,14 @@ def main():
         )
 
     if args.vars_file and args.parallel:
-        check_screen()
+        if args.headless:
+            from .headless_runner import run_parallel_headless
+
+            sys.exit(run_parallel_headless(script=script, batch_items=batch_items, args=args))
+        if CONFIG['parallel_backend'] == 'screen':
+            check_screen()
+        from .parallel_runner import run_parallel_screens
+
         run_parallel_screens(script=script, batch_items=batch_items, args=args)
         sys.exit(0)
 
@@ -1,12 +1,99 @@
 import os
+import re
 import sys
 from argparse import Namespace
 from collections import OrderedDict
 from functools import cached_property
+from time import monotonic
+from typing import Iterable, Iterator
 
-from .command import Command, AbortException, SkipBatchItemException, PERSISTENT_VARS, ReloadFromFile
-from .config import get_script
+from .command import Command, AbortException, SkipBatchItemException, PERSISTENT_VARS, ReloadFromFile, parse_key
+from .config import get_cache_dir, get_script
 from .environment import PipelineEnvironment
+from .template import compile_template
+
+
+PYTHON_VAR_ASSIGNMENT = re.compile(r'VARS\[[\'"](\w+)[\'"]\]\s*=[^=]|VARS\.(\w+)\s*=[^=]')
+# Variables set this way cannot be determined without executing the python command
+PYTHON_DYNAMIC_VARS = re.compile(r'VARS\.(update|setdefault|__setitem__)\s*\(|setattr\(\s*VARS\b')
+PIPELINES = ['always', 'pipeline', 'cleanup']
+
+
+def find_undefined_vars(script: dict, config: dict, fields: Iterable[str] = ()) -> list[str]:
+    """
+    Find references to undefined variables, constants and systems in the commands of the script.
+
+    Variables of assignments (also in python commands) are considered as defined,
+    as well as the variables and systems in the fields of the vars file (e.g. "vars:myvar").
+    If a python command sets variables dynamically (e.g. `VARS.update(...)`), variables are not checked.
+    """
+    variables, systems = _get_defined_fields(script=script, config=config, fields=fields)
+    commands = list(_iter_commands(script=script))
+    variables = _add_assigned_vars(variables=variables, commands=commands)
+
+    messages = []
+    for pipeline, index, _, _, value in commands:
+        try:
+            references = compile_template(value).references
+        except (ValueError, TypeError):
+            continue  # Syntax errors are reported on execution
+        for name, attribute in sorted(references, key=str):
+            if _is_undefined(name=name, attribute=attribute, variables=variables, systems=systems, config=config):
+                reference = f'{name}.{attribute}' if attribute else name
+                messages.append(f'[{pipeline}:{index}] "{reference}" is not defined.')
+    return messages
+
+
+def _iter_commands(script: dict) -> Iterator[tuple[str, int, str | None, str, str]]:
+    """Pipeline, index, assignment variable, command type and command of all commands"""
+    for pipeline in PIPELINES:
+        for index, cmd in enumerate(script.get(pipeline) or []):
+            orig_key, value = next(iter(cmd.items()))
+            _, assignment_var, key = parse_key(key=orig_key)
+            if isinstance(value, dict):
+                value = f'{{{next(iter(value))}}}'  # see Command.__init__
+            yield pipeline, index, assignment_var, key, str(value)
+
+
+def _add_assigned_vars(variables: set, commands: list[tuple]) -> set | None:
+    """Add the variables of assignments, None if python commands set variables dynamically"""
+    for _, _, assignment_var, key, value in commands:
+        if assignment_var:
+            variables.add(assignment_var)
+        if key == 'python':
+            if PYTHON_DYNAMIC_VARS.search(value):
+                return None
+            variables.update(match.group(1) or match.group(2) for match in PYTHON_VAR_ASSIGNMENT.finditer(value))
+    return variables
+
+
+def _get_defined_fields(script: dict, config: dict, fields: Iterable[str]) -> tuple[set, set]:
+    """Variables and systems defined in the script and the fields of the vars file"""
+    variables = set(script.get('vars') or {})
+    systems = set(script.get('systems') or {})
+    if config['teamvault']:
+        variables.update(script.get('secrets') or {})
+    for field in fields:
+        key_type, _, name = field.partition(':')
+        match key_type:
+            case 'vars' | 'secrets':
+                variables.add(name)
+            case 'systems':
+                systems.add(name)
+    return variables, systems
+
+
+def _is_undefined(name, attribute: str | None, variables: set | None, systems: set, config: dict) -> bool:
+    """:param variables: None, if the variables are unknown"""
+    match name:
+        case 'CONST':
+            return attribute is not None and attribute not in config['constants']
+        case 'SYSTEMS':
+            return attribute is not None and attribute not in systems
+        case 'PVARS':
+            return False  # only known at runtime
+        case _:
+            return variables is not None and isinstance(name, str) and name not in variables
 
 
 class Automatix:
@@ -36,7 +123,12 @@ class Automatix:
         if self.env.config.get('bundlewrap'):
             from .bundlewrap import BWCommand, AutomatixBwRepo
 
-            self.env.config['bw_repo'] = AutomatixBwRepo(repo_path=os.environ.get('BW_REPO_PATH', '.'))
+            if 'bw_repo' not in self.env.config:
+                # Shared by all batch items, the repository is loaded on first use
+                self.env.config['bw_repo'] = AutomatixBwRepo(
+                    repo_path=os.environ.get('BW_REPO_PATH', '.'),
+                    snapshot_dir=f'{get_cache_dir()}/bundlewrap' if self.env.config['bundlewrap_snapshot'] else None,
+                )
             return BWCommand
         else:
             return Command
@@ -148,7 +240,12 @@ class Automatix:
         self.env.LOG.info('------------------------------')
         self.env.LOG.info(f' --- Start {name.upper()} pipeline ---')
 
-        self._execute_command_list(name=name, start_index=start_index, treat_as_main=treat_as_main)
+        self.env.emit('pipeline_start', pipeline=name)
+        start = monotonic()
+        try:
+            self._execute_command_list(name=name, start_index=start_index, treat_as_main=treat_as_main)
+        finally:
+            self.env.emit('pipeline_end', pipeline=name, duration=monotonic() - start)
 
         print()
         self.env.LOG.info(f' --- End {name.upper()} pipeline ---')
@@ -1,3 +1,4 @@
+from automatix.automatix import find_undefined_vars
 from automatix.command import Command
 from tests.test_environment import testauto, environment
 
@@ -32,3 +33,39 @@ def test__automatix__set_command_count():
     testauto.env.command_count = None
     testauto.set_command_count()
     assert testauto.env.command_count == len_always + len_main + len_cleanup
+
+
+def test__find_undefined_vars():
+    script = {
+        'systems': {'mysystem': 'example.com'},
+        'vars': {'defined': 'yes'},
+        'always': [{'assigned=local': 'echo {defined}'}],
+        'pipeline': [
+            {'python': 'VARS.from_python = 1'},
+            {'local': 'echo {defined} {assigned} {from_python} {from_file} {PVARS.runtime}'},
+            {'remote@mysystem': 'echo {SYSTEMS.mysystem} {CONST.myconst}'},
+            {'local': 'echo {undefined} {SYSTEMS.unknown} {CONST.unknown}'},
+        ],
+        'cleanup': [{'local': {'undefined_cleanup': None}}],
+    }
+    config = {'constants': {'myconst': 'x'}, 'teamvault': False}
+
+    assert find_undefined_vars(script=script, config=config, fields=['label', 'vars:from_file']) == [
+        '[pipeline:3] "CONST.unknown" is not defined.',
+        '[pipeline:3] "SYSTEMS.unknown" is not defined.',
+        '[pipeline:3] "undefined" is not defined.',
+        '[cleanup:0] "undefined_cleanup" is not defined.',
+    ]
+    assert '[pipeline:1] "from_file" is not defined.' in find_undefined_vars(script=script, config=config)
+
+
+def test__find_undefined_vars__dynamic_python_vars():
+    script = {
+        'pipeline': [
+            {'python': 'VARS.update(generate_vars())'},
+            {'local': 'echo {generated} {CONST.unknown}'},
+        ],
+    }
+    config = {'constants': {}, 'teamvault': False}
+
+    assert find_undefined_vars(script=script, config=config) == ['[pipeline:1] "CONST.unknown" is not defined.']
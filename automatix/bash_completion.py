@@ -1,17 +1,8 @@
-import locale
-import subprocess
 from argparse import Action, Namespace
 
 from argcomplete import warn
 
-from .helpers import read_yaml, search_script
-
-
-def _call(*args, **kwargs):
-    try:
-        return subprocess.check_output(*args, **kwargs).decode(locale.getpreferredencoding()).splitlines()
-    except subprocess.CalledProcessError:
-        return []
+from .script_catalog import ScriptCatalog, complete_path
 
 
 class ScriptFileCompleter:
@@ -19,45 +10,34 @@ class ScriptFileCompleter:
     Scriptfile completer
     """
 
-    def __init__(self, script_dir: str):
-        self.script_dir = script_dir
+    def __init__(self, catalog: ScriptCatalog):
+        self.catalog = catalog
 
     def __call__(self, prefix: str, **kwargs):
         completion = []
         try:
-            completion.extend(self.find_dirs_and_files(root_path='.', prefix=prefix))
-            completion.extend(self.find_dirs_and_files(root_path=self.script_dir, prefix=prefix))
+            completion.extend(complete_path(root_path='.', prefix=prefix))
+            completion.extend(self.catalog.complete(prefix=prefix))
         except Exception as exc:
             warn(f'Shell completion failed: {repr(exc)}')
         return completion
 
-    def find_dirs_and_files(self, root_path: str, prefix: str) -> list:
-        completion = []
-        pre_len = len(root_path) + 1
-        directories = _call(["bash", "-c", f"compgen -A directory -- '{root_path}/{prefix}'"])
-        completion += [f'{d[pre_len:]}/' for d in directories]
-        for ext in ['yaml', 'yml']:
-            files = _call(["bash", "-c", f"compgen -A file -X '!*.{ext}' -- '{root_path}/{prefix}'"])
-            completion += [f[pre_len:] for f in files]
-        return completion
-
 
 class ScriptFieldCompleter:
-    def __init__(self, script_dir: str):
-        self.script_dir = script_dir
+    def __init__(self, catalog: ScriptCatalog):
+        self.catalog = catalog
 
     def __call__(self, action: Action, parsed_args: Namespace, **kwargs):
         try:
             if parsed_args.scriptfile is None:
                 return []
 
-            s_file = search_script(name=parsed_args.scriptfile, script_dir=self.script_dir, non_interactive=True)
+            s_file = self.catalog.search(name=parsed_args.scriptfile, non_interactive=True)
             if not s_file:
                 warn('Script not found or multiple options. Cannot complete.')
                 return []
 
-            script = read_yaml(s_file)
-            completion = [f'{key}=' for key in script.get(action.dest, {}).keys()]
+            completion = [f'{key}=' for key in self.catalog.fields(path=s_file).get(action.dest, [])]
 
             return completion
         except Exception as exc:
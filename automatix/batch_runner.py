@@ -1,59 +1,121 @@
 import sys
 from argparse import Namespace
 from copy import deepcopy
-from csv import DictReader
-from typing import Callable
+from time import monotonic
+from typing import Callable, Iterable, Iterator
 
-from .automatix import Automatix
+from .automatix import Automatix, find_undefined_vars
 from .command import SkipBatchItemException, AbortException
 from .config import CONFIG, get_script, LOG, update_script_from_row, collect_vars, SCRIPT_FIELDS
+from .events import EVENTS
+from .helpers import empty_queued_input_data
+from .vars_file import VarsFile
 
 
-def get_script_and_batch_items(args: Namespace) -> (dict, list):
+def get_script_and_batch_items(args: Namespace) -> (dict, list | VarsFile):
     script = get_script(args=args)
 
     # Empty item means: there is nothing to update, take the script as it is
-    batch_items: list[dict] = [{}]
+    batch_items: list[dict] | VarsFile = [{}]
     if args.vars_file:
-        with open(args.vars_file) as csvfile:
-            batch_items = list(DictReader(filter(lambda row: row[0] != '#', csvfile)))
+        batch_items = VarsFile(path=args.vars_file)
 
     return script, batch_items
 
 
-def create_automatix_list(script: dict, batch_items: list, args: Namespace) -> list[Automatix]:
-    automatix_list = []
-    for i, row in enumerate(batch_items, start=1):
-        script_copy = deepcopy(script)
-        script_copy['_batch_mode'] = len(batch_items) > 1
-        script_copy['_batch_items_count'] = len(batch_items)
+def check_undefined_vars(script: dict, batch_items: list[dict] | VarsFile):
+    """Warn once for all batch items about undefined variables, before anything is executed"""
+    fields = batch_items.fields if isinstance(batch_items, VarsFile) else set().union(*batch_items)
+    if not (messages := find_undefined_vars(script=script, config=CONFIG, fields=fields)):
+        return
+    for message in messages:
+        LOG.warning(message)
+    empty_queued_input_data()
+    try:
+        answer = input('Do you want to proceed? Then type "yes" and ENTER.\n')
+    except EOFError:  # No user to ask, e.g. stdin is closed
+        answer = ''
+    if answer != 'yes':
+        LOG.error('Aborted because of undefined variables.')
+        sys.exit(1)
+
+
+def create_item_script(script: dict, row: dict, index: int, batch_items_count: int) -> dict:
+    """
+    Copy of the script for one batch item. Only the fields, which are changed per item,
+    are copied. Pipelines and all other parts are shared between the batch items.
+    """
+    item_script = script.copy()
+    for field in SCRIPT_FIELDS:
+        if field in script:
+            item_script[field] = deepcopy(script[field])
+    item_script['_batch_mode'] = batch_items_count > 1
+    item_script['_batch_items_count'] = batch_items_count
+
+    update_script_from_row(row=row.copy(), script=item_script, index=index)
+    return item_script
+
+
+def prefetch_secrets(script: dict, batch_items: list[dict] | VarsFile):
+    """Fetch the secrets of all batch items at once, so identical secrets are fetched only once"""
+    from .teamvault import SECRETS
 
-        update_script_from_row(row=row, script=script_copy, index=i)
+    secrets = set(script.get('secrets', {}).values())
+    for row in batch_items:
+        secrets.update(value for key, value in row.items() if key.startswith('secrets:') and value)
+    LOG.debug('Prefetched %s TeamVault secrets', SECRETS.prefetch(secrets))
 
-        variables = collect_vars(script_copy)
 
-        auto = Automatix(
-            script=script_copy,
+def create_automatix_list(script: dict, batch_items: list[dict] | VarsFile, args: Namespace) -> Iterator[Automatix]:
+    """Yield the Automatix objects one after the other, when they are needed"""
+    batch_items_count = len(batch_items)
+    if CONFIG['teamvault']:
+        prefetch_secrets(script=script, batch_items=batch_items)
+    for i, row in enumerate(batch_items, start=1):
+        item_script = create_item_script(script=script, row=row, index=i, batch_items_count=batch_items_count)
+
+        variables = collect_vars(item_script)
+
+        yield Automatix(
+            script=item_script,
             variables=variables,
             config=CONFIG,
             script_fields=SCRIPT_FIELDS,
             cmd_args=args,
             batch_index=i,
         )
-        automatix_list.append(auto)
-    return automatix_list
 
 
-def run_automatix_list(automatix_list: list[Automatix], send_status_callback: Callable = None):
+def emit_status(auto: Automatix, running: bool):
+    """Item states for sequential processing, parallel processing reports them from the manager"""
+    finished = auto.env.batch_index - 1 if running else auto.env.batch_index
+    EVENTS.emit(
+        'items_status',
+        waiting=auto.env.batch_items_count - auto.env.batch_index,
+        running=1 if running else 0,
+        user_input=0,
+        finished=finished,
+        count=auto.env.batch_items_count,
+    )
+
+
+def run_automatix_list(automatix_list: Iterable[Automatix], send_status_callback: Callable = None):
     for auto in automatix_list:
         auto.set_command_count()
         auto.env.attach_logger()
         auto.env.reinit_logger()
         if send_status_callback:
             auto.env.send_status = send_status_callback
+        if not send_status_callback:
+            emit_status(auto=auto, running=True)
+        auto.env.emit('item_start')
+        start = monotonic()
+        status = 'aborted'
         try:
             auto.run()
+            status = 'finished'
         except SkipBatchItemException as exc:
+            status = 'skipped'
             LOG.info(str(exc))
             LOG.notice('=====> Jumping to next batch item.')
             continue
@@ -63,8 +125,17 @@ def run_automatix_list(automatix_list: list[Automatix], send_status_callback: Ca
             print()
             LOG.warning('Aborted by user. Exiting.')
             sys.exit(130)
+        except EOFError:
+            print()
+            LOG.error('No user input available. Exiting.')
+            sys.exit(1)
+        finally:
+            auto.env.close_connections()
+            auto.env.emit('item_end', status=status, duration=monotonic() - start, user_wait=auto.env.user_wait)
+            if not send_status_callback:
+                emit_status(auto=auto, running=False)
 
 
-def run_batch_items(script: dict, batch_items: list, args: Namespace):
+def run_batch_items(script: dict, batch_items: list | VarsFile, args: Namespace):
     automatix_list = create_automatix_list(script=script, batch_items=batch_items, args=args)
     run_automatix_list(automatix_list=automatix_list)
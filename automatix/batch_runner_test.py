@@ -0,0 +1,47 @@
+from unittest import mock
+
+import pytest
+
+from automatix.batch_runner import check_undefined_vars, create_item_script
+
+
+def test__create_item_script():
+    script = {
+        'name': 'test',
+        'systems': {'mysystem': 'old.example.com'},
+        'vars': {'myvar': 'old', 'mylist': [1, 2]},
+        'pipeline': [{'local': 'echo {myvar}'}],
+    }
+    row = {'label': 'mylabel', 'systems:mysystem': 'new.example.com', 'vars:myvar': 'new'}
+
+    item_script = create_item_script(script=script, row=row, index=2, batch_items_count=3)
+    item_script['vars']['mylist'].append(3)
+
+    assert item_script['name'] == 'test (2 | mylabel)'
+    assert item_script['systems'] == {'mysystem': 'new.example.com'}
+    assert item_script['vars']['myvar'] == 'new'
+    assert item_script['_batch_mode'] is True
+    assert item_script['pipeline'] is script['pipeline']
+
+    # Neither the script nor the row are changed
+    assert script['name'] == 'test'
+    assert script['systems'] == {'mysystem': 'old.example.com'}
+    assert script['vars'] == {'myvar': 'old', 'mylist': [1, 2]}
+    assert 'label' in row
+
+
+def test__check_undefined_vars__asks_once_for_all_items():
+    script = {'name': 'test', 'pipeline': [{'local': 'echo {myvar} {other}'}]}
+    batch_items = [{'vars:myvar': '1'}, {'vars:myvar': '2'}]
+
+    with mock.patch('builtins.input', return_value='yes') as input_mock:
+        check_undefined_vars(script=script, batch_items=batch_items)
+    input_mock.assert_called_once()
+
+    with mock.patch('builtins.input', side_effect=EOFError), pytest.raises(SystemExit) as exc_info:
+        check_undefined_vars(script=script, batch_items=batch_items)
+    assert exc_info.value.code == 1
+
+    with mock.patch('builtins.input') as input_mock:
+        check_undefined_vars(script=script, batch_items=[{'vars:myvar': '1', 'vars:other': '2'}])
+    input_mock.assert_not_called()
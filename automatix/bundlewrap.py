@@ -1,3 +1,9 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from os.path import abspath
+
 from bundlewrap.exceptions import NoSuchNode, NoSuchGroup
 from bundlewrap.group import Group
 from bundlewrap.node import Node
@@ -6,52 +12,176 @@ from bundlewrap.repo import Repository
 from .command import Command, PA
 
 
+@dataclass(frozen=True)
+class Resolution:
+    kind: str  # 'node' or 'group'
+    name: str
+    hostnames: dict[str, str]  # node name -> hostname
+
+
+def get_repo_hash(repo_path: str) -> str:
+    """
+    Hash of the paths, sizes and modification times of all files in the repository.
+
+    Hostnames may also depend on bundles (e.g. metadata reactors), items or libs,
+    so all files are considered. Only the metadata is read, not the contents.
+    """
+    sha = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(repo_path):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith('.') and name != '__pycache__')
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # e.g. broken symlinks
+            sha.update(f'{os.path.relpath(path, repo_path)}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+    return sha.hexdigest()
+
+
 class AutomatixBwRepo(Repository):
+    """
+    Bundlewrap repository, which is loaded on first access of a repository attribute.
+
+    Resolved system names are cached until reload(). With a snapshot directory the hostnames
+    of all nodes and the members of all groups are stored keyed by a hash of the repository files,
+    so later runs, which only need hostnames, do not load the repository at all.
+    """
+
+    def __init__(self, repo_path: str, snapshot_dir: str | None = None):
+        # Repository.__init__ is called in _load()
+        self._loaded = False
+        self._repo_path = repo_path
+        self._snapshot_dir = snapshot_dir
+        self._snapshot = None
+        self._snapshot_read = False
+        self._snapshot_path = None  # Depends on the state of the repository, computed once per load
+        self._resolutions: dict[str, Resolution] = {}
+
+    def __getattr__(self, name):
+        # Only called for attributes, which do not exist, i.e. all repository attributes before loading
+        if self.__dict__.get('_loaded', True):
+            raise AttributeError(name)
+        self._load()
+        return getattr(self, name)
+
+    def _load(self):
+        self._loaded = True
+        Repository.__init__(self, repo_path=self._repo_path)
+        if self._snapshot_dir and not os.path.isfile(self._get_snapshot_path()):
+            self._write_snapshot()
+
     def reload(self):
-        self.__init__(repo_path=self.path)
+        self._resolutions.clear()
+        self._snapshot_path = None  # The repository may have changed
+        self._load()
+
+    def resolve(self, name: str) -> Resolution:
+        """Resolve a node or group name, raises NoSuchNode if it is neither"""
+        if (resolution := self._resolutions.get(name)) is None:
+            resolution = self._resolutions[name] = self._resolve(name=name)
+        return resolution
+
+    def _resolve(self, name: str) -> Resolution:
+        if not self._loaded and (snapshot := self._read_snapshot()) is not None:
+            if name in snapshot['nodes']:
+                return Resolution(kind='node', name=name, hostnames={name: snapshot['nodes'][name]})
+            if name in snapshot['groups']:
+                return Resolution(kind='group', name=name, hostnames={
+                    node_name: snapshot['nodes'][node_name] for node_name in snapshot['groups'][name]
+                })
+            raise NoSuchNode(name)
+
+        try:
+            node: Node = self.get_node(name)
+            return Resolution(kind='node', name=node.name, hostnames={node.name: node.hostname})
+        except NoSuchNode as exc:
+            try:
+                group: Group = self.get_group(name)
+            except NoSuchGroup:
+                raise exc
+            return Resolution(kind='group', name=group.name, hostnames={
+                node.name: node.hostname for node in group.nodes
+            })
+
+    def _get_snapshot_path(self) -> str:
+        if self._snapshot_path is None:
+            root_path = self._discover_root_path(abspath(self._repo_path))
+            self._snapshot_path = os.path.join(self._snapshot_dir, f'{get_repo_hash(repo_path=root_path)}.json')
+        return self._snapshot_path
+
+    def _read_snapshot(self) -> dict | None:
+        if not self._snapshot_read and self._snapshot_dir:
+            self._snapshot_read = True
+            try:
+                with open(self._get_snapshot_path()) as f:
+                    self._snapshot = json.load(f)
+            except (OSError, ValueError):
+                pass  # No snapshot for this state of the repository yet
+        return self._snapshot
+
+    def _write_snapshot(self):
+        snapshot = {
+            'nodes': {node.name: node.hostname for node in self.nodes},
+            'groups': {group.name: [node.name for node in group.nodes] for group in self.groups},
+        }
+        path = self._get_snapshot_path()
+        os.makedirs(self._snapshot_dir, exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f'{path}.tmp', path)
 
 
 class BWCommand(Command):
     def _generate_python_vars(self):
-        locale_vars = {'AUTOMATIX_BW_REPO': self.env.config['bw_repo']}
+        bw_repo: AutomatixBwRepo = self.env.config['bw_repo']
+        locale_vars = {'AUTOMATIX_BW_REPO': bw_repo}
         for key, value in self.env.systems.items():
             if not value.startswith('hostname!'):
                 try:
-                    self.env.config['bw_repo'].get_node(value)
+                    bw_repo.resolve(value)
                 except NoSuchNode:
-                    try:
-                        self.env.config['bw_repo'].get_group(value)
-                    except NoSuchGroup:
-                        self.env.LOG.warning(f'"{value}" is neither a BW node nor a BW group')
+                    self.env.LOG.warning(f'"{value}" is neither a BW node nor a BW group')
         locale_vars['VARS'] = self.env.vars
-        locale_vars['NODES'] = BWNodesWrapper(repo=self.env.config['bw_repo'], systems=self.env.systems)
+        locale_vars['NODES'] = BWNodesWrapper(repo=bw_repo, systems=self.env.systems)
         return locale_vars
 
+    def _get_hostnames(self, system_name: str) -> dict[str, str]:
+        system = self.env.systems[system_name]
+        if system.startswith('hostname!'):
+            return {system_name: system.replace('hostname!', '')}
+        return self.env.config['bw_repo'].resolve(system).hostnames
+
     def _remote_action(self) -> int:
-        bw_repo: Repository = self.env.config['bw_repo']
+        if len(system_names := self.get_system_names()) > 1:
+            return self._remote_multi_host_action(system_names=system_names)
+
+        bw_repo: AutomatixBwRepo = self.env.config['bw_repo']
         system = self.get_system()
         if system.startswith('hostname!'):
             return self._remote_action_on_hostname(hostname=system.replace('hostname!', ''))
-        try:
-            node: Node = bw_repo.get_node(system)
-            return self._remote_action_on_hostname(hostname=node.hostname)
-        except NoSuchNode as exc:
-            try:
-                group: Group = bw_repo.get_group(system)
-            except NoSuchGroup:
-                raise exc
+        resolution = bw_repo.resolve(system)
+        if resolution.kind == 'node':
+            return self._remote_action_on_hostname(hostname=resolution.hostnames[resolution.name])
+
+        print()
+        if self.remote_parallel > 1:
+            self.env.LOG.info(
+                f' --- Executing command for all nodes in BW group >{resolution.name}<'
+                f' (max. {self.remote_parallel} parallel) ---')
+            return self._remote_fanout(hostnames=resolution.hostnames)
+
+        self.env.LOG.info(f' --- Executing command for all nodes in BW group >{resolution.name}< ---')
+        for node_name, hostname in resolution.hostnames.items():
             print()
-            self.env.LOG.info(f' --- Executing command for all nodes in BW group >{group.name}< ---')
-            for node in group.nodes:
-                print()
-                self.env.LOG.info(f'- {node.name} -')
-                self._remote_bw_group_action(node=node)
-            return 0
-
-    def _remote_bw_group_action(self, node: Node):
-        return_code = self._remote_action_on_hostname(hostname=node.hostname)
+            self.env.LOG.info(f'- {node_name} -')
+            self._remote_bw_group_action(node_name=node_name, hostname=hostname)
+        return 0
+
+    def _remote_bw_group_action(self, node_name: str, hostname: str):
+        return_code = self._remote_action_on_hostname(hostname=hostname)
         if return_code != 0:
-            self.env.LOG.error(f'Command ({self.index}) on {node.name} failed with return code {return_code}.')
+            self.env.LOG.error(f'Command ({self.index}) on {node_name} failed with return code {return_code}.')
             if self.env.cmd_args.force:
                 return
 
@@ -63,7 +193,7 @@ class BWCommand(Command):
             # PA.skip is not in the allowed options'
             # PA.proceed means 'proceed' so we can just go on
             if err_answer == PA.retry.answer:
-                return self._remote_bw_group_action(node=node)
+                return self._remote_bw_group_action(node_name=node_name, hostname=hostname)
 
 
 class BWNodesWrapper:
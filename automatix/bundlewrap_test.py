@@ -0,0 +1,109 @@
+import os
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('bundlewrap')
+
+from bundlewrap.exceptions import NoSuchGroup, NoSuchNode  # noqa E402
+from bundlewrap.repo import Repository  # noqa E402
+
+from automatix.bundlewrap import AutomatixBwRepo, get_repo_hash  # noqa E402
+
+NODES = {
+    'node1': SimpleNamespace(name='node1', hostname='node1.example.com'),
+    'node2': SimpleNamespace(name='node2', hostname='node2.example.com'),
+}
+GROUPS = {'group1': SimpleNamespace(name='group1', nodes=list(NODES.values()))}
+
+
+@pytest.fixture
+def fake_repository(monkeypatch):
+    """Replace the loading of the Bundlewrap repository, returns the list of loaded repo paths"""
+    loads = []
+
+    def init(self, repo_path):
+        loads.append(repo_path)
+        # Like in Bundlewrap, the nodes and groups are instance attributes, which exist only after loading
+        self.node_dict = NODES
+        self.group_dict = GROUPS
+
+    def get_node(self, name):
+        try:
+            return self.node_dict[name]
+        except KeyError:
+            raise NoSuchNode(name)
+
+    def get_group(self, name):
+        try:
+            return self.group_dict[name]
+        except KeyError:
+            raise NoSuchGroup(name)
+
+    monkeypatch.setattr(Repository, '__init__', init)
+    monkeypatch.setattr(Repository, '_discover_root_path', lambda self, path: path)
+    monkeypatch.setattr(Repository, 'get_node', get_node)
+    monkeypatch.setattr(Repository, 'get_group', get_group)
+    monkeypatch.setattr(Repository, 'nodes', property(lambda self: list(self.node_dict.values())))
+    monkeypatch.setattr(Repository, 'groups', property(lambda self: list(self.group_dict.values())))
+    return loads
+
+
+def _write(path: str, content: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test__bw_repo__resolve_is_cached(fake_repository):
+    with TemporaryDirectory() as tempdir:
+        repo = AutomatixBwRepo(repo_path=tempdir)
+
+        assert repo.resolve('node1').hostnames == {'node1': 'node1.example.com'}
+        group = repo.resolve('group1')
+        assert group.kind == 'group'
+        assert group.hostnames == {'node1': 'node1.example.com', 'node2': 'node2.example.com'}
+        assert repo.resolve('node1') is repo.resolve('node1')
+        with pytest.raises(NoSuchNode):
+            repo.resolve('unknown')
+        assert fake_repository == [tempdir]
+
+        repo.reload()
+        assert repo.resolve('node1').hostnames == {'node1': 'node1.example.com'}
+        assert fake_repository == [tempdir, tempdir]
+
+
+def test__bw_repo__snapshot(fake_repository):
+    with TemporaryDirectory() as repo_path, TemporaryDirectory() as snapshot_dir:
+        _write(f'{repo_path}/nodes.py', 'nodes = {}')
+        _write(f'{repo_path}/bundles/mybundle/metadata.py', 'defaults = {}')
+
+        # First run loads the repository and writes the snapshot
+        first = AutomatixBwRepo(repo_path=repo_path, snapshot_dir=snapshot_dir)
+        assert first.resolve('node1').hostnames == {'node1': 'node1.example.com'}
+        assert len(fake_repository) == 1
+        snapshots = os.listdir(snapshot_dir)
+        assert len(snapshots) == 1
+
+        # Later runs resolve from the snapshot without loading the repository
+        second = AutomatixBwRepo(repo_path=repo_path, snapshot_dir=snapshot_dir)
+        assert second.resolve('group1').hostnames == {'node1': 'node1.example.com', 'node2': 'node2.example.com'}
+        with pytest.raises(NoSuchNode):
+            second.resolve('unknown')
+        assert len(fake_repository) == 1
+
+        # An unchanged repository does not rewrite the snapshot
+        mtime = os.stat(f'{snapshot_dir}/{snapshots[0]}').st_mtime_ns
+        second.reload()
+        assert os.stat(f'{snapshot_dir}/{snapshots[0]}').st_mtime_ns == mtime
+        assert os.listdir(snapshot_dir) == snapshots
+
+        # Changes outside of nodes and groups, e.g. metadata reactors, invalidate the snapshot
+        hash_before = get_repo_hash(repo_path=repo_path)
+        _write(f'{repo_path}/bundles/mybundle/metadata.py', 'defaults = {"changed": True}')
+        assert get_repo_hash(repo_path=repo_path) != hash_before
+        third = AutomatixBwRepo(repo_path=repo_path, snapshot_dir=snapshot_dir)
+        third.resolve('node1')
+        assert len(fake_repository) == 3
+        assert len(os.listdir(snapshot_dir)) == 2
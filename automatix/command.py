@@ -2,13 +2,20 @@ import os
 import re
 import subprocess
 from code import InteractiveConsole
+from fnmatch import fnmatch
 from dataclasses import dataclass
+from functools import lru_cache
 from shlex import quote
-from time import time
+from time import monotonic, time
+from types import CodeType
 
 from .colors import italic, yellow
 from .environment import PipelineEnvironment, AttributedDict, AttributedDummyDict
+from .profiling import PROFILER
 from .progress_bar import draw_progress_bar
+from .resources import ResourceUsage, run_with_usage
+from .shell_session import ShellSession, SessionClosed
+from .template import Template, compile_template
 
 PERSISTENT_VARS = PVARS = AttributedDict()
 
@@ -77,16 +84,29 @@ class Command:
 
         self.bash_path = self.env.config['bash_path']
 
-        for key, value in cmd.items():
-            self.orig_key = key
-            self.condition_var, self.assignment_var, self.key = parse_key(key=key)
-            if isinstance(value, dict):
-                # We need this workaround because the yaml lib returns a dictionary instead of a string,
-                # if there is nothing but a variable in the command. Alternative is to use quotes in the script yaml.
-                self.value = f'{{{next(iter(value))}}}'
-            else:
-                self.value = value
-            break  # There should be only one entry in pipeline_cmd
+        entries = iter(cmd.items())
+        self.orig_key, value = next(entries)
+        self.condition_var, self.assignment_var, self.key = parse_key(key=self.orig_key)
+        if isinstance(value, dict):
+            # We need this workaround because the yaml lib returns a dictionary instead of a string,
+            # if there is nothing but a variable in the command. Alternative is to use quotes in the script yaml.
+            self.value = f'{{{next(iter(value))}}}'
+        else:
+            self.value = value
+        # All following entries are step options, see config.STEP_OPTIONS
+        self.options = dict(entries)
+
+        # Statistics of the last execution, see reset_stats()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.status = None  # finished, failed, skipped, manual, error or aborted
+        self.return_code = None
+        self.retries = 0
+        self.hosts = []
+        self.output_bytes = 0
+        self.resources = None  # ResourceUsage of local processes, if any
+        self.failure_handled = False  # The user was already asked about the failure, e.g. of multiple hosts
 
     @property
     def progress_portion(self) -> int:
@@ -94,10 +114,23 @@ class Command:
         overall_command_count = self.env.batch_items_count * self.env.command_count
         return round(own_position / overall_command_count * 100, 1)
 
+    @property
+    def remote_parallel(self) -> int:
+        """Maximum number of concurrent executions for commands on multiple hosts"""
+        return self.options.get('parallel', self.env.script.get('remote_parallel', self.env.config['remote_parallel']))
+
     @property
     def precommand(self):
         return self.env.script.get('precommands', {}).get(self.get_type(), None)
 
+    @property
+    def type_name(self) -> str:
+        """Command type without raising an exception for unknown types"""
+        try:
+            return self.get_type()
+        except UnknownCommandException:
+            return 'unknown'
+
     def get_type(self):
         if self.key == 'local':
             return 'local'
@@ -109,17 +142,45 @@ class Command:
             return 'remote'
         raise UnknownCommandException(f'Command type {self.key} is not known.')
 
+    def get_system_names(self) -> list[str]:
+        """System names of a remote command: comma separated names and glob patterns like remote@web*,db1"""
+        names = []
+        for pattern in re.search(r'remote@(.*)', self.key).group(1).split(','):
+            pattern = pattern.strip()
+            if not any(char in pattern for char in '*?['):
+                matches = [pattern]
+            elif not (matches := [name for name in self.env.systems if fnmatch(name, pattern)]):
+                raise KeyError(f'No system matches "{pattern}"')
+            names.extend(name for name in matches if name not in names)
+        return names
+
     def get_system(self):
         if self.get_type() == 'remote':
-            return self.env.systems[re.search(r'remote@(.*)', self.key).group(1)]
+            return self.env.systems[self.get_system_names()[0]]
         return 'localhost'
 
+    @property
+    def template(self) -> Template:
+        return compile_template(self.value)
+
+    def get_template_value(self, name: str, dummy: bool = False):
+        """Value for a name in the command template, raises KeyError for unknown names"""
+        match name:
+            case 'CONST':
+                return ConstantsWrapper(self.env.config['constants'])
+            case 'SYSTEMS':
+                return SystemsWrapper(self.env.systems)
+            case 'PVARS':
+                return AttributedDummyDict('PVARS', PVARS) if dummy else PVARS
+            case _:
+                return self.env.vars[name]
+
     def get_resolved_value(self, dummy: bool = False):
-        variables = self.env.vars.copy()
-        variables['CONST'] = ConstantsWrapper(self.env.config['constants'])
-        variables['SYSTEMS'] = SystemsWrapper(self.env.systems)
-        variables['PVARS'] = AttributedDummyDict('PVARS', PVARS) if dummy else PVARS
-        return self.value.format(**variables)
+        """With dummy=True unknown variables are kept as they are, e.g. for printing"""
+        return self.template.render(
+            lookup=lambda name: self.get_template_value(name=name, dummy=dummy),
+            keep_unresolved=dummy,
+        )
 
     def print_command(self):
         print()
@@ -153,9 +214,15 @@ class Command:
         print()
 
     def execute(self, interactive: bool = False, force: bool = False):
+        self.reset_stats()
+        self.env.emit('step_start', pipeline=self.pipeline, index=self.index, type=self.type_name)
+        start = monotonic()
+        user_wait = self.env.user_wait
+        self.status = 'aborted'
         try:
             self._execute(interactive=interactive, force=force)
         except (KeyError, UnknownCommandException):
+            self.status = 'error'
             self.env.LOG.exception('Syntax or value error!')
             self.env.LOG.error('Syntax or value error! Please fix your script and reload/restart.')
             self._ask_user(
@@ -165,6 +232,21 @@ class Command:
             # _ask_user handles are answers but PA.retry, PA.skip, PA.proceed
             # PA.retry and PA.proceed are not in allowed options
             # PA.skip means 'skip' so we can just go on
+        finally:
+            self.env.emit(
+                'step_end',
+                pipeline=self.pipeline,
+                index=self.index,
+                type=self.type_name,
+                status=self.status,
+                exit_code=self.return_code,
+                retries=self.retries,
+                hosts=self.hosts,
+                output_bytes=self.output_bytes,
+                resources=self.resources.as_dict() if self.resources else None,
+                user_wait=self.env.user_wait - user_wait,
+                duration=monotonic() - start,
+            )
         if self.env.config['progress_bar']:
             draw_progress_bar(self.progress_portion)
 
@@ -173,6 +255,7 @@ class Command:
 
         if not self._check_condition():
             self.env.LOG.info('Skip command, because the condition is not met.')
+            self.status = 'skipped'
             return
 
         if self.get_type() == 'manual' or interactive:
@@ -197,20 +280,25 @@ class Command:
             if answer == PA.skip.answer or self.get_type() == 'manual':
                 # no further execution is needed for manual steps
                 # PA.skip means 'skip' so we skip execution and return
+                self.status = 'skipped' if answer == PA.skip.answer else 'manual'
                 return
 
         steptime = time()
 
-        return_code = self._execute_action()
+        self.failure_handled = False
+        return_code = self.return_code = self._execute_action()
+        self.status = 'finished' if return_code == 0 else 'failed'
 
         if 'AUTOMATIX_TIME' in os.environ:
             print()
             self.env.LOG.info(f'(command execution time: {round(time() - steptime)}s)')
+            if self.resources:
+                self.env.LOG.info(f'(resource usage: {self.resources})')
 
         if return_code != 0:
             self.env.LOG.error(
                 f'>> {self.env.name} << Command ({self.pipeline}:{self.index}) failed with return code {return_code}.')
-            if force:
+            if force or self.failure_handled:
                 return
 
             err_answer = self._ask_user(
@@ -230,6 +318,7 @@ class Command:
             # PA.skip is not in allowed options
             # PA.proceed means 'proceed' so we can just go on
             if err_answer == PA.retry.answer:
+                self.retries += 1
                 return self._execute(interactive)
 
     def _check_condition(self) -> bool:
@@ -322,7 +411,8 @@ class Command:
                 if 'readline' not in vars():
                     import readline  # noqa F401
 
-                pyconsole_locals = self._get_python_globals()
+                # Work on a copy, so the console does not change the namespace of the python commands
+                pyconsole_locals = dict(self._get_python_globals())
                 pyconsole_locals.update(self._get_python_locals())
 
                 pyconsole = InteractiveConsole(pyconsole_locals)
@@ -356,34 +446,42 @@ class Command:
     def _get_python_locals(self) -> dict:
         locale_vars = {}
         locale_vars.update(PERSISTENT_VARS)
-        self.env.LOG.debug(f'locals:\n {locale_vars}')
+        self.env.LOG.debug('locals:\n %s', locale_vars)
         return locale_vars
 
     def _get_python_globals(self) -> dict:
-        global_vars = {
-            # builtins are included anyway, if not defined here
-            'CONST': ConstantsWrapper(self.env.config['constants']),
-            'PERSISTENT_VARS': PERSISTENT_VARS,
-            'PVARS': PVARS,
-            'SCRIPT_FILE_PATH': self.env.script_file_path,
-            'SYSTEMS': SystemsWrapper(self.env.systems),
-            'AbortException': AbortException,
-            'SkipBatchItemException': SkipBatchItemException,
-        }
-        global_vars.update(self._generate_python_vars())
-        self.env.LOG.debug(f'globals:\n {global_vars}')
-        return global_vars
+        # The namespace is created once per environment and shared by all python commands.
+        # All values are references to objects of the environment, so they stay up to date.
+        if self.env.python_globals is None:
+            global_vars = {
+                # builtins are included anyway, if not defined here
+                'CONST': ConstantsWrapper(self.env.config['constants']),
+                'PERSISTENT_VARS': PERSISTENT_VARS,
+                'PVARS': PVARS,
+                'SCRIPT_FILE_PATH': self.env.script_file_path,
+                'SYSTEMS': SystemsWrapper(self.env.systems),
+                'AbortException': AbortException,
+                'SkipBatchItemException': SkipBatchItemException,
+            }
+            global_vars.update(self._generate_python_vars())
+            self.env.python_globals = global_vars
+            # Logged only here, after the first exec the namespace contains __builtins__ as well
+            self.env.LOG.debug('globals:\n %s', global_vars)
+        return self.env.python_globals
 
     def _python_action(self) -> int:
         cmd = self.get_resolved_value()
 
         try:
-            self.env.LOG.debug(f'Run python command: {cmd}')
+            self.env.LOG.debug('Run python command: %s', cmd)
             if self.assignment_var:
-                exec(f'VARS["{self.assignment_var}"] = {cmd}', self._get_python_globals(), self._get_python_locals())
-                self.env.LOG.info(f'Variable {self.assignment_var} = {repr(self.env.vars[self.assignment_var])}')
+                code = compile_python(f'VARS["{self.assignment_var}"] = {cmd}')
             else:
-                exec(cmd, self._get_python_globals(), self._get_python_locals())
+                code = compile_python(cmd)
+            with PROFILER.step(name=f'{self.pipeline}_{self.index}'):
+                exec(code, self._get_python_globals(), self._get_python_locals())
+            if self.assignment_var:
+                self.env.LOG.info(f'Variable {self.assignment_var} = {repr(self.env.vars[self.assignment_var])}')
             return 0
         except (AbortException, SkipBatchItemException):
             raise
@@ -406,9 +504,10 @@ class Command:
             return 1
 
     def _local_action(self) -> int:
-        cmd = self._build_command()
         try:
-            return self._run_local_command(cmd=cmd)
+            if self.env.config['local_session'] and not self.options.get('tty'):
+                return self._local_session_action()
+            return self._run_local_command(cmd=self._build_command())
         except KeyboardInterrupt:
             self.env.LOG.info(KEYBOARD_INTERRUPT_MESSAGE)
             return 130
@@ -419,53 +518,210 @@ class Command:
         else:
             return self.get_resolved_value()
 
-    def _run_local_command(self, cmd: str) -> int:
+    def _local_session_action(self) -> int:
+        try:
+            session = self.env.shell_session(
+                key='local',
+                cmd=f'exec {quote(self.bash_path)} --noprofile --norc -s',
+                precommand=self.precommand,
+                get_environment=self._get_process_environment,
+            )
+        except SessionClosed as exc:
+            self.env.LOG.error(f'Could not start local shell session: {exc}')
+            return int(exc) or 1
+        return self._run_in_session(session=session, cmd=self.get_resolved_value())
+
+    def _get_process_environment(self) -> dict:
         process_environment = os.environ.copy()
         process_environment['RUNNING_INSIDE_AUTOMATIX'] = '1'
         process_environment['AUTOMATIX_SCRIPT_LOCATION'] = str(self.env.script_file_path.parent)
         process_environment['AUTOMATIX_SCRIPT_NAME'] = str(self.env.script_file_path.name)
+        return process_environment
+
+    def _run_local_command(self, cmd: str) -> int:
+        process_environment = self._get_process_environment()
         self.env.LOG.debug(f'Executing: {repr(cmd)} with environment {repr(process_environment)}')
+        proc, usage = run_with_usage(
+            cmd,
+            env=process_environment,
+            executable=self.bash_path,
+            shell=True,
+            stdout=subprocess.PIPE if self.assignment_var else None,
+        )
+        self.env.LOG.debug('Resource usage: %s', usage)
+        if self.resources is None:
+            self.resources = ResourceUsage()
+        self.resources.add(usage)
         if self.assignment_var:
-            proc = subprocess.run(
-                cmd,
-                env=process_environment,
-                executable=self.bash_path,
-                shell=True,
-                stdout=subprocess.PIPE,
-            )
-            output = proc.stdout.decode(self.env.config["encoding"])
-            self.env.vars[self.assignment_var] = assigned_value = output.rstrip('\r\n')
-            hint = ' (trailing newline removed)' if (output.endswith('\n') or output.endswith('\r')) else ''
-            self.env.LOG.info(f'Variable {self.assignment_var} = "{assigned_value}"{hint}')
-        else:
-            proc = subprocess.run(
-                cmd,
-                env=process_environment,
-                executable=self.bash_path,
-                shell=True,
-            )
+            self._assign_output(output=proc.stdout)
         return proc.returncode
 
+    def _assign_output(self, output: bytes):
+        self.output_bytes += len(output)
+        output = output.decode(self.env.config["encoding"])
+        self.env.vars[self.assignment_var] = assigned_value = output.rstrip('\r\n')
+        hint = ' (trailing newline removed)' if (output.endswith('\n') or output.endswith('\r')) else ''
+        self.env.LOG.info(f'Variable {self.assignment_var} = "{assigned_value}"{hint}')
+
+    def _run_in_session(self, session: ShellSession, cmd: str) -> int:
+        self.env.LOG.debug(f'Executing in shell session: {repr(cmd)}')
+        try:
+            returncode, output = session.run(cmd=cmd, capture=bool(self.assignment_var))
+        except SessionClosed as exc:
+            self.env.LOG.error(f'Shell session terminated unexpectedly with return code {int(exc)}.')
+            return int(exc) or 1
+        if self.assignment_var:
+            self._assign_output(output=output)
+        return returncode
+
     def _remote_action(self) -> int:
         # For BWCommand this method is overridden
+        if len(system_names := self.get_system_names()) > 1:
+            return self._remote_multi_host_action(system_names=system_names)
         return self._remote_action_on_hostname(hostname=self.get_system().replace('hostname!', ''))
 
+    def _get_hostnames(self, system_name: str) -> dict[str, str]:
+        # For BWCommand this method is overridden
+        return {system_name: self.env.systems[system_name].replace('hostname!', '')}
+
+    def _remote_multi_host_action(self, system_names: list[str]) -> int:
+        hostnames = {}
+        for system_name in system_names:
+            hostnames.update(self._get_hostnames(system_name=system_name))
+        print()
+        self.env.LOG.info(
+            f' --- Executing command on {len(hostnames)} hosts (max. {self.remote_parallel} parallel) ---')
+        return self._remote_fanout(hostnames=hostnames)
+
     def _remote_action_on_hostname(self, hostname: str) -> int:
+        self.hosts.append(hostname)
+        self.env.emit('host_start', pipeline=self.pipeline, index=self.index, host=hostname)
+        start = monotonic()
         try:
-            exitcode = self._run_local_command(cmd=self._get_remote_command(hostname=hostname))
+            if self.env.config['remote_sessions'] and not self.options.get('tty'):
+                exitcode = self._remote_session_action(hostname=hostname)
+            else:
+                exitcode = self._run_local_command(cmd=self._get_remote_command(hostname=hostname))
         except KeyboardInterrupt:
             self.env.LOG.info(KEYBOARD_INTERRUPT_MESSAGE)
             exitcode = 130
             self._remote_handle_keyboard_interrupt(hostname=hostname)
 
+        self.env.emit('host_end', pipeline=self.pipeline, index=self.index, host=hostname, exit_code=exitcode,
+                      duration=monotonic() - start)
         return exitcode
 
-    def _get_remote_command(self, hostname: str) -> str:
-        ssh_cmd = self.env.config["ssh_cmd"].format(hostname=hostname)
+    def _remote_session_action(self, hostname: str) -> int:
+        try:
+            session = self.env.shell_session(
+                key=f'remote@{hostname}',
+                cmd=self._get_ssh_cmd(hostname=hostname) + quote('RUNNING_INSIDE_AUTOMATIX=1 bash --noprofile --norc -s'),
+                precommand=self.precommand,
+            )
+        except SessionClosed as exc:
+            self.env.LOG.error(f'Could not start shell session on {hostname}: {exc}')
+            return int(exc) or 1
+        return self._run_in_session(session=session, cmd=self.get_resolved_value())
+
+    def _remote_fanout(self, hostnames: dict[str, str]) -> int:
+        """
+        Execute the remote command concurrently on multiple hosts.
+        Failed hosts are reported together and can be retried together.
+
+        If hosts still fail, when the user proceeds (or with --force), the return code of the first failed host
+        is returned and the step fails without asking again.
+
+        :param hostnames: label -> hostname
+        """
+        outputs = {}
+        while True:
+            results = self._run_fanout(hostnames=hostnames)
+            if results is None:
+                return 130
+            outputs.update({label: result.output for label, result in results.items()})
+            failed = {label: results[label].returncode for label in hostnames if results[label].returncode != 0}
+            if not failed or not self._retry_failed_hosts(failed=failed, count=len(results)):
+                break
+            hostnames = {label: hostnames[label] for label in failed}
+
+        if self.assignment_var:
+            encoding = self.env.config["encoding"]
+            self.env.vars[self.assignment_var] = assigned_value = {
+                label: output.decode(encoding).rstrip('\r\n') for label, output in outputs.items()
+            }
+            self.env.LOG.info(f'Variable {self.assignment_var} = {assigned_value}')
+        if failed:
+            self.failure_handled = True
+            return next(iter(failed.values()))
+        return 0
+
+    def _run_fanout(self, hostnames: dict[str, str]) -> dict | None:
+        """Run the remote command on all hosts, None if interrupted by the user"""
+        from .fanout import FanOut  # only needed for multiple hosts
+
+        fanout = FanOut(
+            # Without stdin there is no pseudo-terminal, so ssh would only complain about -t
+            commands={label: self._get_remote_command(hostname=hostname, tty=False)
+                      for label, hostname in hostnames.items()},
+            max_parallel=self.remote_parallel,
+            bash_path=self.bash_path,
+            environment=self._get_process_environment(),
+            encoding=self.env.config['encoding'],
+            output_mode=self.options.get('output', self.env.config['remote_parallel_output']),
+        )
+        try:
+            results = fanout.run()
+        except KeyboardInterrupt:
+            self.env.LOG.info(KEYBOARD_INTERRUPT_MESSAGE)
+            for label in fanout.interrupted:
+                self.env.LOG.info(f'- {label} -')
+                self._remote_handle_keyboard_interrupt(hostname=hostnames[label])
+            return None
+
+        for label in hostnames:
+            result = results[label]
+            self.hosts.append(hostnames[label])
+            self.output_bytes += len(result.output)
+            self.env.emit('host_start', ts=result.start, pipeline=self.pipeline, index=self.index,
+                          host=hostnames[label])
+            self.env.emit('host_end', ts=result.start + result.duration, pipeline=self.pipeline,
+                          index=self.index, host=hostnames[label], exit_code=result.returncode,
+                          duration=result.duration)
+        return results
+
+    def _retry_failed_hosts(self, failed: dict[str, int], count: int) -> bool:
+        print()
+        for label, return_code in failed.items():
+            self.env.LOG.error(f'Command ({self.index}) on {label} failed with return code {return_code}.')
+        self.env.LOG.error(
+            f'Command ({self.index}) failed on {len(failed)} of {count} hosts: {", ".join(failed)}')
+        if self.env.cmd_args.force:
+            return False
+
+        err_answer = self._ask_user(
+            question='[PF] What should I do?',
+            allowed_options=[PA.proceed, PA.terminal, PA.variables, PA.retry, PA.abort],
+        )
+        # _ask_user handles are answers but PA.retry, PA.skip, PA.proceed
+        # PA.skip is not in the allowed options
+        # PA.proceed means 'proceed' so we can just go on
+        return err_answer == PA.retry.answer
+
+    def _get_ssh_cmd(self, hostname: str, ssh_cmd: str = None) -> str:
+        if ssh_cmd is None:
+            ssh_cmd = self.env.config["ssh_cmd"].format(hostname=hostname)
+        if self.env.ssh_pool:
+            return self.env.ssh_pool.wrap(ssh_cmd=ssh_cmd, hostname=hostname)
+        return ssh_cmd
+
+    def _get_remote_command(self, hostname: str, tty: bool = True) -> str:
+        ssh_cmd = self._get_ssh_cmd(hostname=hostname)
+        if not tty:
+            ssh_cmd = re.sub(r'\s-tt?(?=\s)', '', ssh_cmd)
         return f'{ssh_cmd}{quote("RUNNING_INSIDE_AUTOMATIX=1 bash -c " + quote(self._build_command()))}'
 
     def _remote_handle_keyboard_interrupt(self, hostname: str):
-        ssh_cmd = self.env.config["ssh_cmd"].format(hostname=hostname)
+        ssh_cmd = self._get_ssh_cmd(hostname=hostname)
 
         try:
             ps_pids = self.get_remote_pids(hostname=hostname)
@@ -511,7 +767,8 @@ class Command:
 
     def get_remote_pids(self, hostname) -> list:
         ps_cmd = "ps axu | grep RUNNING_INSIDE_AUTOMATIX | grep -v 'grep' | awk '{print $2}'"
-        remote_ps_cmd = f'ssh {hostname} {quote(ps_cmd)} 2>&1'
+        ssh_cmd = self._get_ssh_cmd(hostname=hostname, ssh_cmd=f'ssh {hostname} ')
+        remote_ps_cmd = f'{ssh_cmd}{quote(ps_cmd)} 2>&1'
         pids = subprocess.check_output(
             remote_ps_cmd,
             shell=True,
@@ -521,6 +778,12 @@ class Command:
         return pids
 
 
+@lru_cache(maxsize=1024)
+def compile_python(source: str) -> CodeType:
+    """Code objects are immutable, so commands with the same resolved source share them"""
+    return compile(source, '<string>', 'exec')
+
+
 def parse_key(key) -> tuple[str, ...]:
     """
     parses the key
@@ -529,9 +792,11 @@ def parse_key(key) -> tuple[str, ...]:
     - condition_var: if this evaluates to False, the command is not executed
     - assignment_var: name of a variable, to which the command output is assigned
     - command_type
+
+    Condition and assignment come before the command type, so a "?" after "remote@" is part of a glob pattern.
     """
 
-    return re.search(r'((.*)\?)?((.*)=)?(.*)', key).group(2, 4, 5)
+    return re.search(r'(([^@?]*)\?)?(([^@?=]*)=)?(.*)', key).group(2, 4, 5)
 
 
 class SystemsWrapper:
@@ -4,7 +4,7 @@ from unittest import mock
 
 import pytest
 
-from automatix.command import Command, parse_key
+from automatix.command import Command, PA, compile_python, parse_key
 from tests.test_environment import environment, run_command_and_check, ssh_up  # noqa: F401
 
 
@@ -126,12 +126,33 @@ def test__get_python_locale_vars():
     assert id(cmd.env.vars) == id(cmd._get_python_globals()['VARS']), 'Automatix variables have been overwritten!'
 
 
+def test__python_namespace_and_code_cache():
+    env = deepcopy(environment)
+    compile_python.cache_clear()
+
+    for _ in range(3):
+        cmd = Command(cmd={'python': 'VARS.count = VARS.get("count", 0) + 1'}, index=2, pipeline='pipeline', env=env,
+                      position=1)
+        cmd.execute()
+        assert cmd._get_python_globals() is env.python_globals
+
+    assert env.vars.count == 3
+    assert compile_python.cache_info().misses == 1
+
+    # Variables assigned in a python command stay local to this command
+    Command(cmd={'python': 'x = 1'}, index=2, pipeline='pipeline', env=env, position=1).execute()
+    assert 'x' not in env.python_globals
+    assert deepcopy(env).python_globals is None
+
+
 def test__parse_key():
     assert parse_key('python') == (None, None, 'python')
     assert parse_key('remote@v1') == (None, None, 'remote@v1')
     assert parse_key('host=remote@v1') == (None, 'host', 'remote@v1')
     assert parse_key('is_jira?host=remote@v1') == ('is_jira', 'host', 'remote@v1')
     assert parse_key('is_jira!?python') == ('is_jira!', None, 'python')
+    assert parse_key('remote@web?') == (None, None, 'remote@web?')
+    assert parse_key('is_jira?host=remote@web?,db[12]') == ('is_jira', 'host', 'remote@web?,db[12]')
 
 
 def test__show_and_change_variables():
@@ -162,3 +183,65 @@ def test__show_and_change_variables():
         'var1': 'xyz',
         'some_var': '{some_var}',
     }
+
+
+def test__get_system_names():
+    env = deepcopy(environment)
+    env.systems = {'web1': 'w1.example.com', 'web2': 'hostname!w2.example.com', 'db': 'db.example.com'}
+
+    cmd = Command(cmd={'remote@db': 'ls'}, index=2, pipeline='pipeline', env=env, position=1)
+    assert cmd.get_system_names() == ['db']
+    assert cmd.get_system() == 'db.example.com'
+
+    cmd = Command(cmd={'remote@web*, db,web1': 'ls'}, index=2, pipeline='pipeline', env=env, position=1)
+    assert cmd.get_system_names() == ['web1', 'web2', 'db']
+
+    cmd = Command(cmd={'cond?remote@web?': 'ls'}, index=2, pipeline='pipeline', env=env, position=1)
+    assert cmd.condition_var == 'cond'
+    assert cmd.get_type() == 'remote'
+    assert cmd.get_system_names() == ['web1', 'web2']
+
+    cmd = Command(cmd={'remote@mail*': 'ls'}, index=2, pipeline='pipeline', env=env, position=1)
+    with pytest.raises(KeyError):
+        cmd.get_system_names()
+
+
+def test__remote_fanout__failed_hosts():
+    env = deepcopy(environment)
+    env.systems = {'web1': 'w1.example.com', 'web2': 'w2.example.com'}
+    env.cmd_args.force = True
+    env.config['ssh_cmd'] = 'ssh -t {hostname} sudo '
+    cmd = Command(cmd={'remote@web*': 'ls'}, index=2, pipeline='pipeline', env=env, position=1)
+    assert cmd._get_remote_command(hostname='w1.example.com', tty=False).startswith('ssh w1.example.com sudo ')
+
+    commands = {'w1.example.com': 'true', 'w2.example.com': 'exit 3'}
+    events = []
+    with mock.patch.object(Command, '_get_remote_command', side_effect=lambda hostname, tty: commands[hostname]), \
+            mock.patch.object(env, 'emit', side_effect=lambda event, **kwargs: events.append((event, kwargs))):
+        cmd.execute(force=True)
+
+    assert cmd.return_code == 3
+    assert cmd.status == 'failed'
+    step_end = [kwargs for event, kwargs in events if event == 'step_end'][0]
+    assert step_end['exit_code'] == 3
+    assert step_end['hosts'] == ['w1.example.com', 'w2.example.com']
+
+    # Proceeding after the failure of hosts does not ask again for the failed step
+    env.cmd_args.force = False
+    with mock.patch.object(Command, '_get_remote_command', side_effect=lambda hostname, tty: commands[hostname]), \
+            mock.patch.object(Command, '_ask_user', return_value=PA.proceed.answer) as ask_user:
+        cmd.execute()
+    ask_user.assert_called_once()
+    assert cmd.return_code == 3
+
+
+def test__local_session__failing_precommand():
+    env = deepcopy(environment)
+    env.config['local_session'] = True
+    env.script['precommands'] = {'local': 'echo precommand; exit 2'}
+    cmd = Command(cmd={'local': 'echo test'}, index=2, pipeline='pipeline', env=env, position=1)
+    cmd.execute(force=True)
+
+    assert cmd.return_code == 2
+    assert cmd.status == 'failed'
+    env.close_connections()
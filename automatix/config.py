@@ -1,22 +1,21 @@
 import argparse
 import logging
+import hashlib
+import json
 import os
+import pickle
 import re
 import sys
 from collections import OrderedDict
+from collections.abc import Iterable
+from functools import lru_cache
 from importlib import metadata, import_module
 from time import sleep
 
 from .colors import red
-from .helpers import read_yaml, search_script
+from .helpers import read_yaml
 
-try:
-    from argcomplete import autocomplete
-    from .bash_completion import ScriptFileCompleter, ScriptFieldCompleter
-
-    bash_completion = True
-except ImportError:
-    bash_completion = False
+# fanout, script_catalog and teamvault are imported where they are used, they are not needed on every start
 
 VERSION = metadata.version('automatix')
 
@@ -32,6 +31,14 @@ DEPRECATED_SYNTAX = {
     (r'(?<!\w)a_vars\[[\'"](\w+)[\'"]\]', 'VARS.{group[0]}', 'pr'),  # Removed in 3.0.0
 }
 
+STEP_OPTIONS = {
+    # Additional keys of a pipeline command besides the command itself
+    # option name: expected type
+    'tty': bool,  # Do not use a shell session, but a separate process with terminal
+    'parallel': int,  # Maximum concurrent executions on multiple hosts, overwrites remote_parallel
+    'output': str,  # Output mode for concurrent executions, overwrites remote_parallel_output
+}
+
 SCRIPT_FIELDS = OrderedDict()
 SCRIPT_FIELDS['systems'] = 'Systems'
 SCRIPT_FIELDS['vars'] = 'Variables'
@@ -42,15 +49,30 @@ CONFIG = {
     'encoding': 'utf-8',
     'bash_path': '/bin/bash',
     'ssh_cmd': 'ssh -t {hostname} sudo ',
+    'ssh_multiplexing': False,
+    'ssh_control_persist': '10m',
+    'remote_sessions': False,
+    'local_session': False,
+    'remote_parallel': 1,
+    'remote_parallel_output': 'prefix',
     'logger': 'automatix',
     'logfile_dir': 'automatix_logs',
+    'parallel_backend': 'screen',
     'bundlewrap': False,
+    'bundlewrap_snapshot': False,
+    'cache_dir': '~/.cache/automatix',
+    'script_cache': True,
+    'event_log': '',
+    'trace_file': '',
+    'metrics_file': '',
     'teamvault': False,
     'progress_bar': False,
     'startup_script': '',
 }
 
 MAGIC_SELECTION_INT = -999999999  # Some number nobody would normally type to mark that selection is wanted.
+DEFAULT_PROFILE_DIR = 'automatix_profile'
+DEFAULT_MAX_PARALLEL = 10  # Concurrent batch items in headless parallel processing
 
 configfile = os.path.expanduser(os.path.expandvars(os.getenv('AUTOMATIX_CONFIG', '~/.automatix.cfg.yaml')))
 if os.path.isfile(configfile):
@@ -70,6 +92,10 @@ for c_key, c_value in CONFIG.items():
         CONFIG[c_key] = env_value
         continue
 
+    if isinstance(c_value, int) and not isinstance(c_value, bool) and env_value.isdigit():
+        CONFIG[c_key] = int(env_value)
+        continue
+
     print(red(f'Warning: environment variable "AUTOMATIX_{c_key.upper()}" ignored: wrong value type!'))
     sleep(2)
 
@@ -82,14 +108,29 @@ else:
 LOG = logging.getLogger(CONFIG['logger'])
 
 SCRIPT_DIR = os.path.expanduser(os.path.expandvars(CONFIG['script_dir']))
+SCRIPT_CATALOG = None  # Created on first use by get_script_catalog()
 
 if CONFIG['teamvault']:
-    import bwtv
-
     SCRIPT_FIELDS['secrets'] = 'Secrets'
 
 
+def bash_completion_requested() -> bool:
+    # argcomplete sets _ARGCOMPLETE, when it calls us for completion. Otherwise, we do not need to import it.
+    if '_ARGCOMPLETE' not in os.environ:
+        return False
+    try:
+        import argcomplete  # noqa F401
+    except ImportError:
+        return False
+    return True
+
+
 def create_parser() -> argparse.ArgumentParser:
+    bash_completion = bash_completion_requested()
+    if bash_completion:
+        from argcomplete import autocomplete
+        from .bash_completion import ScriptFileCompleter, ScriptFieldCompleter
+
     parser = argparse.ArgumentParser(
         description='Automation wrapper for bash and python commands.',
         epilog='Explanations and README at https://github.com/seibert-media/automatix',
@@ -99,7 +140,7 @@ def create_parser() -> argparse.ArgumentParser:
         help='Path to scriptfile (yaml), use " -- " if needed to delimit this from argument fields',
     )
     if bash_completion:
-        scriptfile_action.completer = ScriptFileCompleter(script_dir=SCRIPT_DIR)
+        scriptfile_action.completer = ScriptFileCompleter(catalog=get_script_catalog())
 
     for field in SCRIPT_FIELDS.keys():
         field_action = parser.add_argument(
@@ -109,10 +150,10 @@ def create_parser() -> argparse.ArgumentParser:
                  f'You can specify multiple {field} like: --{field} v1=string1 v2=string2 v3=string3',
         )
         if bash_completion:
-            field_action.completer = ScriptFieldCompleter(script_dir=SCRIPT_DIR)
+            field_action.completer = ScriptFieldCompleter(catalog=get_script_catalog())
     parser.add_argument(
         '--vars-file',
-        help='Path to a CSV file containing variables for batch processing',
+        help='Path to a file containing variables for batch processing (CSV, TSV, JSON lines or YAML)',
     )
     parser.add_argument(
         '--parallel',
@@ -120,6 +161,18 @@ def create_parser() -> argparse.ArgumentParser:
         help='Run CSV file entries parallel in screen sessions; only valid with --vars-file. '
              'GNU screen has to be installed. See EXTRAS section in README.',
     )
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help='Run CSV file entries parallel without screen sessions and user interface; only valid with --parallel.'
+             ' Output is prefixed with the label of the entry, user input is requested one after the other.',
+    )
+    parser.add_argument(
+        '--max-parallel',
+        type=int,
+        help='Maximum number of CSV file entries processed concurrently; only valid with --headless'
+             f' (default: {DEFAULT_MAX_PARALLEL})',
+    )
     parser.add_argument(
         '--print-overview', '-p',
         action='store_true',
@@ -153,13 +206,37 @@ def create_parser() -> argparse.ArgumentParser:
         action='store_true',
         help='activate debug log level',
     )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const=DEFAULT_PROFILE_DIR,
+        metavar='DIR',
+        help=f'Profile the run with cProfile and write .pstats files to DIR (default: {DEFAULT_PROFILE_DIR})',
+    )
+    parser.add_argument(
+        '--profile-steps',
+        action='store_true',
+        help='Profile every python step separately (implies --profile)',
+    )
     if bash_completion:
         autocomplete(parser)
     return parser
 
 
 def arguments(args: list[str] = None) -> argparse.Namespace:
-    return create_parser().parse_args(args=args)
+    parser = create_parser()
+    parsed_args = parser.parse_args(args=args)
+    # Reject options, which would be ignored otherwise
+    if parsed_args.headless and not parsed_args.parallel:
+        parser.error('--headless is only valid with --parallel')
+    if parsed_args.max_parallel is not None:
+        if not parsed_args.headless:
+            parser.error('--max-parallel is only valid with --headless')
+        if parsed_args.max_parallel < 1:
+            parser.error('--max-parallel has to be at least 1')
+    else:
+        parsed_args.max_parallel = DEFAULT_MAX_PARALLEL
+    return parsed_args
 
 
 def _overwrite(script: dict, key: str, data: list[str]):
@@ -184,7 +261,7 @@ def get_script_path(name: str):
     if not os.path.isfile(s_file):
         LOG.debug('Script not found at relative path from SCRIPT_DIR')
         # Third search and offer selection
-        s_file = search_script(name=name, script_dir=SCRIPT_DIR)
+        s_file = get_script_catalog().search(name=name)
     if not s_file:
         LOG.debug('Script not found at all.')
         raise ValueError('Script not found')
@@ -192,12 +269,75 @@ def get_script_path(name: str):
     return s_file
 
 
+def get_cache_dir() -> str:
+    return os.path.expanduser(os.path.expandvars(CONFIG['cache_dir']))
+
+
+def get_script_catalog():
+    """:return: ScriptCatalog of the script directory"""
+    global SCRIPT_CATALOG
+    if SCRIPT_CATALOG is None:
+        from .script_catalog import ScriptCatalog
+
+        cache_path = None
+        if CONFIG['script_cache']:
+            dir_hash = hashlib.sha256(os.path.abspath(SCRIPT_DIR).encode()).hexdigest()[:16]
+            cache_path = f'{get_cache_dir()}/script_catalog_{dir_hash}.json'
+        SCRIPT_CATALOG = ScriptCatalog(script_dir=SCRIPT_DIR, cache_path=cache_path)
+    return SCRIPT_CATALOG
+
+
+# Configuration, which affects the validation of scripts (reserved keys, deprecated syntax, config warnings)
+SCRIPT_CACHE_CONFIG_KEYS = ('bundlewrap', 'teamvault', 'ssh_cmd')
+
+
+def get_script_cache_path(s_file: str) -> str:
+    stat = os.stat(s_file)
+    config = json.dumps({c_key: CONFIG.get(c_key) for c_key in SCRIPT_CACHE_CONFIG_KEYS}, sort_keys=True)
+    key = f'{os.path.realpath(s_file)}|{stat.st_mtime_ns}|{stat.st_size}|{VERSION}|{config}'
+    return f'{get_cache_dir()}/scripts/{hashlib.sha256(key.encode()).hexdigest()}.pickle'
+
+
+def load_script(s_file: str) -> dict:
+    """
+    Read and validate the script.
+
+    Validated scripts without warnings are cached, so unchanged scripts are loaded
+    without parsing and validation. The cache is keyed by path, modification time, size,
+    version and the configuration used in validation.
+    """
+    cache_path = get_script_cache_path(s_file=s_file) if CONFIG['script_cache'] else None
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                script = pickle.load(f)
+            LOG.debug(f'Script loaded from cache {cache_path}')
+            return script
+        except (OSError, pickle.UnpicklingError, EOFError):
+            LOG.debug(f'Ignoring broken script cache file {cache_path}')
+
+    script = read_yaml(s_file)
+    warnings = validate_script(script)
+    if warnings:
+        # To give people a chance to see warnings before the following output happens.
+        sleep(5)
+
+    if cache_path and not warnings:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(f'{cache_path}.tmp', 'wb') as f:
+                pickle.dump(script, f)
+            os.replace(f'{cache_path}.tmp', cache_path)
+        except OSError as exc:
+            LOG.debug(f'Could not write script cache: {exc}')
+    return script
+
+
 def get_script(args: argparse.Namespace) -> dict:
     s_file = get_script_path(name=args.scriptfile)
 
     try:
-        script = read_yaml(s_file)
-        validate_script(script)
+        script = load_script(s_file)
     except Exception:
         LOG.exception('Script validation failed! Please fix syntax before retrying!')
         if input('To reload and proceed after fixing type "R" and press Enter.\a') == 'R':
@@ -217,6 +357,17 @@ def get_script(args: argparse.Namespace) -> dict:
     return script
 
 
+@lru_cache(maxsize=256)
+def get_deprecated_patterns(systems: tuple[str, ...]) -> list[tuple[re.Pattern, str, str]]:
+    """DEPRECATED_SYNTAX with compiled patterns, '{s}' is replaced with the system names"""
+    patterns = []
+    for pattern, replacement, flags in DEPRECATED_SYNTAX:
+        if 's' in flags and systems:
+            pattern = pattern.format(s='|'.join(systems))
+        patterns.append((re.compile(pattern), replacement, flags))
+    return patterns
+
+
 def check_deprecated_syntax(ckey: str, entry: str, script: dict, prefix: str) -> int:
     warn = 0
     if isinstance(entry, dict):
@@ -224,16 +375,12 @@ def check_deprecated_syntax(ckey: str, entry: str, script: dict, prefix: str) ->
         LOG.warning(f'{prefix} Command is not a string! Please use quotes!')
         entry = f'{{{next(iter(entry))}}}'
 
-    for pattern, replacement, flags in DEPRECATED_SYNTAX:
+    for regex, replacement, flags in get_deprecated_patterns(systems=tuple(script.get('systems') or {})):
         if 'b' in flags and not CONFIG['bundlewrap']:
             continue
         if 'p' in flags and 'python' not in ckey:
             continue
-        if 's' in flags and script.get('systems'):
-            match = re.search(pattern.format(s='|'.join(script['systems'].keys())), entry)
-        else:
-            match = re.search(pattern, entry)
-        if match:
+        if match := regex.search(entry):
             warn += 1
             LOG.warning('{prefix} Using "{match}" {state}. Use "{repl}" instead.'.format(
                 prefix=prefix,
@@ -254,6 +401,26 @@ def check_command_syntax(script: dict) -> int:
     return warn
 
 
+def check_step_options(script: dict):
+    from .fanout import OUTPUT_MODES
+
+    for pipeline in ['always', 'pipeline', 'cleanup']:
+        for index, command in enumerate(script.get(pipeline, [])):
+            for option, value in list(command.items())[1:]:  # first entry is the command itself
+                if option not in STEP_OPTIONS:
+                    raise ValidationError(
+                        f'[{pipeline}:{index}] Unknown step option "{option}".'
+                        f' Allowed options are {list(STEP_OPTIONS.keys())}.'
+                    )
+                if not isinstance(value, STEP_OPTIONS[option]) or (
+                        isinstance(value, bool) and STEP_OPTIONS[option] is not bool):
+                    raise ValidationError(
+                        f'[{pipeline}:{index}] Step option "{option}" has to be of type {STEP_OPTIONS[option].__name__}.'
+                    )
+                if option == 'output' and value not in OUTPUT_MODES:
+                    raise ValidationError(f'[{pipeline}:{index}] Step option "output" has to be one of {OUTPUT_MODES}.')
+
+
 def check_version(version_str: str):
     installed_version = _tupelize(VERSION)
 
@@ -323,19 +490,21 @@ def check_proper_config() -> int:
     return warn
 
 
-def validate_script(script: dict):
+def validate_script(script: dict, check_config: bool = True) -> int:
+    """Raise an exception for invalid scripts and return the number of warnings"""
+    if not isinstance(script, dict):
+        raise ValidationError(f'Script has to be a mapping, got {type(script).__name__}.')
     version_str = script.get('require_version', '0.0.0')
     check_version(version_str=version_str)
     check_reserved_keys(script=script)
+    check_step_options(script=script)
 
     warn = 0
-    warn += check_proper_config()
+    if check_config:
+        warn += check_proper_config()
     warn += check_removed_features(script=script)
     warn += check_command_syntax(script=script)
-
-    if warn:
-        # To give people a chance to see warnings before the following output happens.
-        sleep(5)
+    return warn
 
 
 def collect_vars(script: dict) -> dict:
@@ -345,16 +514,10 @@ def collect_vars(script: dict) -> dict:
         var_dict = {}
     script['vars'] = var_dict  # just for the case it was empty
     if CONFIG['teamvault']:
+        from .teamvault import SECRETS
+
         for key, secret in script.get('secrets', {}).items():
-            sid, field = secret.split('_')
-            if field == 'password':
-                var_dict[key] = bwtv.password(sid)
-            elif field == 'username':
-                var_dict[key] = bwtv.username(sid)
-            elif field == 'file':
-                var_dict[key] = bwtv.file(sid)
-            else:
-                raise UnknownSecretTypeException(field)
+            var_dict[key] = SECRETS.get(secret)
     return var_dict
 
 
@@ -365,21 +528,36 @@ def update_script_from_row(row: dict, script: dict, index: int):
     group = row.pop('group', None)
     label = row.pop('label', None)
 
-    ids = [_id for _id in [group, str(index), label] if _id]
+    ids = [str(_id) for _id in [group, index, label] if _id]
     script['name'] += f" ({' | '.join(ids)})"
 
     for key, value in row.items():
-        assert len(key.split(':')) == 2, \
-            'First row in CSV must contain "label" or the field name and key seperated by colons' \
-            ' like "label,systems:mysystem,vars:myvar".'
         key_type, key_name = key.split(':')
-        assert key_type in SCRIPT_FIELDS.keys(), \
-            f'First row in CSV: Field name is \'{key_type}\', but has to be one of {list(SCRIPT_FIELDS.keys())}.'
         script[key_type][key_name] = value
 
 
-class UnknownSecretTypeException(Exception):
-    pass
+def check_vars_file_fields(fields: Iterable[str], source: str):
+    """Validate the field names of a vars file once, before the rows are used by update_script_from_row"""
+    for field in fields:
+        if field in ['label', 'group']:
+            continue
+        if field is None or len(field.split(':')) != 2:
+            raise ValidationError(
+                f'{source}: Fields must be "label", "group" or the field name and key seperated by colons'
+                f' like "label,systems:mysystem,vars:myvar", got "{field}".')
+        key_type, _ = field.split(':')
+        if key_type not in SCRIPT_FIELDS.keys():
+            raise ValidationError(
+                f'{source}: Field name is \'{key_type}\', but has to be one of {list(SCRIPT_FIELDS.keys())}.')
+
+
+def __getattr__(name: str):
+    # UnknownSecretTypeException was defined here before the teamvault module existed
+    if name == 'UnknownSecretTypeException':
+        from .teamvault import UnknownSecretTypeException
+
+        return UnknownSecretTypeException
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class VersionError(Exception):
@@ -1,7 +1,11 @@
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import patch
 
-from automatix.config import _overwrite, _tupelize, check_deprecated_syntax, check_version, VersionError
+from automatix.config import (
+    _overwrite, _tupelize, check_deprecated_syntax, check_step_options, check_version, ValidationError, VersionError,
+    CONFIG, arguments, get_script_cache_path, load_script,
+)
 
 tc = TestCase()
 
@@ -27,6 +31,20 @@ def test__overwrite():
     }
 
 
+def test__arguments__parallel_options():
+    args = arguments(['script.yaml', '--vars-file', 'v.csv', '--parallel', '--headless', '--max-parallel', '3'])
+    assert args.max_parallel == 3
+    assert arguments(['script.yaml', '--vars-file', 'v.csv', '--parallel', '--headless']).max_parallel == 10
+
+    for invalid in [
+        ['--headless'],
+        ['--parallel', '--max-parallel', '3'],
+        ['--parallel', '--headless', '--max-parallel', '0'],
+    ]:
+        with tc.assertRaises(SystemExit):
+            arguments(['script.yaml', '--vars-file', 'v.csv', *invalid])
+
+
 def test__tupelize():
     assert _tupelize('1.2.3.4') == (1, 2, 3, 4)
     with tc.assertRaises(ValueError):
@@ -94,3 +112,47 @@ def test__check_version__fail():
 
     with tc.assertRaises(SyntaxError):
         check_version('!! 3.7.2')
+
+
+def test__check_step_options():
+    check_step_options({'pipeline': [{'remote@system': 'vim /etc/hosts', 'tty': True}, {'local': 'ls'}]})
+
+    with tc.assertRaises(ValidationError):
+        check_step_options({'pipeline': [{'local': 'ls'}, {'remote@system': 'ls', 'unknown': True}]})
+
+    with tc.assertRaises(ValidationError):
+        check_step_options({'cleanup': [{'remote@system': 'ls', 'tty': 'yes'}]})
+
+
+def test__load_script__cache():
+    with TemporaryDirectory() as tempdir, patch.dict(CONFIG, {'cache_dir': tempdir, 'ssh_cmd': 'ssh -t {hostname}'}):
+        s_file = f'{tempdir}/script.yaml'
+        with open(s_file, 'w') as f:
+            f.write('name: test\npipeline:\n  - local: echo {CONST.x}\n')
+
+        script = load_script(s_file=s_file)
+        assert script['pipeline'] == [{'local': 'echo {CONST.x}'}]
+
+        with patch('automatix.config.read_yaml') as read_yaml:
+            assert load_script(s_file=s_file) == script
+        read_yaml.assert_not_called()
+
+        with open(s_file, 'a') as f:
+            f.write('  - local: echo changed\n')
+        assert len(load_script(s_file=s_file)['pipeline']) == 2
+
+
+def test__get_script_cache_path__depends_on_config():
+    with TemporaryDirectory() as tempdir, patch.dict(CONFIG, {'cache_dir': tempdir}):
+        s_file = f'{tempdir}/script.yaml'
+        with open(s_file, 'w') as f:
+            f.write('name: test\npipeline:\n  - local: echo ok\n')
+
+        cache_path = get_script_cache_path(s_file=s_file)
+        assert get_script_cache_path(s_file=s_file) == cache_path
+        for c_key, value in [('bundlewrap', not CONFIG['bundlewrap']), ('teamvault', not CONFIG['teamvault']),
+                             ('ssh_cmd', 'ssh {hostname}')]:
+            with patch.dict(CONFIG, {c_key: value}):
+                assert get_script_cache_path(s_file=s_file) != cache_path
+        with patch.dict(CONFIG, {'logger': 'other'}):
+            assert get_script_cache_path(s_file=s_file) == cache_path
@@ -1,10 +1,15 @@
 from argparse import Namespace
 from logging import getLogger
 from pathlib import Path
+from time import monotonic
+from typing import Callable
 
 from .config import init_logger
+from .events import EVENTS
 from .helpers import empty_queued_input_data
 from .progress_bar import block_progress_bar, draw_progress_bar
+from .shell_session import ShellSession
+from .ssh import SSHConnectionPool
 
 
 class AttributedDict(dict):
@@ -59,6 +64,15 @@ class PipelineEnvironment:
         self.LOG = None
         self.auto_file = None
 
+        self._ssh_pool = None
+        self._shell_sessions = {}
+
+        # Namespace of python commands, created on first use
+        self.python_globals = None
+
+        # Seconds spent waiting for user input
+        self.user_wait = 0.0
+
         # This will be set at runtime
         self.command_count = None
 
@@ -69,16 +83,74 @@ class PipelineEnvironment:
         self.LOG.handlers.clear()
         init_logger(name=self.LOG.name, debug=self.cmd_args.debug)
 
+    @property
+    def ssh_pool(self) -> SSHConnectionPool | None:
+        if not self.config['ssh_multiplexing']:
+            return None
+        if self._ssh_pool is None:
+            self._ssh_pool = SSHConnectionPool(control_persist=self.config['ssh_control_persist'])
+        return self._ssh_pool
+
+    def shell_session(
+            self,
+            key: str,
+            cmd: str,
+            precommand: str | None,
+            get_environment: Callable[[], dict] = None,
+    ) -> ShellSession:
+        """Get the running shell session for the key or start a new one"""
+        session = self._shell_sessions.get(key)
+        if session is not None and (not session.alive or session.precommand != precommand):
+            session.close()
+            session = None
+        if session is None:
+            session = self._shell_sessions[key] = ShellSession(
+                cmd=cmd,
+                bash_path=self.config['bash_path'],
+                encoding=self.config['encoding'],
+                precommand=precommand,
+                env=get_environment() if get_environment else None,
+            )
+        return session
+
+    def close_connections(self):
+        for session in self._shell_sessions.values():
+            session.close()
+        self._shell_sessions = {}
+        if self._ssh_pool is not None:
+            self._ssh_pool.close()
+            self._ssh_pool = None
+
+    def __getstate__(self):
+        # Connections and sessions belong to the running process and are not copied
+        state = self.__dict__.copy()
+        state['_ssh_pool'] = None
+        state['_shell_sessions'] = {}
+        state['python_globals'] = None
+        return state
+
     def send_status(self, status: str):
         # In parallel processing this method is overwritten to communicate with the UI
         return
 
+    def emit(self, event: str, **fields):
+        """Emit an event with the information about this batch item"""
+        if EVENTS.enabled:
+            EVENTS.emit(event, script=self.script_file_path.name, item=self.batch_index, name=self.name, **fields)
+
     def interact(self, question: str, progress_portion: int = None) -> str:
         if progress_portion is not None and self.config['progress_bar']:
             block_progress_bar(progress_portion)
         self.send_status('user_input_add')
+        self.emit('user_input_start')
         empty_queued_input_data()
-        answer = input(question)
+        start = monotonic()
+        try:
+            answer = input(question)
+        finally:
+            waited = monotonic() - start
+            self.user_wait += waited
+            self.emit('user_input_end', duration=waited)
         self.send_status('user_input_remove')
         if progress_portion is not None and self.config['progress_bar']:
             draw_progress_bar(progress_portion)
@@ -0,0 +1,174 @@
+import atexit
+import json
+import os
+from threading import Lock
+from time import monotonic, time
+
+
+class JsonLinesSink:
+    """
+    Writes every event as one JSON line.
+
+    The file is opened in append mode and every line is written with a single system call,
+    so the processes of a parallel run can share one event log.
+    """
+
+    def __init__(self, path: str):
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.lock = Lock()
+
+    def handle(self, event: dict):
+        line = json.dumps(event, default=str) + '\n'
+        with self.lock:
+            os.write(self.fd, line.encode())
+
+    def close(self):
+        with self.lock:
+            os.close(self.fd)
+
+
+class ChromeTraceSink:
+    """
+    Writes spans in the Chrome Trace Event format (JSON array format), e.g. for Perfetto or chrome://tracing.
+
+    Every process is a trace process, batch items and remote hosts get their own tracks (threads).
+    Like the event log, the file is shared by all processes of a parallel run. The main process creates it
+    and closes the JSON array at the end, the viewers accept a missing closing bracket as well.
+    """
+
+    # Events with a duration, which are drawn as spans: event name -> category
+    SPANS = {
+        'run_end': 'run',
+        'item_end': 'item',
+        'pipeline_end': 'pipeline',
+        'step_end': 'step',
+        'host_end': 'host',
+        'user_input_end': 'user_input',
+    }
+
+    def __init__(self, path: str, main: bool = False):
+        self.main = main
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | (os.O_TRUNC if main else 0)
+        self.fd = os.open(path, flags, 0o644)
+        self.lock = Lock()
+        self.tracks: dict[tuple, int] = {}
+        if main:
+            os.write(self.fd, b'[\n')
+        self._write({
+            'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'tid': 0,
+            'args': {'name': f'automatix{"" if main else " worker"} ({os.getpid()})'},
+        })
+
+    def _write(self, *trace_events: dict):
+        os.write(self.fd, ''.join(f'{json.dumps(e, default=str)},\n' for e in trace_events).encode())
+
+    def _track(self, pid: int, key: tuple, name: str) -> tuple[int, list[dict]]:
+        """Track id for an item or host, with the metadata event naming it, if it is new"""
+        if (tid := self.tracks.get(key)) is not None:
+            return tid, []
+        tid = self.tracks[key] = len(self.tracks) + 1
+        return tid, [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}]
+
+    def handle(self, event: dict):
+        if (category := self.SPANS.get(event['event'])) is None:
+            return
+        with self.lock:
+            pid, metadata = event['pid'], []
+            if 'item' in event:
+                tid, metadata = self._track(pid=pid, key=(event['item'],), name=f'{event["item"]}: {event["name"]}')
+            else:
+                tid = 0
+            match category:
+                case 'run':
+                    name = f'run {event["script"]}'
+                case 'item':
+                    name = event['name']
+                case 'pipeline':
+                    name = event['pipeline']
+                case 'step':
+                    name = f'{event["pipeline"]}:{event["index"]} {event["type"]}'
+                case 'host':
+                    tid, metadata = self._track(
+                        pid=pid, key=(event['item'], event['host']), name=f'{event["item"]}: {event["host"]}')
+                    name = f'{event["pipeline"]}:{event["index"]} {event["host"]}'
+                case _:
+                    name = 'waiting for user input'
+            args = {
+                key: value for key, value in event.items()
+                if key not in ['event', 'ts', 'time', 'pid', 'duration', 'script', 'item', 'name']
+            }
+            self._write(*metadata, {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': round((event['ts'] - event['duration']) * 1e6),
+                'dur': round(event['duration'] * 1e6),
+                'pid': pid,
+                'tid': tid,
+                'args': args,
+            })
+
+    def close(self):
+        with self.lock:
+            if self.main:
+                os.write(self.fd, b'{}]\n')
+            os.close(self.fd)
+
+
+class EventBus:
+    """
+    Distributes structured events to the configured sinks.
+
+    Every event has the name, a monotonic timestamp `ts` (seconds, comparable between processes
+    on the same host), the wall clock `time` and the process id. Without sinks emitting costs nothing.
+    """
+
+    def __init__(self):
+        self.sinks = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def add_sink(self, sink):
+        if not self.sinks:
+            atexit.register(self.close)
+        self.sinks.append(sink)
+
+    def emit(self, event: str, ts: float = None, **fields):
+        if not self.sinks:
+            return
+        now = monotonic()
+        if ts is None:
+            ts = now
+        # Events may be emitted afterwards with the timestamp of their occurrence
+        record = {'event': event, 'ts': ts, 'time': time() - (now - ts), 'pid': os.getpid()}
+        record.update(fields)
+        for sink in self.sinks:
+            sink.handle(record)
+
+    def close(self):
+        sinks, self.sinks = self.sinks, []
+        for sink in sinks:
+            sink.close()
+
+
+EVENTS = EventBus()
+
+
+def init_events(config: dict, main: bool = False):
+    """
+    Set up the sinks enabled in the configuration, once per process
+
+    :param main: the main process of a run, which creates files shared with the worker processes
+    """
+    if EVENTS.enabled:
+        return
+    if config.get('event_log'):
+        EVENTS.add_sink(JsonLinesSink(path=os.path.expanduser(os.path.expandvars(config['event_log']))))
+    if config.get('trace_file'):
+        EVENTS.add_sink(ChromeTraceSink(path=os.path.expanduser(os.path.expandvars(config['trace_file'])), main=main))
+    if config.get('metrics_file'):
+        from .metrics import MetricsSink
+
+        EVENTS.add_sink(MetricsSink(path=os.path.expanduser(os.path.expandvars(config['metrics_file'])), main=main))
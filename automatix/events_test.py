@@ -0,0 +1,60 @@
+import json
+from copy import deepcopy
+from tempfile import TemporaryDirectory
+
+from automatix.command import Command
+from automatix.events import EVENTS, ChromeTraceSink, JsonLinesSink
+from tests.test_environment import environment
+
+
+def test__json_lines_sink__step_events():
+    with TemporaryDirectory() as tempdir:
+        EVENTS.add_sink(JsonLinesSink(path=f'{tempdir}/events.jsonl'))
+        try:
+            env = deepcopy(environment)
+            Command(cmd={'a=local': 'echo hello'}, index=3, pipeline='pipeline', env=env, position=1).execute()
+            Command(cmd={'python': 'raise ValueError()'}, index=4, pipeline='pipeline', env=env,
+                    position=2).execute(force=True)
+        finally:
+            EVENTS.close()
+
+        with open(f'{tempdir}/events.jsonl') as f:
+            events = [json.loads(line) for line in f]
+
+    assert [event['event'] for event in events] == ['step_start', 'step_end', 'step_start', 'step_end']
+    assert events[1]['index'] == 3
+    assert events[1]['type'] == 'local'
+    assert events[1]['status'] == 'finished'
+    assert events[1]['exit_code'] == 0
+    assert events[1]['output_bytes'] == 6
+    assert events[1]['ts'] >= events[0]['ts']
+    assert events[3]['status'] == 'failed'
+    assert events[3]['exit_code'] == 1
+
+
+def test__chrome_trace_sink__spans_and_tracks():
+    with TemporaryDirectory() as tempdir:
+        sink = ChromeTraceSink(path=f'{tempdir}/trace.json', main=True)
+        sink.handle({'event': 'step_start', 'ts': 1.0, 'pid': 42, 'item': 0, 'name': 'first'})
+        sink.handle({
+            'event': 'step_end', 'ts': 3.0, 'pid': 42, 'item': 0, 'name': 'first', 'script': 's.yaml',
+            'pipeline': 'main', 'index': 1, 'type': 'remote', 'status': 'finished', 'duration': 2.0,
+        })
+        for host in ['host1', 'host2']:
+            sink.handle({
+                'event': 'host_end', 'ts': 2.5, 'pid': 42, 'item': 0, 'name': 'first',
+                'pipeline': 'main', 'index': 1, 'host': host, 'exit_code': 0, 'duration': 1.0,
+            })
+        sink.close()
+
+        with open(f'{tempdir}/trace.json') as f:
+            trace = json.load(f)
+
+    spans = [event for event in trace if event.get('ph') == 'X']
+    tracks = {event['tid']: event['args']['name'] for event in trace if event.get('name') == 'thread_name'}
+    assert [span['name'] for span in spans] == ['main:1 remote', 'main:1 host1', 'main:1 host2']
+    assert spans[0]['ts'] == 1000000
+    assert spans[0]['dur'] == 2000000
+    assert spans[0]['args'] == {'pipeline': 'main', 'index': 1, 'type': 'remote', 'status': 'finished'}
+    assert tracks == {1: '0: first', 2: '0: host1', 3: '0: host2'}
+    assert [span['tid'] for span in spans] == [1, 2, 3]
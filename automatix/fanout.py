@@ -0,0 +1,158 @@
+import os
+import selectors
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic
+
+from .colors import cyan
+
+OUTPUT_MODES = ['prefix', 'buffer', 'collapse']
+
+OUTPUT_LOCK = Lock()
+
+
+@dataclass
+class FanOutResult:
+    returncode: int
+    output: bytes  # captured stdout
+    start: float = 0.0  # monotonic
+    duration: float = 0.0
+
+
+class FanOut:
+    """
+    Runs shell commands concurrently (bounded by max_parallel) and relays their output.
+
+    Output modes:
+    prefix: print output lines immediately, prefixed with the label
+    buffer: print all output of a command at once when it is finished
+    collapse: print the output when all commands are finished, identical output of multiple commands only once
+    """
+
+    def __init__(
+            self,
+            commands: dict[str, str],
+            max_parallel: int,
+            bash_path: str,
+            environment: dict,
+            encoding: str,
+            output_mode: str = 'prefix',
+    ):
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f'Unknown output mode "{output_mode}". Use one of {OUTPUT_MODES}.')
+        self.commands = commands
+        self.max_parallel = max(1, max_parallel)
+        self.bash_path = bash_path
+        self.environment = environment
+        self.encoding = encoding
+        self.output_mode = output_mode
+
+        self.processes: dict[str, subprocess.Popen] = {}
+        self.results: dict[str, FanOutResult] = {}
+        self.collected_lines: dict[str, list[str]] = {}
+        self.interrupted: list[str] = []
+
+    def run(self) -> dict[str, FanOutResult]:
+        """
+        On KeyboardInterrupt all running processes are terminated and the exception is reraised.
+        Then `interrupted` contains the labels of the started, but not finished commands.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_parallel)
+        try:
+            futures = [executor.submit(self._run_command, label) for label in self.commands]
+            wait(futures)
+            for future in futures:
+                future.result()  # reraise exceptions from threads
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            for label, process in self.processes.items():
+                if process.poll() is None:
+                    self.interrupted.append(label)
+                    process.terminate()
+            raise
+        executor.shutdown()
+        if self.output_mode == 'collapse':
+            self._print_collapsed_output()
+        return self.results
+
+    def _print_collapsed_output(self):
+        groups = {}
+        for label in self.commands:
+            if (result := self.results.get(label)) is None:
+                continue
+            groups.setdefault((result.returncode, tuple(self.collected_lines[label])), []).append(label)
+
+        for (returncode, lines), labels in groups.items():
+            print(cyan(f'--- {", ".join(labels)} (return code {returncode}) ---'))
+            for line in lines:
+                print(line)
+        sys.stdout.flush()
+
+    def _run_command(self, label: str):
+        start = monotonic()
+        process = self.processes[label] = subprocess.Popen(
+            self.commands[label],
+            env=self.environment,
+            executable=self.bash_path,
+            shell=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        output = self._relay_output(label=label, process=process)
+        returncode = process.wait()  # negative, if the process was killed by a signal
+        self.results[label] = FanOutResult(
+            returncode=returncode, output=output, start=start, duration=monotonic() - start,
+        )
+
+    def _relay_output(self, label: str, process: subprocess.Popen) -> bytes:
+        captured = []
+        buffered = []
+
+        collected = self.collected_lines[label] = []
+
+        def emit(stream, line: bytes):
+            if self.output_mode == 'collapse':
+                collected.append(line.decode(self.encoding, errors='replace'))
+                return
+            text = f'{cyan(f"[{label}]")} {line.decode(self.encoding, errors="replace")}\n'
+            if self.output_mode == 'buffer':
+                buffered.append((stream, text))
+            else:
+                with OUTPUT_LOCK:
+                    stream.write(text)
+                    stream.flush()
+
+        self._read_lines(process=process, emit=emit, captured=captured)
+
+        if buffered:
+            with OUTPUT_LOCK:
+                for stream, text in buffered:
+                    stream.write(text)
+                    stream.flush()
+
+        return b''.join(captured)
+
+    @staticmethod
+    def _read_lines(process: subprocess.Popen, emit, captured: list[bytes]):
+        """Pass every line of stdout and stderr to emit(stream, line) and capture stdout"""
+        partial = {}
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ, sys.stdout)
+            selector.register(process.stderr, selectors.EVENT_READ, sys.stderr)
+            while selector.get_map():
+                for key, _ in selector.select():
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        if rest := partial.pop(key.fd, b''):
+                            emit(key.data, rest)
+                        continue
+                    if key.fileobj is process.stdout:
+                        captured.append(data)
+                    *lines, partial[key.fd] = (partial.get(key.fd, b'') + data).split(b'\n')
+                    for line in lines:
+                        emit(key.data, line)
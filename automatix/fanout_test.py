@@ -0,0 +1,59 @@
+import os
+
+from automatix.fanout import FanOut
+
+
+def test__fanout__results_and_output(capfd):
+    fanout = FanOut(
+        commands={
+            'first': 'echo "first output"; echo "first error" >&2',
+            'second': 'printf "no newline"; exit 3',
+        },
+        max_parallel=2,
+        bash_path='/bin/bash',
+        environment=os.environ.copy(),
+        encoding='utf-8',
+    )
+    results = fanout.run()
+
+    assert results['first'].returncode == 0
+    assert results['first'].output == b'first output\n'
+    assert results['second'].returncode == 3
+    assert results['second'].output == b'no newline'
+
+    out, err = capfd.readouterr()
+    assert '[first]\033[0m first output\n' in out
+    assert '[second]\033[0m no newline\n' in out
+    assert '[first]\033[0m first error\n' in err
+
+
+def test__fanout__collapse(capfd):
+    fanout = FanOut(
+        commands={'a': 'echo same', 'b': 'echo different', 'c': 'echo same'},
+        max_parallel=3,
+        bash_path='/bin/bash',
+        environment=os.environ.copy(),
+        encoding='utf-8',
+        output_mode='collapse',
+    )
+    fanout.run()
+
+    out, err = capfd.readouterr()
+    assert out.count('same\n') == 1
+    assert '--- a, c (return code 0) ---' in out
+    assert '--- b (return code 0) ---' in out
+
+
+def test__fanout__killed_command_is_failure():
+    fanout = FanOut(
+        commands={'ok': 'true', 'killed': 'kill -9 $$'},
+        max_parallel=2,
+        bash_path='/bin/bash',
+        environment=os.environ.copy(),
+        encoding='utf-8',
+    )
+    results = fanout.run()
+
+    assert results['ok'].returncode == 0
+    assert results['killed'].returncode == -9
+    assert fanout.interrupted == []
@@ -0,0 +1,227 @@
+import os
+import pickle
+import subprocess
+import sys
+from argparse import Namespace
+from dataclasses import asdict
+from queue import Queue
+from tempfile import TemporaryDirectory
+from threading import Lock, Thread
+from time import time
+
+from .colors import cyan, green, red
+from .config import LOG
+from .parallel import Autos, apply_status, emit_status, get_files, get_logfile_dir, get_socket_path
+from .parallel_runner import create_auto_files, start_secrets_server
+from .status_channel import StatusServer
+
+OUTPUT_LOCK = Lock()
+
+
+class HeadlessItem:
+    """One automatix file processed by an `automatix-from-file` child process"""
+
+    def __init__(self, auto_file: str, label: str, process: subprocess.Popen, logfile_path: str):
+        self.auto_file = auto_file
+        self.label = label
+        self.process = process
+        self.logfile_path = logfile_path
+
+        self.partial = b''
+        self.continued = False  # An incomplete line has been printed already
+        self.focused = False  # The user is prompted for input of this item
+        self.relay_thread = Thread(target=self._relay_output, daemon=True)
+        self.relay_thread.start()
+
+    def _relay_output(self):
+        fd = self.process.stdout.fileno()
+        with open(self.logfile_path, 'ab') as logfile:
+            while data := os.read(fd, 65536):
+                logfile.write(data)
+                logfile.flush()
+                with OUTPUT_LOCK:
+                    *lines, self.partial = (self.partial + data).split(b'\n')
+                    for line in lines:
+                        self._write(line + b'\n')
+                    if self.focused:
+                        self.flush_partial()
+            with OUTPUT_LOCK:
+                if self.partial:
+                    self._write(self.partial + b'\n')
+                    self.partial = b''
+
+    def _write(self, line: bytes):
+        prefix = '' if self.continued else f'{cyan(f"[{self.label}]")} '
+        sys.stdout.write(f'{prefix}{line.decode(errors="replace")}')
+        sys.stdout.flush()
+        self.continued = not line.endswith(b'\n')
+
+    def flush_partial(self):
+        """Print an incomplete line, e.g. a question waiting for an answer (call with OUTPUT_LOCK held)"""
+        if self.partial:
+            self._write(self.partial)
+            self.partial = b''
+
+    def answer(self, line: str | None):
+        """Forward an answer to the item, None closes its input"""
+        try:
+            if line is None:
+                self.process.stdin.close()
+            else:
+                self.process.stdin.write(line.encode())
+                self.process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass  # The item is already gone
+
+
+class HeadlessRunner:
+    """
+    Runs the automatix files concurrently as child processes without GNU screen.
+
+    Output of the items is prefixed with their label and written to one logfile per item.
+    Items waiting for user input are queued and prompted one after the other on our terminal.
+    """
+
+    def __init__(self, tempdir: str, time_id: int, logfile_dir: str, max_parallel: int):
+        self.tempdir = tempdir
+        self.time_id = time_id
+        self.logfile_dir = logfile_dir
+
+        auto_files = sorted(get_files(tempdir))
+        self.autos = Autos(
+            socket_path=get_socket_path(tempdir=tempdir, time_id=time_id),
+            time_id=time_id,
+            count=len(auto_files),
+            tempdir=tempdir,
+            max_parallel=max_parallel,
+            waiting=auto_files,
+        )
+        self.items: dict[str, HeadlessItem] = {}
+        self.returncodes: dict[str, int] = {}
+        self.prompts: Queue[str] = Queue()
+        self.lock = Lock()  # for changes of autos, which is also read by the prompt thread
+
+    def run(self) -> dict[str, int]:
+        """Process all items and return their exit codes"""
+        Thread(target=self._prompt_loop, daemon=True).start()
+
+        try:
+            with StatusServer(socket_path=self.autos.socket_path, snapshot=lambda: asdict(self.autos)) as server:
+                while len(self.autos.finished) < self.autos.count:
+                    self._step(server=server)
+        except KeyboardInterrupt:
+            for item in self.items.values():
+                if item.process.poll() is None:
+                    item.process.terminate()
+            raise
+
+        for item in self.items.values():
+            item.relay_thread.join()
+        return self.returncodes
+
+    def _step(self, server: StatusServer):
+        """Start waiting items, process status events and notice ended processes"""
+        while len(self.autos.running) < self.autos.max_parallel and self.autos.waiting:
+            self._start(auto_file=self.autos.waiting[0])
+
+        for auto_file, status in server.poll(timeout=0.5):
+            self._apply_status(auto_file=auto_file, status=status)
+
+        for auto_file in list(self.autos.running):
+            if self.items[auto_file].process.poll() is not None:
+                self._apply_status(auto_file=auto_file, status='finished')
+
+    def _start(self, auto_file: str):
+        with open(f'{self.tempdir}/{auto_file}', 'rb') as f:
+            label = pickle.load(file=f)['label']
+
+        process = subprocess.Popen(
+            ['automatix-from-file', self.tempdir, str(self.time_id), auto_file],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=os.environ | {'PYTHONUNBUFFERED': '1', 'AUTOMATIX_PROGRESS_BAR': 'false'},
+        )
+        self.items[auto_file] = HeadlessItem(
+            auto_file=auto_file,
+            label=label,
+            process=process,
+            logfile_path=f'{self.logfile_dir}/{auto_file}.log',
+        )
+        with self.lock:
+            apply_status(autos=self.autos, auto_file=auto_file, status='started')
+        emit_status(autos=self.autos)
+        LOG.info(f'Started {auto_file} ({label})')
+
+    def _apply_status(self, auto_file: str, status: str):
+        LOG.debug(f'Got {auto_file}:{status}')
+        if status == 'finished' and auto_file not in self.autos.running:
+            return  # Already noticed the end of the process
+        try:
+            with self.lock:
+                apply_status(autos=self.autos, auto_file=auto_file, status=status)
+        except ValueError as exc:
+            LOG.warning(f'[{auto_file}] {exc}')
+            return
+        emit_status(autos=self.autos)
+
+        match status:
+            case 'user_input_add':
+                self.prompts.put(auto_file)
+            case 'finished':
+                returncode = self.returncodes[auto_file] = self.items[auto_file].process.wait()
+                result = green('finished') if returncode == 0 else red(f'failed (exit code {returncode})')
+                LOG.info(f'{auto_file} ({self.items[auto_file].label}) {result}'
+                         f' [{len(self.autos.finished)}/{self.autos.count}]')
+
+    def _prompt_loop(self):
+        while True:
+            auto_file = self.prompts.get()
+            with self.lock:
+                waiting = auto_file in self.autos.user_input
+            if not waiting:
+                continue  # The item does not wait anymore
+            item = self.items[auto_file]
+            with OUTPUT_LOCK:
+                sys.stdout.write(f'\n{cyan(f"### Input required for [{item.label}]:")}\n')
+                item.focused = True
+                item.flush_partial()
+            answer = sys.stdin.readline()
+            with OUTPUT_LOCK:
+                item.focused = False
+            if not answer:
+                LOG.error(f'[{item.label}] No input available, closing input of the item')
+            item.answer(answer or None)
+
+
+def run_parallel_headless(script: dict, batch_items: list, args: Namespace) -> int:
+    LOG.info('Preparing automatix objects for headless parallel processing')
+
+    with TemporaryDirectory() as tempdir:
+        time_id = round(time())
+        logfile_dir = get_logfile_dir(time_id=time_id, scriptfile=args.scriptfile)
+        os.makedirs(logfile_dir)
+
+        create_auto_files(script=script, batch_items=batch_items, args=args, tempdir=tempdir, logfile_dir=logfile_dir)
+        LOG.info(f'Created directory for logfiles at {logfile_dir}')
+
+        runner = HeadlessRunner(tempdir=tempdir, time_id=time_id, logfile_dir=logfile_dir,
+                                max_parallel=args.max_parallel)
+        secrets_server = start_secrets_server(tempdir=tempdir, time_id=time_id)
+        try:
+            returncodes = runner.run()
+        except KeyboardInterrupt:
+            print()
+            LOG.warning('Aborted by user. Exiting.')
+            return 130
+        finally:
+            if secrets_server is not None:
+                secrets_server.close()
+
+    failed = [auto_file for auto_file, returncode in returncodes.items() if returncode != 0]
+    if failed:
+        LOG.error(f'{len(failed)} of {len(returncodes)} items failed: {", ".join(sorted(failed))}')
+    else:
+        LOG.info(f'All {len(returncodes)} items finished successfully')
+    LOG.info(f'All logfiles are available at {logfile_dir}')
+    return 1 if failed else 0
@@ -0,0 +1,24 @@
+import subprocess
+from tempfile import TemporaryDirectory
+
+from automatix.headless_runner import HeadlessItem
+
+
+def test__headless_item__output_and_answer(capfd):
+    with TemporaryDirectory() as tempdir:
+        process = subprocess.Popen(
+            'echo first; read answer; echo "got $answer"; printf incomplete',
+            shell=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        item = HeadlessItem(auto_file='auto1', label='mylabel', process=process, logfile_path=f'{tempdir}/auto1.log')
+        item.answer('yes\n')
+        process.wait()
+        item.relay_thread.join()
+
+        with open(f'{tempdir}/auto1.log') as f:
+            assert f.read() == 'first\ngot yes\nincomplete'
+
+    out, err = capfd.readouterr()
+    assert out == ''.join(f'\033[36m[mylabel]\033[0m {line}\n' for line in ['first', 'got yes', 'incomplete'])
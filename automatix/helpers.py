@@ -1,6 +1,5 @@
-import os
 from sys import stdin
-from time import sleep
+from time import perf_counter
 from typing import List
 
 import yaml
@@ -8,14 +7,18 @@ from termios import tcflush, TCIFLUSH
 
 yaml.warnings({'YAMLLoadWarning': False})
 
+# libyaml based loader is much faster, but is only available if PyYAML was built with it
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 def read_yaml(yamlfile: str) -> dict:
     with open(yamlfile) as file:
-        return yaml.load(file.read(), Loader=yaml.SafeLoader)
+        return yaml.load(file.read(), Loader=YAML_LOADER)
 
 
 def empty_queued_input_data():
-    tcflush(stdin, TCIFLUSH)
+    if stdin.isatty():  # Input may be a pipe, e.g. in headless parallel processing
+        tcflush(stdin, TCIFLUSH)
 
 
 def selector(entries: List[tuple], message: str = 'Found multiple entries, please choose:'):
@@ -41,43 +44,18 @@ def selector(entries: List[tuple], message: str = 'Found multiple entries, pleas
                 return selector(entries)
 
 
-def search_script(name: str, script_dir: str, non_interactive: bool = False) -> str | None:
-    paths = []
-    for dirpath, dirnames, filenames in os.walk(script_dir):
-        for filename in filenames:
-            if filename == name:
-                path = str(os.path.join(dirpath, filename))
-                paths.append((path, path))  # Second one is the label for the selector
-    if non_interactive and len(paths) != 1:
-        return None
-    return selector(entries=paths, message='Script found at multiple locations. Please choose:')
-
-
-class FileWithLock:
-    def __init__(self, file_path: str, method: str):
-        self.file_path = file_path
-        self.method = method
-        self.file_obj = None
-
-    def __enter__(self):
-        get_lock(self.file_path)
-        self.file_obj = open(self.file_path, self.method)
-        return self.file_obj
-
-    def __exit__(self, type, value, traceback):
-        self.file_obj.close()
-        release_lock(self.file_path)
-
+class StartupTimer:
+    """Durations of the startup phases for the debug log"""
 
-def get_lock(file_path: str):
-    while True:
-        try:
-            os.mkdir(f'{file_path}.lock')
-        except FileExistsError:
-            sleep(1)
-            continue
-        break
+    def __init__(self, start: float):
+        self.start = self.last = start
+        self.laps: list[tuple[str, float]] = []
 
+    def lap(self, name: str):
+        now = perf_counter()
+        self.laps.append((name, now - self.last))
+        self.last = now
 
-def release_lock(file_path: str):
-    os.rmdir(f'{file_path}.lock')
+    def summary(self) -> str:
+        laps = ', '.join(f'{name}: {duration * 1000:.0f}ms' for name, duration in self.laps)
+        return f'Startup took {(self.last - self.start) * 1000:.0f}ms ({laps})'
@@ -0,0 +1,120 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from .automatix import find_undefined_vars
+from .colors import green, red, yellow
+from .config import CONFIG, LOG, SCRIPT_DIR, get_script_catalog, validate_script
+from .helpers import read_yaml
+from .script_catalog import SCRIPT_EXTENSIONS
+
+POOL_THRESHOLD = 20  # Smaller numbers of scripts are validated in our process
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord):
+        self.messages.append(record.getMessage())
+
+
+def lint_script(path: str) -> dict:
+    """Validate one script and return its errors and warnings"""
+    handler = CollectingHandler()
+    LOG.addHandler(handler)
+    errors = []
+    try:
+        script = read_yaml(path)
+        validate_script(script, check_config=False)
+        # Variables of a vars file are not known here
+        handler.messages.extend(find_undefined_vars(script=script, config=CONFIG))
+    except Exception as exc:
+        errors.append(f'{type(exc).__name__}: {exc}')
+    finally:
+        LOG.removeHandler(handler)
+    return {'path': path, 'errors': errors, 'warnings': handler.messages}
+
+
+def collect_scripts(paths: list[str]) -> list[str]:
+    """Script files in the given files and directories, all scripts in the script directory without paths"""
+    if not paths:
+        catalog = get_script_catalog()
+        catalog.refresh()
+        return sorted(
+            os.path.join(SCRIPT_DIR, rel_dir, filename)
+            for rel_dir, entry in catalog.dirs.items()
+            for filename in entry['files'] if filename.endswith(SCRIPT_EXTENSIONS)
+        )
+
+    scripts = []
+    for path in paths:
+        if not os.path.isdir(path):
+            scripts.append(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            scripts.extend(os.path.join(dirpath, name) for name in filenames if name.endswith(SCRIPT_EXTENSIONS))
+    return sorted(scripts)
+
+
+def lint_scripts(scripts: list[str], jobs: int | None = None) -> list[dict]:
+    if len(scripts) < POOL_THRESHOLD or jobs == 1:
+        return [lint_script(path) for path in scripts]
+    workers = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lint_script, scripts, chunksize=max(1, len(scripts) // (4 * workers))))
+
+
+def print_text(results: list[dict]):
+    for result in results:
+        for error in result['errors']:
+            print(f'{result["path"]}: {red("ERROR")} {error}')
+        for warning in result['warnings']:
+            print(f'{result["path"]}: {yellow("WARNING")} {warning}')
+
+
+def run_lint():
+    parser = argparse.ArgumentParser(
+        description='Validate automatix scripts without executing them',
+        epilog='Explanations and README at https://github.com/seibert-media/automatix',
+    )
+    parser.add_argument(
+        'paths',
+        nargs='*',
+        help='Script files or directories to validate (default: all scripts in the script directory)',
+    )
+    parser.add_argument(
+        '--format',
+        choices=['text', 'json'],
+        default='text',
+        help='Output format (default: text)',
+    )
+    parser.add_argument(
+        '--strict',
+        action='store_true',
+        help='Exit with return code 1 also on warnings',
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        help='Number of processes for validating many scripts (default: number of CPUs)',
+    )
+    args = parser.parse_args()
+
+    results = lint_scripts(scripts=collect_scripts(paths=args.paths), jobs=args.jobs)
+    errors = sum(len(result['errors']) for result in results)
+    warnings = sum(len(result['warnings']) for result in results)
+
+    if args.format == 'json':
+        json.dump({'scripts': results, 'errors': errors, 'warnings': warnings}, sys.stdout, indent=2)
+        print()
+    else:
+        print_text(results=results)
+        summary = f'Checked {len(results)} scripts: {errors} errors, {warnings} warnings'
+        print(red(summary) if errors else yellow(summary) if warnings else green(summary))
+
+    sys.exit(1 if errors or (args.strict and warnings) else 0)
@@ -0,0 +1,31 @@
+import os
+from tempfile import TemporaryDirectory
+
+from automatix.lint import collect_scripts, lint_scripts
+
+
+def test__lint_scripts():
+    with TemporaryDirectory() as tempdir:
+        scripts = {
+            'ok.yaml': 'name: ok\npipeline:\n  - local: echo ok\n',
+            'sub/warning.yml': 'name: warning\npipeline:\n  - local: echo {const_x}\n',
+            'sub/error.yaml': 'name: error\npipeline:\n  - local: echo\n    unknown: true\n',
+            'sub/notes.txt': 'no script',
+        }
+        for name, content in scripts.items():
+            os.makedirs(os.path.dirname(f'{tempdir}/{name}'), exist_ok=True)
+            with open(f'{tempdir}/{name}', 'w') as f:
+                f.write(content)
+
+        paths = collect_scripts(paths=[tempdir])
+        assert paths == [f'{tempdir}/ok.yaml', f'{tempdir}/sub/error.yaml', f'{tempdir}/sub/warning.yml']
+
+        for jobs in [1, 2]:
+            ok, error, warning = lint_scripts(scripts=paths * 10, jobs=jobs)[:3]
+            assert ok['errors'] == ok['warnings'] == []
+            assert error['errors'] == ['ValidationError: [pipeline:0] Unknown step option "unknown".'
+                                       ' Allowed options are [\'tty\', \'parallel\', \'output\'].']
+            assert warning['warnings'] == [
+                '[pipeline:0] Using "{const_x}" does not work any longer. Use "{CONST.x}" instead.',
+                '[pipeline:0] "const_x" is not defined.',
+            ]
@@ -0,0 +1,181 @@
+import fcntl
+import json
+import os
+from threading import Event, Lock, Thread
+from time import time
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+WRITE_INTERVAL = 15  # seconds
+ITEM_STATES = ['waiting', 'running', 'user_input', 'finished']
+
+HELP = {
+    'automatix_steps_total': ('counter', 'Executed steps by script, type and status'),
+    'automatix_step_duration_seconds': ('histogram', 'Step duration by script and type'),
+    'automatix_step_cpu_seconds_total': ('counter', 'CPU time (user and system) of local processes by script and type'),
+    'automatix_host_duration_seconds': ('histogram', 'Duration of remote commands by script and host'),
+    'automatix_items_total': ('counter', 'Processed batch items by script and status'),
+    'automatix_user_wait_seconds_total': ('counter', 'Time spent waiting for user input by script'),
+    'automatix_items': ('gauge', 'Batch items of the current run by state'),
+    'automatix_metrics_updated_timestamp_seconds': ('gauge', 'Unix time of the last update of this file'),
+}
+
+
+def _key(name: str, labels: dict) -> str:
+    return json.dumps([name, labels], sort_keys=True)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metrics:
+    """Counters, histograms and gauges, with series keys as produced by `_key`"""
+
+    def __init__(self, counters: dict = None, histograms: dict = None, gauges: dict = None):
+        self.counters: dict[str, float] = counters or {}
+        # key -> [bucket counts (one more for +Inf)..., sum]
+        self.histograms: dict[str, list] = histograms or {}
+        self.gauges: dict[str, float] = gauges or {}
+
+    def __bool__(self) -> bool:
+        return bool(self.counters or self.histograms or self.gauges)
+
+    def inc(self, name: str, labels: dict, value: float = 1):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: dict, value: float):
+        key = _key(name, labels)
+        histogram = self.histograms.setdefault(key, [0] * (len(DURATION_BUCKETS) + 2))
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[len(DURATION_BUCKETS)] += 1
+        histogram[-1] += value
+
+    def set(self, name: str, labels: dict, value: float):
+        self.gauges[_key(name, labels)] = value
+
+    def merge(self, other: 'Metrics'):
+        """Add the counters and histograms of other, take over its gauges"""
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, values in other.histograms.items():
+            histogram = self.histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                histogram[i] += value
+        self.gauges.update(other.gauges)
+
+    def render(self) -> str:
+        """Prometheus text exposition format, as read by the node exporter textfile collector"""
+        series: dict[str, list[str]] = {}
+        for key, value in sorted({**self.counters, **self.gauges}.items()):
+            name, labels = json.loads(key)
+            series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for key, histogram in sorted(self.histograms.items()):
+            name, labels = json.loads(key)
+            lines = series.setdefault(name, [])
+            count = 0
+            for bound, bucket in zip([*DURATION_BUCKETS, '+Inf'], histogram):
+                count += bucket
+                lines.append(f'{name}_bucket{_format_labels({**labels, "le": bound})} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        text = []
+        for name, lines in series.items():
+            metric_type, description = HELP[name]
+            text.extend([f'# HELP {name} {description}', f'# TYPE {name} {metric_type}', *lines])
+        return '\n'.join(text) + '\n'
+
+
+class MetricsSink:
+    """
+    Aggregates events into metrics and writes them periodically to a textfile for Prometheus.
+
+    All processes of a parallel run share the file: Every process adds the metrics collected since
+    its last write to a state file next to it (`<metrics_file>.state`) under a file lock and renders
+    the text file from there. Counters are cumulative over all runs, the item gauges belong to the current run.
+    """
+
+    def __init__(self, path: str, main: bool = False, interval: float = WRITE_INTERVAL):
+        self.path = path
+        self.state_path = f'{path}.state'
+        self.lock = Lock()
+        self.pending = Metrics()
+        if main:
+            for state in ITEM_STATES:
+                self.pending.set('automatix_items', {'state': state}, 0)
+            self.write()
+        self._stop = Event()
+        self._thread = Thread(target=self._write_periodically, kwargs={'interval': interval}, daemon=True)
+        self._thread.start()
+
+    def handle(self, event: dict):
+        with self.lock:
+            self._collect(event=event)
+
+    def _collect(self, event: dict):
+        match event['event']:
+            case 'step_end':
+                labels = {'script': event['script'], 'type': event['type']}
+                self.pending.inc('automatix_steps_total', {**labels, 'status': event['status']})
+                self.pending.observe('automatix_step_duration_seconds', labels, event['duration'])
+                if resources := event.get('resources'):
+                    self.pending.inc(
+                        'automatix_step_cpu_seconds_total', labels, resources['user_time'] + resources['system_time'])
+            case 'host_end':
+                self.pending.observe(
+                    'automatix_host_duration_seconds', {'script': event['script'], 'host': event['host']},
+                    event['duration'],
+                )
+            case 'item_end':
+                self.pending.inc('automatix_items_total', {'script': event['script'], 'status': event['status']})
+                self.pending.inc('automatix_user_wait_seconds_total', {'script': event['script']}, event['user_wait'])
+            case 'items_status':
+                for state in ITEM_STATES:
+                    self.pending.set('automatix_items', {'state': state}, event[state])
+
+    def _write_periodically(self, interval: float):
+        while not self._stop.wait(interval):
+            self.write()
+
+    def write(self):
+        with self.lock:
+            pending, self.pending = self.pending, Metrics()
+        pending.set('automatix_metrics_updated_timestamp_seconds', {}, round(time(), 3))
+
+        with open(self.state_path, 'a+') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            state_file.seek(0)
+            try:
+                metrics = Metrics(**json.loads(state_file.read()))
+            except ValueError:
+                metrics = Metrics()
+            metrics.merge(pending)
+            state_file.seek(0)
+            state_file.truncate()
+            json.dump(vars(metrics), state_file)
+            state_file.flush()
+
+            # Write atomically, so the collector never reads a partial file
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(metrics.render())
+            os.replace(tmp_path, self.path)
+
+    def close(self):
+        self._stop.set()
+        self.write()
@@ -0,0 +1,45 @@
+from tempfile import TemporaryDirectory
+
+from automatix.metrics import MetricsSink
+
+
+def step_end(script: str, type_: str, status: str, duration: float) -> dict:
+    return {'event': 'step_end', 'script': script, 'type': type_, 'status': status, 'duration': duration}
+
+
+def test__metrics_sink__shared_between_processes():
+    with TemporaryDirectory() as tempdir:
+        path = f'{tempdir}/automatix.prom'
+        main = MetricsSink(path=path, main=True)
+        worker = MetricsSink(path=path)
+
+        main.handle({
+            'event': 'items_status', 'waiting': 1, 'running': 2, 'user_input': 1, 'finished': 0, 'count': 3,
+        })
+        worker.handle(step_end(script='s.yaml', type_='local', status='finished', duration=0.3))
+        worker.handle(step_end(script='s.yaml', type_='local', status='failed', duration=20))
+        worker.handle({'event': 'host_end', 'script': 's.yaml', 'host': 'host1', 'duration': 2})
+        worker.handle({'event': 'item_end', 'script': 's.yaml', 'status': 'finished', 'user_wait': 1.5})
+        worker.close()
+        main.close()
+
+        # A second run adds up the counters
+        worker = MetricsSink(path=path)
+        worker.handle(step_end(script='s.yaml', type_='local', status='finished', duration=0.05))
+        worker.close()
+
+        with open(path) as f:
+            lines = f.read().splitlines()
+
+    assert '# TYPE automatix_steps_total counter' in lines
+    assert 'automatix_steps_total{script="s.yaml",status="finished",type="local"} 2' in lines
+    assert 'automatix_steps_total{script="s.yaml",status="failed",type="local"} 1' in lines
+    assert 'automatix_step_duration_seconds_bucket{script="s.yaml",type="local",le="0.1"} 1' in lines
+    assert 'automatix_step_duration_seconds_bucket{script="s.yaml",type="local",le="0.5"} 2' in lines
+    assert 'automatix_step_duration_seconds_bucket{script="s.yaml",type="local",le="+Inf"} 3' in lines
+    assert 'automatix_step_duration_seconds_count{script="s.yaml",type="local"} 3' in lines
+    assert 'automatix_step_duration_seconds_sum{script="s.yaml",type="local"} 20.35' in lines
+    assert 'automatix_host_duration_seconds_count{host="host1",script="s.yaml"} 1' in lines
+    assert 'automatix_user_wait_seconds_total{script="s.yaml"} 1.5' in lines
+    assert 'automatix_items{state="running"} 2' in lines
+    assert 'automatix_items{state="user_input"} 1' in lines
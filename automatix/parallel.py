@@ -1,24 +1,31 @@
 import argparse
+import errno
+import logging
+import os
 import pickle
-import subprocess
-from dataclasses import dataclass, field
-from os import listdir, unlink
+from dataclasses import dataclass, field, asdict
 from os.path import isfile
 from pathlib import Path
 from time import sleep, strftime, gmtime
 
-from .batch_runner import run_automatix_list
+from .batch_runner import create_automatix_list, run_automatix_list
 from .colors import yellow, green, red, cyan
 from .config import LOG, init_logger, CONFIG
-from .helpers import FileWithLock
+from .events import EVENTS, init_events
+from .parallel_backends import ScreenBackend, PtyBackend
+from .profiling import PROFILER
 from .progress_bar import setup_scroll_area, destroy_scroll_area
+from .status_channel import StatusClient, StatusServer, fetch_secrets
+from .teamvault import SECRETS
+
+SessionBackend = ScreenBackend | PtyBackend
 
 STATUS_TEMPLATE = 'waiting: {w}, running: {r}, user input required: {u}, finished: {f}'
 
 
 @dataclass
 class Autos:
-    status_file: str
+    socket_path: str
     time_id: int
     count: int
     tempdir: str
@@ -30,17 +37,25 @@ class Autos:
     finished: list = field(default_factory=list)
 
 
+def get_socket_path(tempdir: str, time_id: int) -> str:
+    return f'{tempdir}/{time_id}.sock'
+
+
+def get_secrets_socket_path(tempdir: str, time_id: int) -> str:
+    return f'{tempdir}/{time_id}_secrets.sock'
+
+
 def get_logfile_dir(time_id: int, scriptfile: str) -> str:
     human_readable_time = strftime('%Y-%m-%d_%H-%M-%S_UTC', gmtime(time_id))
     return f'{CONFIG.get("logfile_dir")}/{human_readable_time}__{Path(scriptfile).stem}'
 
 
 def get_files(tempdir: str) -> set:
-    return {f for f in listdir(tempdir) if isfile(f'{tempdir}/{f}') and f.startswith('auto')}
+    return {f for f in os.listdir(tempdir) if isfile(f'{tempdir}/{f}') and f.startswith('auto')}
 
 
-def print_status(autos: Autos):
-    print(STATUS_TEMPLATE.format(
+def print_status(autos: Autos, log: logging.Logger = LOG):
+    log.info(STATUS_TEMPLATE.format(
         w=yellow(len(autos.waiting)),
         r=cyan(len(autos.running)),
         u=red(len(autos.user_input)),
@@ -48,99 +63,146 @@ def print_status(autos: Autos):
     ))
 
 
-def get_screen_status_line(label: str) -> str:
-    status_line = yellow(f'### {label}')
-    status_line += f' | detach: {cyan("<ctrl>+a d")}'
-    status_line += f' | copy mode: {cyan("<ctrl>+a Esc")}'
-    status_line += f' | abort copy mode: {cyan("Esc ")}'
-    # It seems we need the space after this Esc,  ^^^
-    # otherwise the color reset escape sequence stops working.
-    return status_line
-
-
-def check_for_status_change(autos: Autos, status_file: str):
-    with FileWithLock(status_file, 'r+') as sf:
-        for line in sf:
-            if not line:
-                continue
-            LOG.debug(f'Line: {line}')
-            auto_file, status = line.strip().split(':')
-            LOG.debug(f'Got {auto_file}:{status}')
-            match status:
-                case 'max_parallel':
-                    # In this case we misuse the "auto_file" part as number
-                    # for how many parallel screens are allowed.
-                    autos.max_parallel = int(auto_file)
-                    LOG.info(f'Now process max {auto_file} screens parallel')
-                case 'user_input_remove':
-                    autos.user_input.remove(auto_file)
-                case 'user_input_add':
-                    autos.user_input.append(auto_file)
-                    LOG.info(f'{auto_file} is waiting for user input')
-                case 'finished':
-                    autos.running.remove(auto_file)
-                    autos.finished.append(auto_file)
-                    LOG.info(f'{auto_file} finished')
-                case _:
-                    LOG.warning(f'[{auto_file}] Unrecognized status "{status}"\n')
-        # Empty status file as all status have been processed
-        sf.truncate(0)
-
-
-def run_manage_loop(tempdir: str, time_id: int):
-    status_file = f'{tempdir}/{time_id}_overview'
-    auto_files = sorted(get_files(tempdir))
-    autos = Autos(status_file=status_file, time_id=time_id, count=len(auto_files), waiting=auto_files, tempdir=tempdir)
-    with open(f'{tempdir}/{next(iter(auto_files))}', 'rb') as f:
-        logfile_dir = pickle.load(f)['logfile_dir']
-
-    LOG.info(f'Found {autos.count} files to process. Screens name are like "{time_id}_autoX"')
-    LOG.info('To switch screens detach from this screen via "<ctrl>+a d".')
-    LOG.info('To scroll back in history press "<ctrl>+a Esc" to enable "copy mode". Switch back with "Esc".')
-    LOG.info('You can modify this behaviour by screen configuration options (`~/.screenrc`).')
-
-    open(status_file, 'a').close()
-    try:
-        while len(autos.finished) < autos.count:
-            if len(autos.running) < autos.max_parallel and autos.waiting:
-                auto_file = autos.waiting.pop(0)
-                autos.running.append(auto_file)
-
-                auto_path = f'{tempdir}/{auto_file}'
-                with open(auto_path, 'rb') as f:
-                    auto_file_data = pickle.load(file=f)
-                status_line = get_screen_status_line(label=auto_file_data['label'])
+def emit_status(autos: Autos):
+    EVENTS.emit(
+        'items_status',
+        waiting=len(autos.waiting),
+        running=len(autos.running),
+        user_input=len(autos.user_input),
+        finished=len(autos.finished),
+        count=autos.count,
+    )
 
-                session_name = f'{time_id}_{auto_file}'
-                logfile_path = f'{logfile_dir}/{auto_file}.log'
 
-                LOG.info(f'Starting new screen at {session_name}')
-                subprocess.run([
-                    'screen', '-d', '-m', '-S', session_name,
-                    '-h', '100000',
-                    '-L', '-Logfile', logfile_path,
-                    'automatix-from-file', tempdir, str(time_id), auto_file
-                ])
-                subprocess.run(['screen', '-S', session_name, '-X', 'hardstatus', 'alwayslastline'])
-                subprocess.run(['screen', '-S', session_name, '-X', 'hardstatus', 'string', status_line])
+def apply_status(autos: Autos, auto_file: str, status: str):
+    """Apply a status event to the state. Used by the manager and the UI to keep their state in sync."""
+    match status:
+        case 'max_parallel':
+            # In this case we misuse the "auto_file" part as number
+            # for how many parallel screens are allowed.
+            autos.max_parallel = int(auto_file)
+        case 'started':
+            autos.waiting.remove(auto_file)
+            autos.running.append(auto_file)
+        case 'user_input_remove':
+            autos.user_input.remove(auto_file)
+        case 'user_input_add':
+            autos.user_input.append(auto_file)
+        case 'finished':
+            autos.running.remove(auto_file)
+            autos.finished.append(auto_file)
+        case _:
+            raise ValueError(f'Unrecognized status "{status}"')
+
+
+def log_status(auto_file: str, status: str, log: logging.Logger = LOG):
+    match status:
+        case 'max_parallel':
+            log.info(f'Now process max {auto_file} screens parallel')
+        case 'user_input_add':
+            log.info(f'{auto_file} is waiting for user input')
+        case 'finished':
+            log.info(f'{auto_file} finished')
+
+
+def start_screen(autos: Autos, auto_file: str, logfile_dir: str, backend: SessionBackend, log: logging.Logger):
+    with open(f'{autos.tempdir}/{auto_file}', 'rb') as f:
+        auto_file_data = pickle.load(file=f)
 
-            check_for_status_change(autos=autos, status_file=status_file)
+    session_name = f'{autos.time_id}_{auto_file}'
+    log.info(f'Starting new screen at {session_name}')
+    backend.start(
+        session_name=session_name,
+        label=auto_file_data['label'],
+        cmd=['automatix-from-file', autos.tempdir, str(autos.time_id), auto_file],
+        logfile_path=f'{logfile_dir}/{auto_file}.log',
+    )
 
-            print_status(autos=autos)
 
-            # Write status to file for screen switch loop
-            with FileWithLock(f'{tempdir}/autos', 'wb') as f:
-                pickle.dump(obj=autos, file=f)
+def notify_finished(fifo_path: str) -> bool:
+    """Write to the fifo, if the main programm is already waiting for it"""
+    try:
+        fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as exc:
+        if exc.errno == errno.ENXIO:  # No reader yet
+            return False
+        raise
+    with os.fdopen(fd, 'w') as fifo:
+        fifo.write('finished')
+    return True
+
+
+def start_waiting_screens(
+        autos: Autos, server: StatusServer, logfile_dir: str, backend: SessionBackend, log: logging.Logger,
+) -> bool:
+    """Start screens up to max_parallel, return whether any screen was started"""
+    started = False
+    while len(autos.running) < autos.max_parallel and autos.waiting:
+        auto_file = autos.waiting[0]
+        apply_status(autos=autos, auto_file=auto_file, status='started')
+        server.publish(auto_file=auto_file, status='started')
+        start_screen(autos=autos, auto_file=auto_file, logfile_dir=logfile_dir, backend=backend, log=log)
+        started = True
+    return started
+
+
+def handle_events(events: list[tuple[str, str]], autos: Autos, server: StatusServer, log: logging.Logger):
+    """Apply the status events and publish them to the UIs"""
+    for auto_file, status in events:
+        log.debug(f'Got {auto_file}:{status}')
+        try:
+            apply_status(autos=autos, auto_file=auto_file, status=status)
+        except ValueError as exc:
+            log.warning(f'[{auto_file}] {exc}\n')
+            continue
+        log_status(auto_file=auto_file, status=status, log=log)
+        server.publish(auto_file=auto_file, status=status)
+
+
+def run_manage_loop(tempdir: str, time_id: int, backend: SessionBackend, log: logging.Logger = LOG):
+    socket_path = get_socket_path(tempdir=tempdir, time_id=time_id)
+    auto_files = sorted(get_files(tempdir))
+    autos = Autos(socket_path=socket_path, time_id=time_id, count=len(auto_files), waiting=auto_files, tempdir=tempdir)
+    fifo_path = f'{tempdir}/{time_id}_finished'
+    notified = False
+    with open(f'{tempdir}/{next(iter(auto_files))}', 'rb') as f:
+        logfile_dir = pickle.load(f)['logfile_dir']
 
-            sleep(1)
+    log.info(f'Found {autos.count} files to process. Screens name are like "{time_id}_autoX"')
+    log.info('To switch screens detach from this screen via "<ctrl>+a d".')
+    if isinstance(backend, ScreenBackend):
+        log.info('To scroll back in history press "<ctrl>+a Esc" to enable "copy mode". Switch back with "Esc".')
+        log.info('You can modify this behaviour by screen configuration options (`~/.screenrc`).')
 
-        LOG.info(f'All parallel screen reported finished ({len(autos.finished)}/{autos.count}).')
+    try:
+        with StatusServer(socket_path=socket_path, snapshot=lambda: asdict(autos)) as server:
+            print_status(autos=autos, log=log)
+            while len(autos.finished) < autos.count:
+                started = start_waiting_screens(
+                    autos=autos, server=server, logfile_dir=logfile_dir, backend=backend, log=log,
+                )
+
+                # Wait for status events from the screens and the UI
+                events = server.poll(timeout=1)
+                handle_events(events=events, autos=autos, server=server, log=log)
+
+                if events:
+                    print_status(autos=autos, log=log)
+                if events or started:
+                    emit_status(autos=autos)
+
+            log.info(f'All parallel screen reported finished ({len(autos.finished)}/{autos.count}).')
+
+            # Keep serving the UI until the main programm waits for us
+            while not (notified := notify_finished(fifo_path=fifo_path)):
+                server.poll(timeout=0.5)
     except Exception as exc:
-        LOG.exception(exc)
+        log.exception(exc)
         sleep(60)  # For debugging
     finally:
-        with open(f'{tempdir}/{time_id}_finished', 'w') as fifo:
-            fifo.write('finished')
+        if not notified:
+            with open(fifo_path, 'w') as fifo:
+                fifo.write('finished')
 
 
 def run_manager():
@@ -158,23 +220,52 @@ def run_manager():
     args = parser.parse_args()
 
     init_logger(name=CONFIG['logger'], debug=args.debug)
-    run_manage_loop(tempdir=args.tempdir, time_id=int(args.time_id))
+    init_events(config=CONFIG)
+    run_manage_loop(tempdir=args.tempdir, time_id=int(args.time_id), backend=ScreenBackend())
 
 
 def run_auto(tempdir: str, time_id: int, auto_file: str):
     auto_path = f'{tempdir}/{auto_file}'
+    client = StatusClient(socket_path=get_socket_path(tempdir=tempdir, time_id=time_id))
+    manager_available = True
 
     def send_status(status: str):
-        with FileWithLock(f'{tempdir}/{time_id}_overview', 'a') as sf:
-            sf.write(f'{auto_file}:{status}\n')
-
+        # Without the manager, the batch items are still processed and the exit status is kept
+        nonlocal manager_available
+        if not manager_available:
+            return
+        try:
+            client.send(auto_file=auto_file, status=status)
+        except OSError as exc:
+            manager_available = False
+            LOG.warning(f'Could not send status "{status}" to the manager: {exc}')
+
+    with open(f'{tempdir}/script', 'rb') as f:
+        script_file_data = pickle.load(file=f)
     with open(auto_path, 'rb') as f:
         auto_file_data = pickle.load(file=f)
+    args = script_file_data['args']
+    if CONFIG['teamvault']:
+        try:
+            SECRETS.update(fetch_secrets(socket_path=get_secrets_socket_path(tempdir=tempdir, time_id=time_id)))
+        except OSError as exc:
+            LOG.warning(f'Could not get the prefetched secrets, fetching them again: {exc}')
+    if args.profile:
+        PROFILER.start(directory=args.profile, steps=args.profile_steps, label=auto_file)
     try:
-        run_automatix_list(automatix_list=auto_file_data['autolist'], send_status_callback=send_status)
+        run_automatix_list(
+            automatix_list=create_automatix_list(
+                script=script_file_data['script'],
+                batch_items=auto_file_data['batch_items'],
+                args=args,
+            ),
+            send_status_callback=send_status,
+        )
     finally:
+        os.unlink(auto_path)
+        PROFILER.stop()  # Before reporting finished, so the main process finds the profile
         send_status('finished')
-        unlink(auto_path)
+        client.close()
 
 
 def run_auto_from_file():
@@ -186,6 +277,7 @@ def run_auto_from_file():
     parser.add_argument('time_id')
     parser.add_argument('auto_file')
     args = parser.parse_args()
+    init_events(config=CONFIG)
 
     try:
         if CONFIG['progress_bar']:
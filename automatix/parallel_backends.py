@@ -0,0 +1,234 @@
+import fcntl
+import logging
+import os
+import subprocess
+import sys
+import termios
+import tty
+from collections import deque
+from select import select
+from threading import Lock, Thread
+
+from .colors import yellow, cyan
+
+RING_BUFFER_SIZE = 256 * 1024  # Bytes of output kept per session for attaching
+
+CTRL_A = b'\x01'
+CLEAR_SCREEN = b'\033[H\033[2J'
+
+# Makes the pseudo terminal on stdin the controlling terminal of the new session and executes the command.
+# This replaces a preexec_fn, which is not safe to use while other threads are running.
+CTTY_SHIM = 'import fcntl, os, sys, termios; fcntl.ioctl(0, termios.TIOCSCTTY, 0); os.execvp(sys.argv[1], sys.argv[1:])'
+
+
+def get_screen_status_line(label: str) -> str:
+    status_line = yellow(f'### {label}')
+    status_line += f' | detach: {cyan("<ctrl>+a d")}'
+    status_line += f' | copy mode: {cyan("<ctrl>+a Esc")}'
+    status_line += f' | abort copy mode: {cyan("Esc ")}'
+    # It seems we need the space after this Esc,  ^^^
+    # otherwise the color reset escape sequence stops working.
+    return status_line
+
+
+class ScreenBackend:
+    """Every session is a GNU screen session, the manager runs in its own screen session"""
+
+    manager_in_process = False
+
+    def start(self, session_name: str, label: str, cmd: list[str], logfile_path: str):
+        subprocess.run([
+            'screen', '-d', '-m', '-S', session_name,
+            '-h', '100000',
+            '-L', '-Logfile', logfile_path,
+            *cmd,
+        ])
+        subprocess.run(['screen', '-S', session_name, '-X', 'hardstatus', 'alwayslastline'])
+        subprocess.run(['screen', '-S', session_name, '-X', 'hardstatus', 'string', get_screen_status_line(label)])
+
+    def attach(self, session_name: str):
+        print(f"Switching to screen '{session_name}'... (Return with <ctrl>+a d)")
+        subprocess.run(['screen', '-r', session_name])
+
+    def close(self):
+        # Screen sessions are independent and end with their process
+        return
+
+
+class PtySession:
+    """
+    Output of a process in a pseudo terminal (or of the manager, if there is no process).
+
+    The last output is kept in a bounded ring buffer to redraw it on attach.
+    While attached, the output is also written to our terminal.
+    """
+
+    def __init__(self, label: str, logfile_path: str, process: subprocess.Popen | None = None, master_fd: int = None):
+        self.label = label
+        self.process = process
+        self.master_fd = master_fd
+
+        self.logfile = open(logfile_path, 'ab')
+        self.buffer = deque()
+        self.buffer_size = 0
+        self.lock = Lock()
+        self.attached = False
+        self.ended = False
+
+        if master_fd is not None:
+            self.reader = Thread(target=self._read_output, daemon=True)
+            self.reader.start()
+
+    def feed(self, data: bytes):
+        with self.lock:
+            if not self.logfile.closed:
+                self.logfile.write(data)
+                self.logfile.flush()
+            self.buffer.append(data)
+            self.buffer_size += len(data)
+            while self.buffer_size > RING_BUFFER_SIZE and len(self.buffer) > 1:
+                self.buffer_size -= len(self.buffer.popleft())
+            if self.attached:
+                os.write(sys.stdout.fileno(), data)
+
+    def _read_output(self):
+        while True:
+            try:
+                data = os.read(self.master_fd, 65536)
+            except OSError:  # EIO, when the process closed the terminal
+                data = b''
+            if not data:
+                break
+            self.feed(data)
+        self.process.wait()
+        with self.lock:
+            self.ended = True
+            os.close(self.master_fd)
+
+    def write_input(self, data: bytes):
+        with self.lock:
+            if data and self.master_fd is not None and not self.ended:
+                try:
+                    os.write(self.master_fd, data)
+                except OSError:
+                    pass  # Process ended meanwhile
+
+    def close(self):
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.reader.join(timeout=5)
+        with self.lock:
+            self.logfile.close()
+
+
+class SessionWriter:
+    """File-like object to write log messages into a PtySession"""
+
+    def __init__(self, session: PtySession):
+        self.session = session
+
+    def write(self, text: str):
+        # The terminal is in raw mode while attached, so we need carriage returns
+        self.session.feed(text.replace('\n', '\r\n').encode())
+
+    def flush(self):
+        return
+
+
+class PtyBackend:
+    """
+    Every session is a child process in a pseudo terminal allocated by us.
+
+    The manager runs in a thread of our process and the UI attaches to the sessions directly,
+    so there are no external processes apart from the automatix sessions themselves.
+    """
+
+    manager_in_process = True
+
+    def __init__(self):
+        self.sessions: dict[str, PtySession] = {}
+
+    def start(self, session_name: str, label: str, cmd: list[str], logfile_path: str):
+        master_fd, slave_fd = os.openpty()
+        if sys.stdout.isatty():
+            fcntl.ioctl(slave_fd, termios.TIOCSWINSZ, fcntl.ioctl(sys.stdout, termios.TIOCGWINSZ, b'\0' * 8))
+        process = subprocess.Popen(
+            [sys.executable, '-c', CTTY_SHIM, *cmd],
+            stdin=slave_fd,
+            stdout=slave_fd,
+            stderr=slave_fd,
+            start_new_session=True,
+        )
+        os.close(slave_fd)
+        self.sessions[session_name] = PtySession(
+            label=label, logfile_path=logfile_path, process=process, master_fd=master_fd,
+        )
+
+    def manager_logger(self, session_name: str, logfile_path: str, name: str, debug: bool) -> logging.Logger:
+        """Logger of the manager thread, writing to its own session instead of our terminal"""
+        session = self.sessions[session_name] = PtySession(label='Manager', logfile_path=logfile_path)
+        log = logging.getLogger(name)
+        log.propagate = False
+        log.setLevel(logging.DEBUG if debug else logging.INFO)
+        handler = logging.StreamHandler(stream=SessionWriter(session))
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(handler)
+        return log
+
+    def attach(self, session_name: str):
+        if (session := self.sessions.get(session_name)) is None:
+            return  # Not started yet
+        fd = sys.stdin.fileno()
+        old_settings = termios.tcgetattr(fd)
+        try:
+            tty.setraw(fd)
+            if session.master_fd is not None and not session.ended:
+                fcntl.ioctl(session.master_fd, termios.TIOCSWINSZ, fcntl.ioctl(fd, termios.TIOCGWINSZ, b'\0' * 8))
+            status_line = f'{yellow(f"### {session.label}")} | detach: {cyan("<ctrl>+a d")}\r\n'
+            with session.lock:
+                os.write(sys.stdout.fileno(), CLEAR_SCREEN + status_line.encode() + b''.join(session.buffer))
+                session.attached = True
+            self._forward_input(session=session, fd=fd)
+        finally:
+            session.attached = False
+            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+
+    @staticmethod
+    def _forward_input(session: PtySession, fd: int):
+        """Forward our terminal input to the session until <ctrl>+a d is pressed"""
+        prefix = False
+        while True:
+            readable, _, _ = select([fd], [], [], 0.5)
+            if not readable:
+                continue
+            data = bytearray()
+            for byte in (bytes([b]) for b in os.read(fd, 1024)):
+                if prefix:
+                    prefix = False
+                    if byte == b'd':
+                        session.write_input(bytes(data))
+                        return
+                    data += CTRL_A if byte in [CTRL_A, b'a'] else CTRL_A + byte
+                elif byte == CTRL_A:
+                    prefix = True
+                else:
+                    data += byte
+            session.write_input(bytes(data))
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+
+
+BACKENDS = {
+    'screen': ScreenBackend,
+    'pty': PtyBackend,
+}
+
+
+def get_backend(name: str) -> ScreenBackend | PtyBackend:
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f'Unknown parallel backend "{name}". Use one of {list(BACKENDS)}.')
@@ -0,0 +1,44 @@
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import pytest
+
+from automatix.parallel_backends import PtyBackend, PtySession, get_backend
+
+
+def test__pty_backend__output_in_buffer_and_logfile():
+    with TemporaryDirectory() as tempdir:
+        backend = PtyBackend()
+        backend.start(
+            session_name='1_auto1',
+            label='mylabel',
+            # /dev/tty can only be opened with a controlling terminal
+            cmd=['/bin/bash', '-c', '[ -t 0 ] && : < /dev/tty && echo "is a terminal"'],
+            logfile_path=f'{tempdir}/auto1.log',
+        )
+        session = backend.sessions['1_auto1']
+        session.reader.join(timeout=10)
+
+        assert session.ended
+        assert session.process.returncode == 0
+        assert b''.join(session.buffer) == b'is a terminal\r\n'
+        backend.close()
+        with open(f'{tempdir}/auto1.log', 'rb') as f:
+            assert f.read() == b'is a terminal\r\n'
+
+
+def test__pty_session__bounded_buffer():
+    with TemporaryDirectory() as tempdir, mock.patch('automatix.parallel_backends.RING_BUFFER_SIZE', 10):
+        session = PtySession(label='Manager', logfile_path=f'{tempdir}/overview.log')
+        for chunk in [b'12345', b'67890', b'abcde']:
+            session.feed(chunk)
+
+        assert b''.join(session.buffer) == b'67890abcde'
+        session.close()
+        with open(f'{tempdir}/overview.log', 'rb') as f:
+            assert f.read() == b'1234567890abcde'
+
+
+def test__get_backend__unknown():
+    with pytest.raises(ValueError, match='Unknown parallel backend "tmux"'):
+        get_backend('tmux')
@@ -1,15 +1,18 @@
 import os
 import pickle
-import subprocess
 from argparse import Namespace
 from collections import defaultdict
 from tempfile import TemporaryDirectory
+from threading import Thread
 from time import time
 
-from .batch_runner import create_automatix_list
-from .config import LOG
-from .parallel import get_logfile_dir, get_screen_status_line
+from .batch_runner import prefetch_secrets
+from .config import CONFIG, LOG
+from .parallel import get_logfile_dir, get_secrets_socket_path, get_socket_path, run_manage_loop
+from .parallel_backends import get_backend
 from .parallel_ui import screen_switch_loop
+from .status_channel import SecretsServer
+from .teamvault import SECRETS
 
 
 def get_batch_groups(batch_items: list) -> dict:
@@ -23,10 +26,16 @@ def get_batch_groups(batch_items: list) -> dict:
     return batch_groups
 
 
-def write_auto_file(auto_id: str, label: str, autolist: list, tempdir: str, logfile_dir: str):
+def write_script_file(script: dict, args: Namespace, tempdir: str):
+    # The script is written only once and shared by all automatix files
+    with open(f'{tempdir}/script', 'wb') as f:
+        pickle.dump(obj={'script': script, 'args': args}, file=f)
+
+
+def write_auto_file(auto_id: str, label: str, batch_items: list, tempdir: str, logfile_dir: str):
     with open(f'{tempdir}/auto{auto_id}', 'wb') as f:
         pickle.dump(obj={
-            'autolist': autolist,
+            'batch_items': batch_items,
             'auto_file': f'{tempdir}/auto{auto_id}',
             'label': label,
             'logfile_dir': logfile_dir,
@@ -36,6 +45,10 @@ def write_auto_file(auto_id: str, label: str, autolist: list, tempdir: str, logf
 def create_auto_files(script: dict, batch_items: list, args: Namespace, tempdir: str, logfile_dir: str):
     LOG.info(f'Using temporary directory to save object files: {tempdir}')
 
+    if CONFIG['teamvault']:
+        prefetch_secrets(script=script, batch_items=batch_items)
+    write_script_file(script=script, args=args, tempdir=tempdir)
+
     batch_groups = get_batch_groups(batch_items=batch_items)
     default_group = batch_groups.pop('_default_', [])
 
@@ -46,7 +59,7 @@ def create_auto_files(script: dict, batch_items: list, args: Namespace, tempdir:
     for i, (group, items) in enumerate(batch_groups.items(), start=1):
         write_auto_file(
             auto_id=str(i).rjust(digits, '0'),
-            autolist=create_automatix_list(script=script, batch_items=items, args=args),
+            batch_items=items,
             label=f'Group: {group}',
             tempdir=tempdir,
             logfile_dir=logfile_dir,
@@ -55,20 +68,22 @@ def create_auto_files(script: dict, batch_items: list, args: Namespace, tempdir:
     # All rows/batch_items in the default group get their own automatix file and screen
     for j, batch_item in enumerate(default_group, start=i + 1):
         auto_id = str(j).rjust(digits, '0')
-
-        # Get label before create_automatix_list, where the label field is removed
-        label = batch_item.get('label', f'auto{auto_id}')
-
-        autolist = create_automatix_list(script=script, batch_items=[batch_item], args=args)
         write_auto_file(
             auto_id=auto_id,
-            autolist=autolist,
-            label=label,
+            batch_items=[batch_item],
+            label=batch_item.get('label', f'auto{auto_id}'),
             tempdir=tempdir,
             logfile_dir=logfile_dir,
         )
 
 
+def start_secrets_server(tempdir: str, time_id: int) -> SecretsServer | None:
+    """The parallel processes get the prefetched secrets from us in memory, see run_auto"""
+    if not CONFIG['teamvault']:
+        return None
+    return SecretsServer(socket_path=get_secrets_socket_path(tempdir=tempdir, time_id=time_id), secrets=SECRETS.export())
+
+
 def display_screen_control_hints():
     LOG.notice('--- Please read and understand these hints for controlling screen sessions before you proceed ---')
     LOG.notice('- If you switched to a screen session you can detach the session with "<ctrl>+a d".'
@@ -81,6 +96,7 @@ def display_screen_control_hints():
 
 def run_parallel_screens(script: dict, batch_items: list, args: Namespace):
     LOG.info('Preparing automatix objects for parallel processing')
+    backend = get_backend(CONFIG['parallel_backend'])
 
     with TemporaryDirectory() as tempdir:
         time_id = round(time())
@@ -92,33 +108,48 @@ def run_parallel_screens(script: dict, batch_items: list, args: Namespace):
 
         LOG.info(f'Created directory for logfiles at {logfile_dir}')
 
-        cmds = [
-            'screen', '-d', '-m', '-S', f'{time_id}_overview',
-            '-h', '100000',
-            '-L', '-Logfile', f'{logfile_dir}/overview.log',
-            'automatix-manager', tempdir, str(time_id),
-        ]
-        if args.debug:
-            cmds.append('--debug')
-
-        subprocess.run(cmds)
-
-        status_line = get_screen_status_line(label='Manager screen')
-        subprocess.run(['screen', '-S', f'{time_id}_overview', '-X', 'hardstatus', 'alwayslastline'])
-        subprocess.run(['screen', '-S', f'{time_id}_overview', '-X', 'hardstatus', 'string', status_line])
-
-        LOG.info(f'Overview / manager screen started at "{time_id}_overview".')
-
-        LOG.info('Start loop with information to switch between running screens.\n')
-        if not os.getenv('AUTOMATIX_SUPPRESS_SCREEN_CONTROL_NOTICE'):
-            display_screen_control_hints()
-
-        screen_switch_loop(tempdir=tempdir)
-
-        with open(f'{tempdir}/{time_id}_finished') as fifo:
-            print()
-            LOG.info('Wait for overview to finish')
-            for _ in fifo:
-                LOG.info('Automatix finished parallel processing')
+        secrets_server = start_secrets_server(tempdir=tempdir, time_id=time_id)
+        try:
+            manager_session = f'{time_id}_overview'
+            if backend.manager_in_process:
+                Thread(target=run_manage_loop, kwargs={
+                    'tempdir': tempdir,
+                    'time_id': time_id,
+                    'backend': backend,
+                    'log': backend.manager_logger(
+                        session_name=manager_session,
+                        logfile_path=f'{logfile_dir}/overview.log',
+                        name=f'{LOG.name}.manager',
+                        debug=args.debug,
+                    ),
+                }, daemon=True).start()
+            else:
+                cmds = ['automatix-manager', tempdir, str(time_id)]
+                if args.debug:
+                    cmds.append('--debug')
+                backend.start(
+                    session_name=manager_session,
+                    label='Manager screen',
+                    cmd=cmds,
+                    logfile_path=f'{logfile_dir}/overview.log',
+                )
+
+            LOG.info(f'Overview / manager screen started at "{manager_session}".')
+
+            LOG.info('Start loop with information to switch between running screens.\n')
+            if not os.getenv('AUTOMATIX_SUPPRESS_SCREEN_CONTROL_NOTICE'):
+                display_screen_control_hints()
+
+            screen_switch_loop(socket_path=get_socket_path(tempdir=tempdir, time_id=time_id), backend=backend)
+
+            with open(f'{tempdir}/{time_id}_finished') as fifo:
+                print()
+                LOG.info('Wait for overview to finish')
+                for _ in fifo:
+                    LOG.info('Automatix finished parallel processing')
+        finally:
+            backend.close()
+            if secrets_server is not None:
+                secrets_server.close()
     LOG.info('Temporary directory cleaned up')
     LOG.info(f'All logfiles are available at {logfile_dir}')
@@ -1,13 +1,12 @@
 import curses
-import pickle
-import subprocess
-from os.path import isfile
+import sys
+from select import select
 from textwrap import wrap
 from time import sleep
 
 from .config import LOG
-from .helpers import FileWithLock
-from .parallel import Autos
+from .parallel import Autos, SessionBackend, apply_status
+from .status_channel import StatusClient
 
 
 class CursesWriter:
@@ -34,6 +33,7 @@ class CursesWriter:
         self.h, self.w = stdscr.getmaxyx()
 
         self.input_buffer = ''
+        self.message = ''  # shown above the options, e.g. errors
         self.current_line = 0
 
     def add_text(self, text: str, start: int = 0, attr: int | None = None, append_line: bool = False):
@@ -116,6 +116,9 @@ def draw_status(cw: CursesWriter, autos: Autos):
     cw.add_text('Finished:            ', start=2)
     cw.add_text(', '.join(autos.finished), start=22, append_line=True)
 
+    if cw.message:
+        cw.current_line = cw.h - 7
+        cw.add_text(cw.message, attr=cw.red, start=2)
     cw.current_line = cw.h - 6
     cw.add_text(f'Working directory: {autos.tempdir}')
     cw.add_text("-" * (cw.w - 1))
@@ -128,7 +131,18 @@ def draw_status(cw: CursesWriter, autos: Autos):
     cw.stdscr.refresh()
 
 
-def handle_answer(answer: str, autos: Autos) -> str | None:
+def set_max_parallel(answer: str, client: StatusClient, cw: CursesWriter):
+    try:
+        max_parallel = int(answer[1:])
+    except (ValueError, IndexError):
+        return  # Ignore invalid input
+    try:
+        client.send(auto_file=str(max_parallel), status='max_parallel')
+    except OSError:
+        cw.message = 'The manager is not running any longer, max parallel cannot be changed.'
+
+
+def handle_answer(answer: str, autos: Autos, client: StatusClient, cw: CursesWriter) -> str | None:
     if answer == 'q':
         raise KeyboardInterrupt('Quit UI by user')
     elif answer == 'o':
@@ -136,12 +150,7 @@ def handle_answer(answer: str, autos: Autos) -> str | None:
     elif answer == 'n' and autos.user_input:
         return f'{autos.time_id}_{next(iter(autos.user_input))}'
     elif answer.startswith('m'):
-        try:
-            max_parallel = int(answer[1:])
-            with FileWithLock(autos.status_file, 'a') as sf:
-                sf.write(f'{max_parallel}:max_parallel\n')
-        except (ValueError, IndexError):
-            pass  # Ignore invalid input
+        set_max_parallel(answer=answer, client=client, cw=cw)
     else:
         try:
             number = int(answer)
@@ -150,7 +159,7 @@ def handle_answer(answer: str, autos: Autos) -> str | None:
             pass  # Ignore invalid input
 
 
-def process_user_input(cw: CursesWriter, autos: Autos) -> str | None:
+def process_user_input(cw: CursesWriter, autos: Autos, client: StatusClient) -> str | None:
     key = cw.stdscr.getch()
     if key == -1:  # No input
         return None
@@ -160,7 +169,7 @@ def process_user_input(cw: CursesWriter, autos: Autos) -> str | None:
         answer = cw.input_buffer.lower()
         cw.input_buffer = ''
 
-        if new_screen := handle_answer(answer=answer, autos=autos):
+        if new_screen := handle_answer(answer=answer, autos=autos, client=client, cw=cw):
             return new_screen
     elif key in [curses.KEY_BACKSPACE, 127]:
         cw.input_buffer = cw.input_buffer[:-1]
@@ -168,49 +177,68 @@ def process_user_input(cw: CursesWriter, autos: Autos) -> str | None:
         cw.input_buffer += char
 
 
-def parallel_ui(stdscr: curses.window, tempdir: str) -> tuple[str, str | None]:
-    cw = CursesWriter(stdscr=stdscr)
-
-    # Wait until the status file exists
-    while not isfile(f'{tempdir}/autos'):
-        stdscr.clear()
-        stdscr.addstr(0, 0, 'Waiting for the manager process to start...')
-        stdscr.refresh()
-        sleep(0.5)
-
+def connect(stdscr: curses.window, client: StatusClient):
     while True:
-        # 1. Load data
-        with FileWithLock(f'{tempdir}/autos', 'rb') as f:
-            autos = pickle.load(file=f)
-
-        # 2. Draw status
-        draw_status(cw=cw, autos=autos)
-
-        # 3. Check if all processes have finished
-        if len(autos.running) + len(autos.waiting) + len(autos.user_input) == 0:
-            cw.stdscr.addstr(cw.h - 1, 2, 'All processes have finished. Press "q" to exit.', cw.green)
-            cw.stdscr.refresh()
-            # Wait until the user presses 'q'
-            cw.stdscr.nodelay(False)
-            while cw.stdscr.getch() not in [ord('q'), ord('Q')]:
-                sleep(0.1)
-            return 'quit', None
+        try:
+            client.connect()
+            return
+        except (FileNotFoundError, ConnectionRefusedError):
+            stdscr.clear()
+            stdscr.addstr(0, 0, 'Waiting for the manager process to start...')
+            stdscr.refresh()
+            sleep(0.5)
 
-        # 4. Process user input
-        screen_to_switch = process_user_input(cw=cw, autos=autos)
-        if screen_to_switch:
-            return 'restart', screen_to_switch
 
-        sleep(0.2)  # Short pause to reduce CPU load
+def parallel_ui(stdscr: curses.window, socket_path: str) -> tuple[str, str | None]:
+    cw = CursesWriter(stdscr=stdscr)
+    client = StatusClient(socket_path=socket_path)
+
+    try:
+        # 1. Subscribe to the status events of the manager
+        connect(stdscr=stdscr, client=client)
+        snapshot, events = client.subscribe()
+        autos = Autos(**snapshot)
+        connected = True
+
+        while True:
+            for auto_file, status in events:
+                apply_status(autos=autos, auto_file=auto_file, status=status)
+
+            # 2. Draw status
+            draw_status(cw=cw, autos=autos)
+
+            # 3. Check if all processes have finished
+            if len(autos.running) + len(autos.waiting) + len(autos.user_input) == 0:
+                cw.stdscr.addstr(cw.h - 1, 2, 'All processes have finished. Press "q" to exit.', cw.green)
+                cw.stdscr.refresh()
+                # Wait until the user presses 'q'
+                cw.stdscr.nodelay(False)
+                while cw.stdscr.getch() not in [ord('q'), ord('Q')]:
+                    sleep(0.1)
+                return 'quit', None
+
+            # 4. Wait for status events or user input
+            readable, _, _ = select([client.sock, sys.stdin] if connected else [sys.stdin], [], [], 1)
+            events = []
+            if client.sock in readable:
+                if (events := client.receive()) is None:
+                    connected = False  # Manager is gone, keep showing the last known state
+                    events = []
+
+            # 5. Process user input
+            screen_to_switch = process_user_input(cw=cw, autos=autos, client=client)
+            if screen_to_switch:
+                return 'restart', screen_to_switch
+    finally:
+        client.close()
 
 
-def screen_switch_loop(tempdir: str):
+def screen_switch_loop(socket_path: str, backend: SessionBackend):
     while True:
         try:
-            exit_reason, screen_to_switch = curses.wrapper(parallel_ui, tempdir)
+            exit_reason, screen_to_switch = curses.wrapper(parallel_ui, socket_path)
             if screen_to_switch:
-                print(f"Switching to screen '{screen_to_switch}'... (Return with <ctrl>+a d)")
-                subprocess.run(['screen', '-r', screen_to_switch])
+                backend.attach(session_name=screen_to_switch)
         except curses.error as exc:
             LOG.error(f"Curses error: {exc}")
             LOG.error("Could not start the curses interface. Is the terminal compatible?")
@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from automatix.parallel import Autos
+from automatix.parallel_ui import handle_answer
+from automatix.status_channel import StatusClient
+
+
+def test__handle_answer__max_parallel_without_manager():
+    autos = Autos(socket_path='', time_id=1, count=2, tempdir='', waiting=['auto1', 'auto2'])
+    client = StatusClient(socket_path='')
+    cw = SimpleNamespace(message='')
+
+    with mock.patch.object(client, 'send', side_effect=BrokenPipeError) as send:
+        assert handle_answer(answer='m3', autos=autos, client=client, cw=cw) is None
+    send.assert_called_once_with(auto_file='3', status='max_parallel')
+    assert 'manager' in cw.message
+
+    assert handle_answer(answer='2', autos=autos, client=client, cw=cw) == '1_auto2'
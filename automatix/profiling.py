@@ -0,0 +1,108 @@
+import os
+from contextlib import contextmanager
+
+# cProfile and pstats are imported on demand, they are not needed without profiling
+
+PROFILE_TOP = 25  # Number of functions in the summary
+
+
+class Profiler:
+    """
+    cProfile for the whole run and optionally for every python step.
+
+    The step profiles are aggregated per step (pipeline and index) over all batch items,
+    while a step is profiled, the run profile is paused. So the run profile shows the time spent
+    in Automatix itself and the step profiles show the time spent in the code of the python steps.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.label = None
+        self.steps = False
+        self.profile = None  # cProfile.Profile of the run
+        self.step_profiles = {}  # step name -> cProfile.Profile
+
+    @property
+    def enabled(self) -> bool:
+        return self.profile is not None
+
+    def start(self, directory: str, steps: bool = False, label: str = 'main'):
+        """
+        :param directory: where the .pstats files are written
+        :param label: prefix of the files, unique for each process
+        """
+        from cProfile import Profile
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.label = label
+        self.steps = steps
+        self.profile = Profile()
+        self.profile.enable()
+
+    @contextmanager
+    def step(self, name: str):
+        if not (self.enabled and self.steps):
+            yield
+            return
+        if (step_profile := self.step_profiles.get(name)) is None:
+            from cProfile import Profile
+
+            step_profile = self.step_profiles[name] = Profile()
+        self.profile.disable()
+        step_profile.enable()
+        try:
+            yield
+        finally:
+            step_profile.disable()
+            self.profile.enable()
+
+    def stop(self):
+        """Write the .pstats files of this process"""
+        if not self.enabled:
+            return
+        self.profile.disable()
+        self.profile.dump_stats(f'{self.directory}/{self.label}.pstats')
+        for name, step_profile in self.step_profiles.items():
+            step_profile.dump_stats(f'{self.directory}/{self.label}.{name}.pstats')
+        self.profile = None
+        self.step_profiles = {}
+
+
+PROFILER = Profiler()
+
+
+def clear_profiles(directory: str):
+    """Remove the .pstats files of a previous run"""
+    from glob import glob
+
+    for path in glob(f'{directory}/*.pstats'):
+        os.remove(path)
+
+
+def summarize(directory: str, top: int = PROFILE_TOP) -> str:
+    """Summary of all profiles in the directory, including these of parallel processes"""
+    from glob import glob
+    from io import StringIO
+    from pstats import Stats
+
+    core_files, step_files = [], {}
+    for path in sorted(glob(f'{directory}/*.pstats')):
+        _, _, step = os.path.basename(path).removesuffix('.pstats').partition('.')
+        if step:
+            step_files.setdefault(step, []).append(path)
+        else:
+            core_files.append(path)
+
+    lines = [f'Profiles written to {directory}']
+    if step_files:
+        lines.append('Python steps by total time:')
+        step_times = {step: Stats(*paths).total_tt for step, paths in step_files.items()}
+        for step, total_time in sorted(step_times.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f'  {step}: {total_time:.3f}s ({len(step_files[step])} profiles)')
+    if core_files:
+        stream = StringIO()
+        Stats(*core_files, stream=stream).sort_stats('cumulative').print_stats(top)
+        lines.append(f'Top {top} functions of the Automatix run (cumulative time):')
+        lines.append(stream.getvalue().strip('\n'))
+    return '\n'.join(lines)
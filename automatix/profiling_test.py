@@ -0,0 +1,28 @@
+import os
+from copy import deepcopy
+from tempfile import TemporaryDirectory
+
+from automatix.command import Command
+from automatix.profiling import PROFILER, summarize
+from tests.test_environment import environment
+
+
+def test__profiler__python_steps():
+    with TemporaryDirectory() as tempdir:
+        PROFILER.start(directory=tempdir, steps=True)
+        try:
+            env = deepcopy(environment)
+            for _ in range(2):
+                Command(cmd={'python': 'sum(range(1000))'}, index=2, pipeline='pipeline', env=env,
+                        position=1).execute()
+            Command(cmd={'local': 'true'}, index=3, pipeline='pipeline', env=env, position=2).execute()
+        finally:
+            PROFILER.stop()
+
+        assert sorted(os.listdir(tempdir)) == ['main.pipeline_2.pstats', 'main.pstats']
+        summary = summarize(directory=tempdir, top=5)
+
+    assert not PROFILER.enabled
+    assert 'pipeline_2: ' in summary
+    assert 'Top 5 functions of the Automatix run' in summary
+    assert '(execute)' in summary
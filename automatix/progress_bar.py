@@ -1,7 +1,6 @@
 # Most of the code in this file is copied from or inspired by
 # https://github.com/pollev/python_progress_bar/blob/master/python_progress_bar/progress_bar.py
 
-import curses
 import os
 
 from time import time
@@ -49,6 +48,7 @@ def setup_scroll_area(rate_bar=True):
     # Enable/disable right side of progress bar with statistics
     ProgressStatus.rate_bar = rate_bar
     # Setup curses support (to get information about the terminal we are running in)
+    import curses  # Imported here, because it is not needed without progress bar
     curses.setupterm()
 
     ProgressStatus.current_nr_lines = get_current_nr_lines()
@@ -198,6 +198,7 @@ def __format_interval(t):
 
 
 def __tput(cmd, *args):
+    import curses  # Imported only with progress bar, setupterm() has been called already
     print(curses.tparm(curses.tigetstr("el")).decode(), end='')
     # print(curses.tparm(curses.tigetstr("el")).decode())
 
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+
+# ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+MAX_RSS_FACTOR = 1 / 1024 if sys.platform == 'darwin' else 1
+SIGINT_WAIT = 0.25  # seconds, same as in subprocess.run
+
+
+@dataclass
+class ResourceUsage:
+    """Resource usage of child processes, as reported by wait4"""
+    user_time: float = 0.0  # seconds
+    system_time: float = 0.0  # seconds
+    max_rss: int = 0  # KiB, maximum of all processes
+    read_blocks: int = 0
+    write_blocks: int = 0
+    voluntary_switches: int = 0
+    involuntary_switches: int = 0
+
+    @classmethod
+    def from_rusage(cls, rusage) -> 'ResourceUsage':
+        return cls(
+            user_time=rusage.ru_utime,
+            system_time=rusage.ru_stime,
+            max_rss=int(rusage.ru_maxrss * MAX_RSS_FACTOR),
+            read_blocks=rusage.ru_inblock,
+            write_blocks=rusage.ru_oublock,
+            voluntary_switches=rusage.ru_nvcsw,
+            involuntary_switches=rusage.ru_nivcsw,
+        )
+
+    @property
+    def cpu_time(self) -> float:
+        return self.user_time + self.system_time
+
+    def add(self, other: 'ResourceUsage'):
+        self.user_time += other.user_time
+        self.system_time += other.system_time
+        self.max_rss = max(self.max_rss, other.max_rss)
+        self.read_blocks += other.read_blocks
+        self.write_blocks += other.write_blocks
+        self.voluntary_switches += other.voluntary_switches
+        self.involuntary_switches += other.involuntary_switches
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def __str__(self):
+        return (
+            f'CPU {self.user_time:.2f}s user / {self.system_time:.2f}s sys,'
+            f' max RSS {self.max_rss / 1024:.1f} MiB,'
+            f' blocks {self.read_blocks} in / {self.write_blocks} out,'
+            f' context switches {self.voluntary_switches} voluntary / {self.involuntary_switches} involuntary'
+        )
+
+
+def run_with_usage(cmd: str, **kwargs) -> (subprocess.CompletedProcess, ResourceUsage):
+    """
+    Like subprocess.run, but reaps the child with os.wait4 to get its resource usage.
+    This includes all descendants, which the child waited for, e.g. the commands of a shell.
+    """
+    with subprocess.Popen(cmd, **kwargs) as process:
+        try:
+            stdout = process.stdout.read() if process.stdout else None
+            _, status, rusage = os.wait4(process.pid, 0)
+        except KeyboardInterrupt:
+            # Like subprocess.run, give the child a moment to handle SIGINT itself (e.g. bash traps or ssh teardown)
+            try:
+                process.wait(timeout=SIGINT_WAIT)
+            except subprocess.TimeoutExpired:
+                pass
+            process.kill()
+            raise
+        except BaseException:
+            process.kill()
+            raise
+        process.returncode = os.waitstatus_to_exitcode(status)
+    completed = subprocess.CompletedProcess(args=cmd, returncode=process.returncode, stdout=stdout)
+    return completed, ResourceUsage.from_rusage(rusage)
@@ -0,0 +1,56 @@
+import os
+import signal
+import subprocess
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from automatix.resources import ResourceUsage, run_with_usage
+
+
+def test__run_with_usage():
+    proc, usage = run_with_usage(
+        'for i in $(seq 20000); do :; done; echo done; exit 3',
+        shell=True,
+        executable='/bin/bash',
+        stdout=subprocess.PIPE,
+    )
+
+    assert proc.returncode == 3
+    assert proc.stdout == b'done\n'
+    assert usage.cpu_time > 0
+    assert usage.max_rss > 0
+
+
+def test__resource_usage__add():
+    usage = ResourceUsage(user_time=1.0, max_rss=100, read_blocks=2)
+    usage.add(ResourceUsage(user_time=0.5, system_time=0.25, max_rss=50, read_blocks=3))
+
+    assert usage.cpu_time == 1.75
+    assert usage.max_rss == 100
+    assert usage.read_blocks == 5
+
+
+def test__run_with_usage__child_handles_keyboard_interrupt():
+    with TemporaryDirectory() as tempdir:
+        cmd = (f'trap "echo cleanup > {tempdir}/trap; exit 130" INT;'
+               f' echo $$ > {tempdir}/pid.tmp; mv {tempdir}/pid.tmp {tempdir}/pid; sleep 5 & wait')
+
+        def interrupt():
+            # Like <ctrl>+c in a terminal, which sends SIGINT to us and to the child
+            while not os.path.exists(f'{tempdir}/pid'):
+                sleep(0.01)
+            with open(f'{tempdir}/pid') as f:
+                pid = int(f.read())
+            os.kill(os.getpid(), signal.SIGINT)
+            sleep(0.05)
+            os.kill(pid, signal.SIGINT)
+
+        Thread(target=interrupt, daemon=True).start()
+        with pytest.raises(KeyboardInterrupt):
+            run_with_usage(cmd, shell=True, executable='/bin/bash')
+
+        with open(f'{tempdir}/trap') as f:
+            assert f.read() == 'cleanup\n'
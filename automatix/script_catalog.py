@@ -0,0 +1,180 @@
+import json
+import os
+
+from .helpers import read_yaml, selector
+
+CATALOG_VERSION = 1
+SCRIPT_EXTENSIONS = ('.yaml', '.yml')
+CATALOG_FIELDS = ['systems', 'vars', 'secrets']
+
+
+class ScriptCatalog:
+    """
+    Index of all files below the script directory, optionally stored in a cache file.
+
+    A directory is listed again only if its modification time changed, so a refresh needs one stat
+    per directory instead of listing the whole tree. The declared field keys of a script
+    (systems, vars, secrets) are parsed on demand and kept until the file changes.
+    """
+
+    def __init__(self, script_dir: str, cache_path: str | None = None):
+        self.script_dir = script_dir
+        self.cache_path = cache_path
+
+        # relative directory path -> {'mtime': int, 'dirs': [...], 'links': [...], 'files': [...]}
+        self.dirs: dict[str, dict] = {}
+        # relative file path -> {'mtime': int, 'size': int, 'fields': {field: [keys]}}
+        self.scripts: dict[str, dict] = {}
+        self._changed = False
+        self._refreshed = False
+        self._load()
+
+    def _load(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == CATALOG_VERSION and data.get('script_dir') == self.script_dir:
+            self.dirs = data['dirs']
+            self.scripts = data['scripts']
+
+    def save(self):
+        if not self.cache_path or not self._changed:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': CATALOG_VERSION,
+                'script_dir': self.script_dir,
+                'dirs': self.dirs,
+                'scripts': self.scripts,
+            }, f)
+        os.replace(tmp_path, self.cache_path)
+        self._changed = False
+
+    def refresh(self):
+        """Update the index of directories, whose modification time changed (once per process)"""
+        if self._refreshed:
+            return
+        self._refreshed = True
+
+        seen = set()
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                mtime = os.stat(os.path.join(self.script_dir, rel_dir)).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(rel_dir)
+            entry = self.dirs.get(rel_dir)
+            if entry is None or entry['mtime'] != mtime:
+                entry = self.dirs[rel_dir] = self._list_dir(rel_dir=rel_dir, mtime=mtime)
+                self._changed = True
+            stack.extend(os.path.join(rel_dir, name) for name in reversed(entry['dirs']))
+
+        for rel_dir in self.dirs.keys() - seen:
+            del self.dirs[rel_dir]
+            self._changed = True
+        files = set(self._iter_files())
+        for rel_path in self.scripts.keys() - files:
+            del self.scripts[rel_path]
+            self._changed = True
+        self.save()
+
+    def _list_dir(self, rel_dir: str, mtime: int) -> dict:
+        entry = {'mtime': mtime, 'dirs': [], 'links': [], 'files': []}
+        with os.scandir(os.path.join(self.script_dir, rel_dir)) as it:
+            for dir_entry in it:
+                try:
+                    if dir_entry.is_dir():
+                        # Like os.walk, we do not follow symbolic links to directories
+                        entry['links' if dir_entry.is_symlink() else 'dirs'].append(dir_entry.name)
+                    else:
+                        entry['files'].append(dir_entry.name)
+                except OSError:
+                    continue
+        for names in entry.values():
+            if isinstance(names, list):
+                names.sort()
+        return entry
+
+    def _iter_files(self):
+        for rel_dir, entry in self.dirs.items():
+            for filename in entry['files']:
+                yield os.path.join(rel_dir, filename)
+
+    def find(self, name: str) -> list[str]:
+        """Paths of all files with this file name"""
+        self.refresh()
+        return [
+            os.path.join(self.script_dir, rel_dir, name)
+            for rel_dir, entry in sorted(self.dirs.items())
+            if name in entry['files']
+        ]
+
+    def search(self, name: str, non_interactive: bool = False) -> str | None:
+        paths = [(path, path) for path in self.find(name=name)]  # Second one is the label for the selector
+        if non_interactive and len(paths) != 1:
+            return None
+        return selector(entries=paths, message='Script found at multiple locations. Please choose:')
+
+    def complete(self, prefix: str) -> list[str]:
+        """Directories and script files (relative to the script directory) starting with prefix"""
+        self.refresh()
+        rel_dir, name_prefix = os.path.split(prefix)
+        entry = self.dirs.get(os.path.normpath(rel_dir) if rel_dir else '')
+        if entry is None:
+            return []
+        return filter_completion(
+            rel_dir=rel_dir,
+            name_prefix=name_prefix,
+            dirs=entry['dirs'] + entry['links'],
+            files=entry['files'],
+        )
+
+    def fields(self, path: str) -> dict[str, list[str]]:
+        """Keys of systems, vars and secrets declared in the script"""
+        rel_path = os.path.relpath(path, self.script_dir)
+        stat = os.stat(path)
+        entry = self.scripts.get(rel_path)
+        if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            script = read_yaml(path)
+            entry = self.scripts[rel_path] = {
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'fields': {field: list((script.get(field) or {}).keys()) for field in CATALOG_FIELDS},
+            }
+            self._changed = True
+            self.save()
+        return entry['fields']
+
+
+def filter_completion(rel_dir: str, name_prefix: str, dirs: list[str], files: list[str]) -> list[str]:
+    # Like bash completion, hidden entries are only shown, if the prefix starts with a dot
+    def matches(name: str) -> bool:
+        return name.startswith(name_prefix) and (not name.startswith('.') or name_prefix.startswith('.'))
+
+    completion = [f'{os.path.join(rel_dir, name)}/' for name in dirs if matches(name)]
+    completion += [
+        os.path.join(rel_dir, name) for name in files
+        if matches(name) and name.endswith(SCRIPT_EXTENSIONS)
+    ]
+    return completion
+
+
+def complete_path(root_path: str, prefix: str) -> list[str]:
+    """Directories and script files (relative to root_path) starting with prefix, without index"""
+    rel_dir, name_prefix = os.path.split(prefix)
+    dirs, files = [], []
+    try:
+        with os.scandir(os.path.join(root_path, rel_dir)) as it:
+            for dir_entry in it:
+                (dirs if dir_entry.is_dir() else files).append(dir_entry.name)
+    except OSError:
+        return []
+    return filter_completion(rel_dir=rel_dir, name_prefix=name_prefix, dirs=sorted(dirs), files=sorted(files))
@@ -0,0 +1,40 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from automatix.script_catalog import ScriptCatalog
+
+
+def _write(path: str, content: str = 'name: test\n'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test__script_catalog():
+    with TemporaryDirectory() as script_dir, TemporaryDirectory() as cache_dir:
+        cache_path = f'{cache_dir}/catalog.json'
+        _write(f'{script_dir}/a.yaml', 'name: a\nsystems:\n  web: web1\nvars:\n  x: 1\n')
+        _write(f'{script_dir}/sub/b.yaml')
+        _write(f'{script_dir}/sub/deeper/a.yaml')
+        _write(f'{script_dir}/sub/notes.txt')
+        _write(f'{script_dir}/.hidden/c.yaml')
+
+        catalog = ScriptCatalog(script_dir=script_dir, cache_path=cache_path)
+        assert catalog.find('a.yaml') == [f'{script_dir}/a.yaml', f'{script_dir}/sub/deeper/a.yaml']
+        assert catalog.search('b.yaml') == f'{script_dir}/sub/b.yaml'
+        assert catalog.search('a.yaml', non_interactive=True) is None
+        assert catalog.complete(prefix='') == ['sub/', 'a.yaml']
+        assert catalog.complete(prefix='sub/') == ['sub/deeper/', 'sub/b.yaml']
+        assert catalog.complete(prefix='.h') == ['.hidden/']
+        assert catalog.fields(path=f'{script_dir}/a.yaml') == {'systems': ['web'], 'vars': ['x'], 'secrets': []}
+
+        # A new process uses the stored catalog and lists only changed directories
+        _write(f'{script_dir}/sub/new.yaml')
+        catalog = ScriptCatalog(script_dir=script_dir, cache_path=cache_path)
+        with mock.patch('automatix.script_catalog.read_yaml') as read_yaml:
+            with mock.patch.object(catalog, '_list_dir', wraps=catalog._list_dir) as list_dir:
+                assert catalog.find('new.yaml') == [f'{script_dir}/sub/new.yaml']
+                assert catalog.fields(path=f'{script_dir}/a.yaml')['systems'] == ['web']
+        read_yaml.assert_not_called()
+        assert [c.kwargs['rel_dir'] for c in list_dir.call_args_list] == ['sub']
@@ -0,0 +1,154 @@
+import codecs
+import os
+import subprocess
+import sys
+from typing import Callable
+from uuid import uuid4
+
+COMMAND_TEMPLATE = """\
+IFS= read -r -d '' __automatix_cmd <<'{delimiter}'
+{cmd}
+{delimiter}
+{runner}
+printf '%s%s\\n' '{marker}' "$?"
+"""
+
+# The step itself runs in a subshell, so that 'exit', 'cd', 'set -e' and the like do not affect the session.
+# Shell options of the precommand (e.g. 'set -e') are applied in the subshell only.
+SUBSHELL_RUNNER = '( eval "$__automatix_opts"; eval "$__automatix_cmd" ) </dev/null'
+# Precommands run in the session shell itself, so that defined functions and variables persist.
+# Their shell options are stored for the steps and reset, so that e.g. 'set -e' cannot terminate the session.
+SESSION_RUNNER = """\
+{ eval "$__automatix_cmd"; } </dev/null; __automatix_rc=$?
+__automatix_opts="$(set +o)"; case $- in *e*) __automatix_opts+=$'\\nset -e';; esac; set +e
+(exit $__automatix_rc)"""
+
+
+class ShellSession:
+    """
+    Long-living bash process, which executes commands written to its stdin.
+
+    After each command a marker line containing the exit code is written to stdout,
+    which separates the output of consecutive commands.
+    stderr is passed through, stdin of the commands is /dev/null.
+
+    The precommand is executed once at the start and its output is written to our stdout.
+    Raises PrecommandFailed, if it fails, and SessionClosed, if it terminates the session (e.g. 'exit').
+    """
+
+    def __init__(self, cmd: str, bash_path: str, encoding: str, precommand: str | None, env: dict | None = None):
+        self.precommand = precommand
+        self.encoding = encoding
+
+        token = uuid4().hex
+        self.delimiter = f'__AUTOMATIX_{token}_EOF__'
+        self.marker = f'__AUTOMATIX_{token}_EXIT__'
+
+        self.process = subprocess.Popen(
+            cmd,
+            env=env,
+            executable=bash_path,
+            shell=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+        if precommand:
+            returncode = self._execute(cmd=precommand, runner=SESSION_RUNNER, output=self._get_stdout_writer())
+            if returncode != 0:
+                self.close()
+                raise PrecommandFailed(returncode=returncode)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, cmd: str, capture: bool = False) -> tuple[int, bytes | None]:
+        """
+        Execute the command in the session.
+
+        :param cmd: shell command
+        :param capture: capture stdout and return it instead of writing it to our stdout
+        :return: exit code and the captured output (None if not captured)
+        """
+        if capture:
+            chunks = []
+            returncode = self._execute(cmd=cmd, runner=SUBSHELL_RUNNER, output=chunks.append)
+            return returncode, b''.join(chunks)
+
+        return self._execute(cmd=cmd, runner=SUBSHELL_RUNNER, output=self._get_stdout_writer()), None
+
+    def _get_stdout_writer(self) -> Callable[[bytes], None]:
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+
+        def write(data: bytes):
+            sys.stdout.write(decoder.decode(data))
+            sys.stdout.flush()
+
+        return write
+
+    def _execute(self, cmd: str, runner: str, output: Callable[[bytes], None]) -> int:
+        script = COMMAND_TEMPLATE.format(delimiter=self.delimiter, cmd=cmd, runner=runner, marker=self.marker)
+        try:
+            self.process.stdin.write(script.encode(self.encoding))
+            self.process.stdin.flush()
+            return self._read_until_marker(output=output)
+        except BrokenPipeError:
+            raise SessionClosed(returncode=self.process.wait())
+        except KeyboardInterrupt:
+            # The state of the session is unknown now
+            self.kill()
+            raise
+
+    def _read_until_marker(self, output: Callable[[bytes], None]) -> int:
+        fd = self.process.stdout.fileno()
+        marker = self.marker.encode()
+        buffer = b''
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                output(buffer)
+                raise SessionClosed(returncode=self.process.wait())
+            buffer += chunk
+
+            position = buffer.find(marker)
+            if position < 0:
+                # Hold back enough bytes to detect a marker split between two chunks
+                if len(buffer) > len(marker):
+                    output(buffer[:-len(marker)])
+                    buffer = buffer[-len(marker):]
+                continue
+
+            end = buffer.find(b'\n', position)
+            if end < 0:
+                continue
+            output(buffer[:position])
+            return int(buffer[position + len(marker):end])
+
+    def close(self):
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class SessionClosed(Exception):
+    def __init__(self, returncode: int):
+        self.returncode = returncode
+
+    def __int__(self):
+        return self.returncode
+
+    def __str__(self):
+        return f'Shell session terminated with return code {self.returncode}.'
+
+
+class PrecommandFailed(SessionClosed):
+    def __str__(self):
+        return f'Precommand failed with return code {self.returncode}.'
@@ -0,0 +1,62 @@
+import os
+from unittest import TestCase
+
+from automatix.shell_session import PrecommandFailed, ShellSession, SessionClosed
+
+tc = TestCase()
+
+
+def _session(precommand: str = None) -> ShellSession:
+    return ShellSession(cmd='exec /bin/bash --noprofile --norc -s', bash_path='/bin/bash', encoding='utf-8',
+                        precommand=precommand)
+
+
+def test__shell_session__precommand_and_exit_code(capfd):
+    session = _session(precommand='testfunction () { echo "Hi $1"; }; export SOME_VAR=some_value')
+
+    assert session.run('testfunction there; echo $SOME_VAR; exit 3') == (3, None)
+    out, err = capfd.readouterr()
+    assert out == 'Hi there\nsome_value\n'
+
+    # exit in the previous step must not terminate the session
+    assert session.alive
+    session.close()
+    assert not session.alive
+
+
+def test__shell_session__capture():
+    session = _session()
+
+    assert session.run('printf "without newline"', capture=True) == (0, b'without newline')
+    assert session.run('cd /tmp; echo out; false', capture=True) == (1, b'out\n')
+    # Changes of the working directory do not leak into following steps
+    assert session.run('pwd', capture=True) == (0, f'{os.getcwd()}\n'.encode())
+    session.close()
+
+
+def test__shell_session__closed():
+    session = _session()
+    session.kill()
+
+    with tc.assertRaises(SessionClosed):
+        session.run('echo test')
+
+
+def test__shell_session__precommand_output_and_options(capfd):
+    session = _session(precommand='echo precommand output; set -e')
+
+    assert session.run('false; echo not reached') == (1, None)
+    assert session.alive
+    out, err = capfd.readouterr()
+    assert out == 'precommand output\n'
+    session.close()
+
+
+def test__shell_session__precommand_failed():
+    with tc.assertRaises(PrecommandFailed) as cm:
+        _session(precommand='false')
+    assert int(cm.exception) == 1
+
+    with tc.assertRaises(SessionClosed) as cm:
+        _session(precommand='exit 3')
+    assert int(cm.exception) == 3
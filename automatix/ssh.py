@@ -0,0 +1,55 @@
+import re
+import shutil
+import subprocess
+from shlex import quote
+from tempfile import mkdtemp
+
+# The SSH binary in a formatted SSH command, which may be wrapped, e.g. `sshpass -f pw ssh ...`
+SSH_BINARY = re.compile(r'(?<!\S)(?:\S*/)?ssh(?!\S)')
+
+
+class SSHConnectionPool:
+    """
+    Shared SSH connections (OpenSSH ControlMaster) per hostname.
+
+    The master connection for a hostname is opened lazily by the first SSH command
+    using the pool options and reused by all following commands to the same hostname.
+    """
+
+    def __init__(self, control_persist: str):
+        self.control_persist = control_persist
+        self.control_dir = None
+        self.sockets = {}
+
+    def control_path(self, hostname: str) -> str:
+        if self.control_dir is None:
+            # Keep the path short, because UNIX socket paths are limited to ~100 characters
+            self.control_dir = mkdtemp(prefix='amx-ssh-')
+        if hostname not in self.sockets:
+            self.sockets[hostname] = f'{self.control_dir}/{len(self.sockets)}'
+        return self.sockets[hostname]
+
+    def options(self, hostname: str) -> str:
+        return (
+            f'-o ControlMaster=auto'
+            f' -o ControlPath={quote(self.control_path(hostname=hostname))}'
+            f' -o ControlPersist={self.control_persist}'
+        )
+
+    def wrap(self, ssh_cmd: str, hostname: str) -> str:
+        """Insert the multiplexing options right after the SSH binary of a formatted SSH command"""
+        if (match := SSH_BINARY.search(ssh_cmd)) is None:
+            return ssh_cmd  # No SSH binary found, e.g. a custom wrapper script
+        return f'{ssh_cmd[:match.end()]} {self.options(hostname=hostname)}{ssh_cmd[match.end():]}'
+
+    def close(self):
+        for hostname, control_path in self.sockets.items():
+            subprocess.run(
+                ['ssh', '-o', f'ControlPath={control_path}', '-O', 'exit', hostname],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        self.sockets = {}
+        if self.control_dir is not None:
+            shutil.rmtree(self.control_dir, ignore_errors=True)
+            self.control_dir = None
@@ -0,0 +1,14 @@
+from automatix.ssh import SSHConnectionPool
+
+
+def test__ssh_connection_pool__wrap():
+    pool = SSHConnectionPool(control_persist='10m')
+    options = pool.options(hostname='host1')
+
+    assert pool.wrap(ssh_cmd='ssh -t host1 sudo ', hostname='host1') == f'ssh {options} -t host1 sudo '
+    assert pool.wrap(ssh_cmd='/usr/bin/ssh host1 ', hostname='host1') == f'/usr/bin/ssh {options} host1 '
+    # Wrapped SSH commands get the options after the SSH binary, not after the wrapper
+    assert pool.wrap(ssh_cmd='sshpass -f pw ssh host1 ', hostname='host1') == f'sshpass -f pw ssh {options} host1 '
+    assert pool.wrap(ssh_cmd='env X=1 ssh host1 ', hostname='host1') == f'env X=1 ssh {options} host1 '
+    assert pool.wrap(ssh_cmd='myssh host1 ', hostname='host1') == 'myssh host1 '
+    pool.close()
@@ -0,0 +1,272 @@
+import json
+import os
+import selectors
+import socket
+from threading import Thread
+from time import sleep
+
+SUBSCRIBE = 'subscribe'
+MAX_BACKLOG = 1024 * 1024  # Bytes of unsent events per subscriber, before it is dropped
+
+
+def format_event(auto_file: str, status: str) -> bytes:
+    return f'{auto_file}:{status}\n'.encode()
+
+
+def parse_event(line: str) -> tuple[str, str]:
+    auto_file, _, status = line.partition(':')
+    return auto_file, status
+
+
+class LineBuffer:
+    def __init__(self):
+        self.partial = b''
+
+    def feed(self, data: bytes) -> list[str]:
+        *lines, self.partial = (self.partial + data).split(b'\n')
+        return [line.decode() for line in lines if line]
+
+
+class StatusServer:
+    """
+    Local event channel of the parallel manager (Unix domain socket).
+
+    Workers and UIs connect and send status events as lines of `auto_file:status`.
+    Connections sending `subscribe` get a JSON snapshot of the current state (provided by `snapshot`)
+    followed by every event published by the manager.
+
+    All connections are non-blocking, so a stalled subscriber cannot block the manager. Events, which
+    cannot be sent immediately, are queued and the subscriber is dropped, if it falls too far behind.
+    """
+
+    def __init__(self, socket_path: str, snapshot):
+        self.socket_path = socket_path
+        self.snapshot = snapshot
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(socket_path)
+        self.server.listen()
+        self.server.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.subscribers: set[socket.socket] = set()
+        self.backlogs: dict[socket.socket, bytearray] = {}  # unsent data per subscriber
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def poll(self, timeout: float | None) -> list[tuple[str, str]]:
+        """Wait for incoming events and return them in order of arrival"""
+        events = []
+        for key, mask in self.selector.select(timeout=timeout):
+            if key.fileobj is self.server:
+                conn, _ = self.server.accept()
+                conn.setblocking(False)
+                self.selector.register(conn, selectors.EVENT_READ, LineBuffer())
+                continue
+
+            conn = key.fileobj
+            if mask & selectors.EVENT_WRITE:
+                self._flush(conn)
+                if conn.fileno() < 0 or not mask & selectors.EVENT_READ:
+                    continue
+            events.extend(self._receive(conn=conn, buffer=key.data))
+        return events
+
+    def _receive(self, conn: socket.socket, buffer: LineBuffer) -> list[tuple[str, str]]:
+        """Read the available data of a connection, handle subscriptions and return the events"""
+        try:
+            data = conn.recv(65536)
+        except BlockingIOError:
+            return []
+        except ConnectionError:
+            data = b''
+        if not data:
+            self._drop(conn)
+            return []
+
+        events = []
+        for line in buffer.feed(data):
+            if line == SUBSCRIBE:
+                if self._send(conn, json.dumps(self.snapshot()).encode() + b'\n'):
+                    self.subscribers.add(conn)
+            else:
+                events.append(parse_event(line))
+        return events
+
+    def publish(self, auto_file: str, status: str):
+        message = format_event(auto_file=auto_file, status=status)
+        for conn in list(self.subscribers):
+            self._send(conn, message)
+
+    def _send(self, conn: socket.socket, message: bytes) -> bool:
+        if conn in self.backlogs:
+            self.backlogs[conn] += message
+            if len(self.backlogs[conn]) > MAX_BACKLOG:
+                self._drop(conn)
+                return False
+            return True
+        try:
+            sent = conn.send(message)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(conn)
+            return False
+        if sent < len(message):
+            self.backlogs[conn] = bytearray(message[sent:])
+            self.selector.modify(conn, selectors.EVENT_READ | selectors.EVENT_WRITE, self.selector.get_key(conn).data)
+        return True
+
+    def _flush(self, conn: socket.socket):
+        """Send queued data, when the subscriber is ready to receive again"""
+        backlog = self.backlogs[conn]
+        try:
+            sent = conn.send(backlog)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(conn)
+            return
+        del backlog[:sent]
+        if not backlog:
+            del self.backlogs[conn]
+            self.selector.modify(conn, selectors.EVENT_READ, self.selector.get_key(conn).data)
+
+    def _drop(self, conn: socket.socket):
+        self.subscribers.discard(conn)
+        self.backlogs.pop(conn, None)
+        if conn.fileno() >= 0:
+            self.selector.unregister(conn)
+        conn.close()
+
+    def close(self):
+        for conn, backlog in self.backlogs.items():
+            # Last chance for subscribers to get the final events
+            try:
+                conn.settimeout(1)
+                conn.sendall(backlog)
+            except OSError:
+                pass
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+        self.subscribers = set()
+        self.backlogs = {}
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+class StatusClient:
+    """Connection of a worker or UI to the StatusServer of the manager"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.sock = None
+        self.buffer = LineBuffer()
+
+    def connect(self, retries: int = 0, interval: float = 0.5):
+        """Connect to the manager, retry while it is not listening yet"""
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if retries <= 0:
+                    raise
+                retries -= 1
+                sleep(interval)
+                continue
+            self.sock = sock
+            return
+
+    def send(self, auto_file: str, status: str):
+        if self.sock is None:
+            self.connect(retries=20)
+        self.sock.sendall(format_event(auto_file=auto_file, status=status))
+
+    def subscribe(self) -> tuple[dict, list[tuple[str, str]]]:
+        """Subscribe to the events of the manager, return the current state and already received events"""
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(f'{SUBSCRIBE}\n'.encode())
+        while True:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError('Manager closed the connection')
+            if lines := self.buffer.feed(data):
+                return json.loads(lines[0]), [parse_event(line) for line in lines[1:]]
+
+    def receive(self) -> list[tuple[str, str]] | None:
+        """Read available events, None if the manager closed the connection"""
+        data = self.sock.recv(65536)
+        if not data:
+            return None
+        return [parse_event(line) for line in self.buffer.feed(data)]
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class SecretsServer:
+    """
+    Hands the prefetched secrets of the main process to the parallel processes in memory.
+
+    Every connection gets the secrets as JSON and is closed. The socket is only accessible by the user,
+    so the secrets are never written to disk.
+    """
+
+    def __init__(self, socket_path: str, secrets: dict[str, str]):
+        self.socket_path = socket_path
+        self.secrets = json.dumps(secrets).encode()
+        self.closed = False
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(socket_path)
+        os.chmod(socket_path, 0o600)
+        self.server.listen()
+        self.server.settimeout(0.5)  # To notice close()
+        self.thread = Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while not self.closed:
+            try:
+                conn, _ = self.server.accept()
+            except TimeoutError:
+                continue
+            except OSError:
+                return
+            with conn:
+                try:
+                    conn.sendall(self.secrets)
+                except OSError:
+                    pass  # Process ended meanwhile
+
+    def close(self):
+        self.closed = True
+        self.thread.join()
+        self.server.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def fetch_secrets(socket_path: str) -> dict[str, str]:
+    """Get the prefetched secrets from the SecretsServer of the main process"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+    return json.loads(data)
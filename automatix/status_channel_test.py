@@ -0,0 +1,106 @@
+import os
+import pickle
+from argparse import Namespace
+from dataclasses import asdict
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import mock
+
+from automatix.parallel import Autos, apply_status, run_auto
+from automatix.status_channel import StatusClient, StatusServer
+
+
+def _poll_until(server: StatusServer, count: int) -> list:
+    events = []
+    for _ in range(10):
+        events.extend(server.poll(timeout=1))
+        if len(events) >= count:
+            break
+    return events
+
+
+def test__status_channel__events_and_subscription():
+    with TemporaryDirectory() as tempdir:
+        socket_path = f'{tempdir}/test.sock'
+        autos = Autos(socket_path=socket_path, time_id=1, count=2, tempdir=tempdir, waiting=['auto1', 'auto2'])
+
+        with StatusServer(socket_path=socket_path, snapshot=lambda: asdict(autos)) as server:
+            apply_status(autos=autos, auto_file='auto1', status='started')
+
+            ui = StatusClient(socket_path=socket_path)
+            subscription = []
+            thread = Thread(target=lambda: subscription.append(ui.subscribe()))
+            thread.start()
+            while not server.subscribers:
+                server.poll(timeout=1)
+            thread.join()
+            snapshot, ui_events = subscription[0]
+            ui_autos = Autos(**snapshot)
+            assert ui_autos == autos
+
+            worker = StatusClient(socket_path=socket_path)
+            worker.send(auto_file='auto1', status='user_input_add')
+            events = _poll_until(server=server, count=1)
+            assert events == [('auto1', 'user_input_add')]
+            for auto_file, status in events:
+                apply_status(autos=autos, auto_file=auto_file, status=status)
+                server.publish(auto_file=auto_file, status=status)
+
+            assert ui_events == []
+            for auto_file, status in ui.receive():
+                apply_status(autos=ui_autos, auto_file=auto_file, status=status)
+            assert ui_autos == autos
+            assert ui_autos.user_input == ['auto1']
+
+            worker.close()
+            ui.close()
+
+
+def test__apply_status():
+    autos = Autos(socket_path='', time_id=1, count=1, tempdir='', waiting=['auto1'])
+
+    for status in ['started', 'user_input_add', 'user_input_remove', 'finished']:
+        apply_status(autos=autos, auto_file='auto1', status=status)
+    apply_status(autos=autos, auto_file='3', status='max_parallel')
+
+    assert autos.waiting == autos.running == autos.user_input == []
+    assert autos.finished == ['auto1']
+    assert autos.max_parallel == 3
+
+
+def test__status_channel__stalled_subscriber_is_dropped():
+    with TemporaryDirectory() as tempdir, mock.patch('automatix.status_channel.MAX_BACKLOG', 10000):
+        socket_path = f'{tempdir}/test.sock'
+        with StatusServer(socket_path=socket_path, snapshot=lambda: {}) as server:
+            ui = StatusClient(socket_path=socket_path)
+            ui.connect()
+            ui.sock.sendall(b'subscribe\n')
+            while not server.subscribers:
+                server.poll(timeout=1)
+
+            # The UI does not read anything, so the socket buffer fills up
+            for i in range(100000):
+                server.publish(auto_file=f'auto{i}', status='started')
+                if not server.subscribers:
+                    break
+            assert not server.subscribers
+            ui.close()
+
+
+def test__run_auto__without_manager():
+    with TemporaryDirectory() as tempdir:
+        with open(f'{tempdir}/script', 'wb') as f:
+            pickle.dump({'script': {}, 'args': Namespace(profile=None)}, f)
+        with open(f'{tempdir}/auto1', 'wb') as f:
+            pickle.dump({'batch_items': [{}]}, f)
+
+        def run_items(automatix_list, send_status_callback):
+            send_status_callback('user_input_add')
+            send_status_callback('user_input_remove')
+
+        with mock.patch('automatix.parallel.run_automatix_list', side_effect=run_items), \
+                mock.patch('automatix.parallel.StatusClient.send', side_effect=ConnectionRefusedError) as send:
+            run_auto(tempdir=tempdir, time_id=1, auto_file='auto1')
+
+        assert send.call_count == 1
+        assert not os.path.exists(f'{tempdir}/auto1')
@@ -0,0 +1,76 @@
+from threading import Lock
+from typing import Iterable
+
+SECRET_FIELDS = ['password', 'username', 'file']
+PREFETCH_WORKERS = 8
+
+
+class UnknownSecretTypeException(Exception):
+    pass
+
+
+def parse_secret(secret: str) -> (str, str):
+    """Split a secret in the format SECRETID_FIELD"""
+    sid, field = secret.split('_')
+    if field not in SECRET_FIELDS:
+        raise UnknownSecretTypeException(field)
+    return sid, field
+
+
+def fetch_secret(secret: str) -> str:
+    import bwtv  # bundlewrap-teamvault is only needed, if teamvault support is enabled
+
+    sid, field = parse_secret(secret)
+    return getattr(bwtv, field)(sid)
+
+
+class SecretCache:
+    """
+    TeamVault secrets of this run, kept in memory only.
+
+    Every secret is fetched once, no matter how many batch items use it. In parallel processing
+    the main process fetches them and hands them over to the parallel processes via a socket (see `export`).
+    """
+
+    def __init__(self):
+        self._values: dict[str, str] = {}
+        self._locks: dict[str, Lock] = {}
+        self._lock = Lock()
+
+    def get(self, secret: str) -> str:
+        with self._lock:
+            secret_lock = self._locks.setdefault(secret, Lock())
+        with secret_lock:
+            if secret not in self._values:
+                self._values[secret] = fetch_secret(secret)
+        return self._values[secret]
+
+    def prefetch(self, secrets: Iterable[str], max_workers: int = PREFETCH_WORKERS) -> int:
+        """Fetch all secrets, which are not cached yet, concurrently and return their number"""
+        missing = sorted({secret for secret in secrets if secret not in self._values})
+        for secret in missing:
+            parse_secret(secret)  # Fail on invalid secrets before fetching anything
+        if missing:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+                list(pool.map(self.get, missing))
+        return len(missing)
+
+    def export(self) -> dict[str, str]:
+        """Fetched secrets, e.g. for the parallel processes"""
+        with self._lock:
+            return dict(self._values)
+
+    def update(self, values: dict[str, str]):
+        """Take over secrets fetched by another process"""
+        with self._lock:
+            self._values.update(values)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._locks.clear()
+
+
+SECRETS = SecretCache()
@@ -0,0 +1,71 @@
+import os
+import stat
+from argparse import Namespace
+from tempfile import TemporaryDirectory
+from threading import Lock
+from unittest import mock
+
+import pytest
+
+from automatix.parallel import get_secrets_socket_path
+from automatix.parallel_runner import create_auto_files, start_secrets_server
+from automatix.status_channel import fetch_secrets
+from automatix.teamvault import SECRETS, SecretCache, UnknownSecretTypeException
+
+
+def test__secret_cache__fetches_every_secret_once():
+    calls = []
+    lock = Lock()
+
+    def fetch(secret: str) -> str:
+        with lock:
+            calls.append(secret)
+        return f'value of {secret}'
+
+    cache = SecretCache()
+    with mock.patch('automatix.teamvault.fetch_secret', side_effect=fetch):
+        assert cache.prefetch(['abc_password', 'abc_username', 'abc_password', 'xyz_file']) == 3
+        assert cache.prefetch(['abc_password']) == 0
+        assert cache.get('abc_username') == 'value of abc_username'
+        assert cache.get('new_password') == 'value of new_password'
+
+    assert sorted(calls) == ['abc_password', 'abc_username', 'new_password', 'xyz_file']
+
+
+def test__secret_cache__unknown_field():
+    with mock.patch('automatix.teamvault.fetch_secret') as fetch:
+        with pytest.raises(UnknownSecretTypeException):
+            SecretCache().prefetch(['abc_password', 'abc_token'])
+    fetch.assert_not_called()
+
+
+def test__secrets__prefetched_once_for_parallel_processes():
+    SECRETS.clear()
+    script = {'name': 'test', 'secrets': {'common': 'abc_password'}, 'pipeline': [{'local': 'true'}]}
+    batch_items = [{'label': f'item{i}', 'secrets:own': 'xyz_username'} for i in range(3)]
+    with TemporaryDirectory() as tempdir, \
+            mock.patch.dict('automatix.parallel_runner.CONFIG', {'teamvault': True}), \
+            mock.patch('automatix.teamvault.fetch_secret', side_effect=lambda secret: f'value of {secret}') as fetch:
+        create_auto_files(
+            script=script, batch_items=batch_items, args=Namespace(), tempdir=tempdir, logfile_dir=tempdir,
+        )
+        # Secrets are handed over in memory only
+        for filename in os.listdir(tempdir):
+            with open(f'{tempdir}/{filename}', 'rb') as f:
+                assert b'value of' not in f.read()
+
+        secrets_server = start_secrets_server(tempdir=tempdir, time_id=1)
+        socket_path = get_secrets_socket_path(tempdir=tempdir, time_id=1)
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        try:
+            secrets = [fetch_secrets(socket_path=socket_path) for _ in batch_items]
+        finally:
+            secrets_server.close()
+        assert not os.path.exists(socket_path)
+
+    assert fetch.call_count == 2
+    assert secrets == [{
+        'abc_password': 'value of abc_password',
+        'xyz_username': 'value of xyz_username',
+    }] * 3
+    SECRETS.clear()
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from string import Formatter
+from typing import Callable
+
+CONVERSIONS = {'r': repr, 's': str, 'a': ascii}
+
+
+def split_field_name(field_name: str) -> tuple[str | int, tuple]:
+    """
+    Split a field name like str.format does, e.g. `CONST.x[0]` into `CONST` and ((True, 'x'), (False, 0)).
+    Numeric names and indices are integers, raises ValueError for invalid field names.
+    """
+    end = min((i for i in (field_name.find('.'), field_name.find('[')) if i >= 0), default=len(field_name))
+    name, rest = field_name[:end], field_name[end:]
+    path = []
+    while rest:
+        if rest[0] == '.':
+            end = min((i for i in (rest.find('.', 1), rest.find('[', 1)) if i >= 0), default=len(rest))
+            key, rest = rest[1:end], rest[end:]
+            if not key:
+                raise ValueError('Empty attribute in format string')
+            path.append((True, key))
+        elif rest[0] == '[':
+            key, closed, rest = rest[1:].partition(']')
+            if not closed or not key:
+                raise ValueError(f'Invalid index in format field "{field_name}"')
+            path.append((False, int(key) if key.isdigit() else key))
+        else:
+            raise ValueError("Only '.' or '[' may follow ']' in format field specifier")
+    return int(name) if name.isdigit() else name, tuple(path)
+
+
+@dataclass(frozen=True)
+class Field:
+    text: str  # original text including braces, used for unresolved fields
+    name: str
+    path: tuple  # (is_attribute, key) pairs for the part after the name, e.g. `.x` or `[0]`
+    conversion: str | None
+    format_spec: str
+
+
+class Template:
+    """
+    Command string in str.format syntax, parsed once into literal segments and fields.
+
+    Rendering looks up the field names on demand, so no variable mapping has to be built.
+    Templates, which are not supported here (positional or nested fields), are rendered by str.format.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.segments: list[tuple[str, Field | None]] = []
+        self.names: set[str] = set()  # referenced top level names, e.g. CONST for {CONST.x}
+        self.references: set[tuple[str, str | None]] = set()  # (name, first attribute), e.g. (CONST, x)
+        self.native = False
+
+        for literal, field_name, format_spec, conversion in Formatter().parse(source):
+            if field_name is None:
+                self.segments.append((literal, None))
+                continue
+            name, path = split_field_name(field_name)
+            if not isinstance(name, str) or not name or '{' in format_spec or conversion not in [None, *CONVERSIONS]:
+                # Let str.format handle (or complain about) these cases
+                self.native = True
+            if '{' in format_spec:
+                # Nested fields in the format spec, e.g. {x:{width}}
+                nested = compile_template(format_spec)
+                self.names.update(nested.names)
+                self.references.update(nested.references)
+            self.names.add(name)
+            self.references.add((name, path[0][1] if path and path[0][0] else None))
+            text = f'{{{field_name}{f"!{conversion}" if conversion else ""}{f":{format_spec}" if format_spec else ""}}}'
+            self.segments.append((literal, Field(
+                text=text, name=name, path=path, conversion=conversion, format_spec=format_spec,
+            )))
+
+    def render(self, lookup: Callable[[str], object], keep_unresolved: bool = False) -> str:
+        """
+        :param lookup: returns the value for a name, raises KeyError for unknown names
+        :param keep_unresolved: render fields, which cannot be resolved, as they are instead of raising an exception
+        """
+        if self.native:
+            return self.source.format(**{name: lookup(name) for name in self.names if isinstance(name, str) and name})
+
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is None:
+                continue
+            try:
+                value = lookup(field.name)
+                for is_attribute, key in field.path:
+                    value = getattr(value, key) if is_attribute else value[key]
+            except (KeyError, AttributeError, IndexError):
+                if not keep_unresolved:
+                    raise
+                parts.append(field.text)
+                continue
+            if field.conversion:
+                value = CONVERSIONS[field.conversion](value)
+            parts.append(format(value, field.format_spec))
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(source: str) -> Template:
+    """Templates are immutable and shared between all commands and batch items with the same source"""
+    return Template(source)
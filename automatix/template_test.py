@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+from automatix.environment import AttributedDict
+from automatix.template import Template, split_field_name
+
+tc = TestCase()
+
+VALUES = {
+    'var': 'value',
+    'number': 3,
+    'items': ['a', 'b'],
+    'CONST': AttributedDict({'const': 'constant'}),
+}
+
+
+def test__template__same_result_as_format():
+    for source in [
+        'no fields',
+        'echo {var} {{escaped}} {number:03d} {var!r} {items[1]} {CONST.const}',
+        '{var}{var}',
+    ]:
+        assert Template(source).render(lookup=VALUES.__getitem__) == source.format(**VALUES), source
+
+
+def test__template__names_and_references():
+    template = Template('{var} {CONST.const} {SYSTEMS.mysystem} {items[0]} {PVARS.x.y}')
+
+    assert template.names == {'var', 'CONST', 'SYSTEMS', 'items', 'PVARS'}
+    assert template.references == {
+        ('var', None), ('CONST', 'const'), ('SYSTEMS', 'mysystem'), ('items', None), ('PVARS', 'x'),
+    }
+
+
+def test__template__unresolved():
+    template = Template('{var} {unknown} {CONST.unknown:>5}')
+
+    with tc.assertRaises(KeyError):
+        template.render(lookup=VALUES.__getitem__)
+    assert template.render(lookup=VALUES.__getitem__, keep_unresolved=True) == 'value {unknown} {CONST.unknown:>5}'
+
+
+def test__template__positional_fields_fall_back_to_format():
+    with tc.assertRaises(IndexError):
+        Template('{} {var}').render(lookup=VALUES.__getitem__)
+
+
+def test__template__nested_format_spec():
+    template = Template('{var:>{width}} {number:{fill}^{width}}')
+
+    assert template.names == {'var', 'number', 'width', 'fill'}
+    values = {**VALUES, 'width': 7, 'fill': '*'}
+    assert template.render(lookup=values.__getitem__) == '{var:>{width}} {number:{fill}^{width}}'.format(**values)
+
+
+def test__split_field_name():
+    assert split_field_name('var') == ('var', ())
+    assert split_field_name('0') == (0, ())
+    assert split_field_name('CONST.x[0][key].y') == ('CONST', ((True, 'x'), (False, 0), (False, 'key'), (True, 'y')))
+    for field_name in ['var.', 'var[0', 'var[0]x', 'var[]']:
+        with tc.assertRaises(ValueError):
+            split_field_name(field_name)
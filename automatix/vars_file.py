@@ -0,0 +1,98 @@
+import json
+from csv import DictReader
+from pathlib import Path
+from typing import Iterator
+
+import yaml
+
+from .config import SCRIPT_FIELDS, ValidationError, check_vars_file_fields
+from .helpers import YAML_LOADER
+
+FORMATS = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+}
+
+
+def flatten_row(item, position: str) -> dict:
+    """Convert nested fields like {'vars': {'myvar': 1}} to the CSV notation {'vars:myvar': 1}"""
+    if not isinstance(item, dict):
+        raise ValidationError(f'{position}: Batch item has to be a mapping, got {type(item).__name__}.')
+    row = {}
+    for key, value in item.items():
+        if key in SCRIPT_FIELDS and isinstance(value, dict):
+            row.update({f'{key}:{name}': field_value for name, field_value in value.items()})
+        else:
+            row[key] = value
+    return row
+
+
+class VarsFile:
+    """
+    Batch items from a vars file (CSV, TSV, JSON lines or YAML documents).
+
+    The file is read lazily on every iteration, so the rows are not held in memory.
+    The field names are validated only once, for CSV/TSV this is the header.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = FORMATS.get(Path(path).suffix.lower(), 'csv')
+        self._count = None
+        self._checked_fields = set()
+
+    def __iter__(self) -> Iterator[dict]:
+        match self.format:
+            case 'csv':
+                rows = self._read_csv(delimiter=',')
+            case 'tsv':
+                rows = self._read_csv(delimiter='\t')
+            case 'jsonl':
+                rows = self._read_jsonl()
+            case _:
+                rows = self._read_yaml()
+
+        for row in rows:
+            if unchecked := row.keys() - self._checked_fields:
+                check_vars_file_fields(fields=unchecked, source=self.path)
+                self._checked_fields.update(unchecked)
+            yield row
+
+    def __len__(self) -> int:
+        # Counting reads the whole file once, which also validates all rows before the first one is executed
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+    @property
+    def fields(self) -> set[str]:
+        """Field names of all rows"""
+        len(self)  # Reads and validates all rows once
+        return self._checked_fields
+
+    def _read_csv(self, delimiter: str) -> Iterator[dict]:
+        with open(self.path, newline='') as file:
+            yield from DictReader(filter(lambda row: row[0] != '#', file), delimiter=delimiter)
+
+    def _read_jsonl(self) -> Iterator[dict]:
+        with open(self.path) as file:
+            for number, line in enumerate(file, start=1):
+                if not line.strip() or line.lstrip().startswith('#'):
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValidationError(f'{self.path}, line {number}: {exc}')
+                yield flatten_row(item, position=f'{self.path}, line {number}')
+
+    def _read_yaml(self) -> Iterator[dict]:
+        with open(self.path) as file:
+            for number, document in enumerate(yaml.load_all(file, Loader=YAML_LOADER), start=1):
+                if document is None:
+                    continue
+                for item in document if isinstance(document, list) else [document]:
+                    yield flatten_row(item, position=f'{self.path}, document {number}')
@@ -0,0 +1,46 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from automatix.config import ValidationError
+from automatix.vars_file import VarsFile
+
+tc = TestCase()
+
+
+def _vars_file(tempdir: str, name: str, content: str) -> VarsFile:
+    with open(f'{tempdir}/{name}', 'w') as f:
+        f.write(content)
+    return VarsFile(path=f'{tempdir}/{name}')
+
+
+def test__vars_file__formats():
+    expected = [
+        {'label': 'first', 'systems:mysystem': 'host1', 'vars:myvar': 'a'},
+        {'label': 'second', 'systems:mysystem': 'host2', 'vars:myvar': 'b'},
+    ]
+    with TemporaryDirectory() as tempdir:
+        for name, content in [
+            ('v.csv', '# comment\nlabel,systems:mysystem,vars:myvar\nfirst,host1,a\nsecond,host2,b\n'),
+            ('v.tsv', 'label\tsystems:mysystem\tvars:myvar\nfirst\thost1\ta\nsecond\thost2\tb\n'),
+            ('v.jsonl', '{"label": "first", "systems": {"mysystem": "host1"}, "vars:myvar": "a"}\n\n'
+                        '{"label": "second", "systems:mysystem": "host2", "vars": {"myvar": "b"}}\n'),
+            ('v.yaml', 'label: first\nsystems: {mysystem: host1}\nvars: {myvar: a}\n---\n'
+                       '- label: second\n  systems:mysystem: host2\n  vars:myvar: b\n'),
+        ]:
+            vars_file = _vars_file(tempdir=tempdir, name=name, content=content)
+            assert list(vars_file) == expected, name
+            assert len(vars_file) == 2, name
+            assert vars_file.fields == {'label', 'systems:mysystem', 'vars:myvar'}, name
+
+
+def test__vars_file__invalid_fields():
+    with TemporaryDirectory() as tempdir:
+        for name, content in [
+            ('v.csv', 'label,myvar\nfirst,a\n'),
+            ('v.csv', 'label,unknown:myvar\nfirst,a\n'),
+            ('v.jsonl', '{"label": "first", "vars:myvar": "a"}\n{"label": "second", "myvar": "b"}\n'),
+            ('v.yaml', '- just a string\n'),
+        ]:
+            vars_file = _vars_file(tempdir=tempdir, name=name, content=content)
+            with tc.assertRaises(ValidationError):
+                len(vars_file)
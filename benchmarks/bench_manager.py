@@ -0,0 +1,240 @@
+"""
+Benchmark for the manager of parallel processing at high item counts
+
+Drives `parallel.run_manage_loop` with a stub session backend instead of GNU screen: Every started
+item is simulated by a thread, which loads the pickled files like `automatix-from-file`, waits for the
+configured duration and reports its status to the manager. A subscriber stands in for the user interface.
+
+    python benchmarks/bench_manager.py --items 2000 --max-parallel 20 --duration 0.01
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import random
+import sys
+from argparse import Namespace
+from statistics import median, quantiles
+from tempfile import TemporaryDirectory
+from threading import Lock, Thread
+from time import perf_counter, sleep, thread_time, time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from automatix.parallel import Autos, get_socket_path, run_manage_loop  # noqa E402
+from automatix.parallel_runner import create_auto_files  # noqa E402
+from automatix.status_channel import StatusClient  # noqa E402
+
+
+class Timestamps:
+    """perf_counter timestamps per auto file, written from several threads"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.started: dict[str, float] = {}
+        self.finished: dict[str, float] = {}
+        self.published: dict[str, float] = {}
+
+    def record(self, kind: str, auto_file: str):
+        now = perf_counter()
+        with self.lock:
+            getattr(self, kind)[auto_file] = now
+
+
+class StubBackend:
+    """Session backend, which simulates the `automatix-from-file` processes with threads"""
+
+    manager_in_process = True
+
+    def __init__(self, tempdir: str, time_id: int, duration: float, jitter: float, user_input: float,
+                 timestamps: Timestamps):
+        self.tempdir = tempdir
+        self.socket_path = get_socket_path(tempdir=tempdir, time_id=time_id)
+        self.duration = duration
+        self.jitter = jitter
+        self.user_input = user_input
+        self.timestamps = timestamps
+        self.random = random.Random(42)
+
+    def start(self, session_name: str, label: str, cmd: list[str], logfile_path: str):
+        auto_file = cmd[-1]
+        self.timestamps.record('started', auto_file)
+        duration = max(0.0, self.random.uniform(self.duration - self.jitter, self.duration + self.jitter))
+        ask_user = self.random.random() < self.user_input
+        Thread(target=self._run_item, args=(auto_file, duration, ask_user), daemon=True).start()
+
+    def _run_item(self, auto_file: str, duration: float, ask_user: bool):
+        # Like parallel.run_auto
+        with open(f'{self.tempdir}/script', 'rb') as f:
+            pickle.load(file=f)
+        with open(f'{self.tempdir}/{auto_file}', 'rb') as f:
+            pickle.load(file=f)
+        client = StatusClient(socket_path=self.socket_path)
+        if ask_user:
+            client.send(auto_file=auto_file, status='user_input_add')
+            sleep(duration / 2)
+            client.send(auto_file=auto_file, status='user_input_remove')
+            sleep(duration / 2)
+        else:
+            sleep(duration)
+        os.unlink(f'{self.tempdir}/{auto_file}')
+        self.timestamps.record('finished', auto_file)
+        client.send(auto_file=auto_file, status='finished')
+        client.close()
+
+    def close(self):
+        return
+
+
+def subscribe(socket_path: str, timestamps: Timestamps):
+    """Stand-in for the user interface, records when the finished events arrive"""
+    client = StatusClient(socket_path=socket_path)
+    client.connect(retries=100, interval=0.01)
+    _, events = client.subscribe()
+    while events is not None:
+        for auto_file, status in events:
+            if status == 'finished':
+                timestamps.record('published', auto_file)
+        events = client.receive()
+    client.close()
+
+
+def read_io_counters() -> dict[str, int]:
+    """Characters and bytes read and written by this process (Linux only)"""
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f)}
+    except OSError:
+        return {}
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ms = sorted(value * 1000 for value in values)
+    p95 = quantiles(ms, n=20)[-1] if len(ms) > 1 else ms[0]
+    return {'median_ms': round(median(ms), 3), 'p95_ms': round(p95, 3), 'max_ms': round(ms[-1], 3)}
+
+
+def run_benchmark(items: int, max_parallel: int, duration: float, jitter: float, user_input: float) -> dict:
+    timestamps = Timestamps()
+    manager_cpu = {}
+
+    with TemporaryDirectory() as tempdir:
+        time_id = round(time())
+        os.mkfifo(f'{tempdir}/{time_id}_finished')
+        io_start = read_io_counters()
+
+        start = perf_counter()
+        create_auto_files(
+            script={'name': 'Benchmark', 'pipeline': [{'local': 'true'}]},
+            batch_items=[{'label': f'item {i}'} for i in range(items)],
+            args=Namespace(scriptfile='benchmark.yaml', profile=None),
+            tempdir=tempdir,
+            logfile_dir=tempdir,
+        )
+        create_duration = perf_counter() - start
+        tempdir_bytes = sum(entry.stat().st_size for entry in os.scandir(tempdir) if entry.is_file())
+
+        backend = StubBackend(
+            tempdir=tempdir, time_id=time_id, duration=duration, jitter=jitter, user_input=user_input,
+            timestamps=timestamps,
+        )
+        # Like the manager logger of the pty backend, but to a file only
+        log = logging.getLogger('automatix.benchmark.manager')
+        log.propagate = False
+        log.setLevel(logging.INFO)
+        handler = logging.FileHandler(f'{tempdir}/overview.log')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(handler)
+
+        def manage():
+            cpu_start = thread_time()
+            run_manage_loop(tempdir=tempdir, time_id=time_id, backend=backend, log=log)
+            manager_cpu['seconds'] = thread_time() - cpu_start
+
+        start = perf_counter()
+        manager = Thread(target=manage, daemon=True)
+        manager.start()
+        # Set the limit of concurrent items like the user interface does
+        ui = StatusClient(socket_path=get_socket_path(tempdir=tempdir, time_id=time_id))
+        ui.connect(retries=100, interval=0.01)
+        ui.send(auto_file=str(max_parallel), status='max_parallel')
+        subscriber = Thread(
+            target=subscribe,
+            kwargs={'socket_path': get_socket_path(tempdir=tempdir, time_id=time_id), 'timestamps': timestamps},
+            daemon=True,
+        )
+        subscriber.start()
+
+        with open(f'{tempdir}/{time_id}_finished') as fifo:
+            fifo.read()
+        wall = perf_counter() - start
+        manager.join()
+        ui.close()
+        log.removeHandler(handler)
+        handler.close()
+        io_end = read_io_counters()
+
+    # The manager starts items up to its default limit, before it gets our limit from the "user interface".
+    # Afterwards, the n-th started item takes the slot of the (n - max_parallel)-th finished item.
+    starts = sorted(timestamps.started.values())
+    finishes = sorted(timestamps.finished.values())
+    scheduling = [
+        starts[n] - finishes[n - max_parallel]
+        for n in range(max(Autos.max_parallel, max_parallel), len(starts))
+        if starts[n] >= finishes[n - max_parallel]
+    ]
+    propagation = [
+        timestamps.published[auto_file] - finished
+        for auto_file, finished in timestamps.finished.items() if auto_file in timestamps.published
+    ]
+
+    return {
+        'items': items,
+        'max_parallel': max_parallel,
+        'duration_s': duration,
+        'wall_s': round(wall, 3),
+        'ideal_wall_s': round(items / max_parallel * duration, 3),
+        'create_auto_files_s': round(create_duration, 3),
+        'tempdir_bytes': tempdir_bytes,
+        'io': {key: io_end[key] - io_start[key] for key in io_end if key in io_start},
+        'manager_cpu_s': round(manager_cpu.get('seconds', 0.0), 3),
+        'manager_cpu_per_item_ms': round(manager_cpu.get('seconds', 0.0) / items * 1000, 3),
+        'scheduling_latency': summarize(scheduling),
+        'status_propagation': summarize(propagation),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the manager of parallel processing')
+    parser.add_argument('--items', '-n', type=int, default=2000, help='Number of auto files (default: 2000)')
+    parser.add_argument('--max-parallel', '-p', type=int, default=20, help='Concurrent items (default: 20)')
+    parser.add_argument('--duration', type=float, default=0.01, help='Seconds per item (default: 0.01)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random deviation of the duration in seconds')
+    parser.add_argument(
+        '--user-input',
+        type=float,
+        default=0.0,
+        help='Fraction of items, which report waiting for user input for half of their duration (default: 0)',
+    )
+    parser.add_argument('--json', metavar='PATH', help='Write the results as JSON to PATH')
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        items=args.items,
+        max_parallel=args.max_parallel,
+        duration=args.duration,
+        jitter=args.jitter,
+        user_input=args.user_input,
+    )
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""
+Benchmark for the time Automatix adds per step
+
+Runs synthetic scripts with many trivial steps as separate automatix processes and reports
+the startup time, the time per step, the overhead per step (without the time to spawn the command
+itself) and the peak memory. Remote commands use benchmarks/fake_ssh.sh instead of ssh.
+The time per step is measured inside the automatix process, excluding the startup.
+
+    python benchmarks/bench_steps.py --save-baseline baseline.json
+    python benchmarks/bench_steps.py --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from automatix.resources import run_with_usage  # noqa E402
+
+FAKE_SSH = f'{BENCH_DIR}/fake_ssh.sh'
+
+# Runs automatix and writes the time spent in the batch items (all pipelines) to BENCH_TIMING_FILE,
+# so the time per step does not depend on the much noisier startup time.
+RUNNER = """
+import os
+from time import perf_counter
+import automatix
+
+run_batch_items = automatix.run_batch_items
+
+
+def timed_run_batch_items(**kwargs):
+    start = perf_counter()
+    try:
+        run_batch_items(**kwargs)
+    finally:
+        with open(os.environ['BENCH_TIMING_FILE'], 'w') as f:
+            f.write(str(perf_counter() - start))
+
+
+automatix.run_batch_items = timed_run_batch_items
+automatix.main()
+"""
+
+# scenario -> (step, precommands)
+SCENARIOS = {
+    'local': ({'local': 'true'}, None),
+    'local_precommand': ({'local': 'f'}, {'local': 'f() { :; }'}),
+    'local_assignment': ({'out=local': 'echo {myvar}'}, None),
+    'local_condition': ({'cond?local': 'true'}, None),
+    'python': ({'python': 'x = 1'}, None),
+    'python_assignment': ({'out=python': '"{myvar}".upper()'}, None),
+    'python_condition': ({'cond?python': 'x = 1'}, None),
+    'remote': ({'remote@benchhost': 'true'}, None),
+    'remote_precommand': ({'remote@benchhost': 'f'}, {'remote': 'f() { :; }'}),
+    'remote_assignment': ({'out=remote@benchhost': 'echo {myvar}'}, None),
+}
+
+# Differences below these values are considered as noise, when comparing with a baseline
+NOISE_FLOOR = {'startup_ms': 20, 'per_step_ms': 0.05, 'max_rss_kib': 2048}
+
+# Commands spawned by a step, to subtract their own costs from the time per step
+SPAWNED = {
+    'local': ['/bin/bash', '-c', 'true'],
+    'remote': ['/bin/bash', '-c', f'{FAKE_SSH} -t benchhost "RUNNING_INSIDE_AUTOMATIX=1 bash -c true"'],
+}
+
+
+def write_script(path: str, steps: list[dict], precommands: dict | None = None):
+    script = {
+        'name': 'Benchmark',
+        'systems': {'benchhost': 'benchhost'},
+        'vars': {'myvar': 'value', 'cond': 'yes'},
+        'pipeline': steps,
+    }
+    if precommands:
+        script['precommands'] = precommands
+    with open(path, 'w') as f:
+        yaml.safe_dump(script, f)
+
+
+def run_automatix(script_path: str, env: dict) -> (float, float, int):
+    """
+    Run automatix in a separate process
+
+    :return: wall time, time spent in the pipelines and peak memory (KiB)
+    """
+    timing_file = f'{script_path}.timing'
+    start = perf_counter()
+    proc, usage = run_with_usage(
+        [sys.executable, '-c', RUNNER, script_path],
+        env=env | {'BENCH_TIMING_FILE': timing_file},
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    duration = perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f'automatix failed with exit code {proc.returncode} for {script_path}')
+    with open(timing_file) as f:
+        pipelines = float(f.read())
+    return duration, pipelines, usage.max_rss
+
+
+def measure(script_path: str, env: dict, repeat: int) -> (float, float, int):
+    """Minimum times and maximum peak memory of several runs (after one warm-up run)"""
+    run_automatix(script_path=script_path, env=env)  # Fills the script cache
+    results = [run_automatix(script_path=script_path, env=env) for _ in range(repeat)]
+    return tuple(agg(values) for agg, values in zip([min, min, max], zip(*results)))
+
+
+def spawn_time(cmd: list[str], repeat: int = 50) -> float:
+    """Median time to spawn and wait for a command, which a step executes"""
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+        durations.append(perf_counter() - start)
+    return median(durations)
+
+
+def run_benchmarks(steps: int, repeat: int, scenarios: list[str]) -> dict:
+    spawn = {kind: spawn_time(cmd=cmd) for kind, cmd in SPAWNED.items()}
+
+    with TemporaryDirectory() as tempdir:
+        env = os.environ | {
+            'PYTHONPATH': os.pathsep.join([REPO_DIR, os.environ.get('PYTHONPATH', '')]),
+            'AUTOMATIX_SCRIPT_DIR': tempdir,
+            'AUTOMATIX_CACHE_DIR': f'{tempdir}/cache',
+            'AUTOMATIX_SSH_CMD': f'{FAKE_SSH} -t {{hostname}} ',  # With -t to avoid the configuration warning
+            'AUTOMATIX_PROGRESS_BAR': 'false',
+        }
+        env.pop('AUTOMATIX_TIME', None)
+
+        write_script(path=f'{tempdir}/empty.yaml', steps=[{'python': 'pass'}])
+        startup, _, startup_rss = measure(script_path=f'{tempdir}/empty.yaml', env=env, repeat=repeat)
+        results = {'startup_ms': round(startup * 1000, 2), 'startup_max_rss_kib': startup_rss, 'scenarios': {}}
+
+        for name in scenarios:
+            step, precommands = SCENARIOS[name]
+            script_path = f'{tempdir}/{name}.yaml'
+            write_script(path=script_path, steps=[step] * steps, precommands=precommands)
+            _, pipelines, max_rss = measure(script_path=script_path, env=env, repeat=repeat)
+
+            per_step = pipelines / steps
+            spawned = spawn.get(name.split('_')[0], 0.0)
+            results['scenarios'][name] = {
+                'per_step_ms': round(per_step * 1000, 3),
+                'overhead_ms': round((per_step - spawned) * 1000, 3),
+                'max_rss_kib': max_rss,
+            }
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print the differences to the baseline and return the regressions"""
+    regressions = []
+
+    def check(name: str, key: str, value: float, base: float | None):
+        if base is None:
+            print(f'{name:45} {value:>10}  (not in baseline)')
+            return
+        change = (value - base) / base * 100 if base else 0.0
+        flag = ''
+        if change > threshold and value - base > NOISE_FLOOR[key]:
+            flag = '  <-- REGRESSION'
+            regressions.append(name)
+        print(f'{name:45} {value:>10}  baseline {base:>10}  {change:+6.1f}%{flag}')
+
+    check('startup_ms', 'startup_ms', results['startup_ms'], baseline.get('startup_ms'))
+    check('startup_max_rss_kib', 'max_rss_kib', results['startup_max_rss_kib'], baseline.get('startup_max_rss_kib'))
+    for name, values in results['scenarios'].items():
+        base_values = baseline.get('scenarios', {}).get(name, {})
+        for key in ['per_step_ms', 'max_rss_kib']:
+            check(f'{name}.{key}', key, values[key], base_values.get(key))
+    return regressions
+
+
+def print_results(results: dict):
+    print(f'Startup: {results["startup_ms"]} ms, max RSS {results["startup_max_rss_kib"]} KiB')
+    print(f'{"scenario":20} {"per step ms":>12} {"overhead ms":>12} {"max RSS KiB":>12}')
+    for name, values in results['scenarios'].items():
+        print(f'{name:20} {values["per_step_ms"]:>12} {values["overhead_ms"]:>12} {values["max_rss_kib"]:>12}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the per step overhead of Automatix')
+    parser.add_argument('--steps', '-n', type=int, default=200, help='Steps per script (default: 200)')
+    parser.add_argument('--repeat', '-r', type=int, default=3, help='Runs per script, the fastest counts (default: 3)')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS.keys(), default=list(SCENARIOS.keys()))
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write the results as JSON to PATH')
+    parser.add_argument('--baseline', metavar='PATH', help='Compare with the results in PATH')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=25,
+        help='Exit with return code 1, if a value is more than THRESHOLD percent (and more than the noise floor)'
+             ' worse than the baseline (default: 25)',
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(steps=args.steps, repeat=args.repeat, scenarios=args.scenarios)
+    print_results(results=results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Baseline written to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        if regressions := compare(results=results, baseline=baseline, threshold=args.threshold):
+            print(f'{len(regressions)} regressions above {args.threshold}%')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ with open("README.md", "r") as fh:
 
 setup(
     name='automatix',
-    version='3.2.0',
+    version='3.3.0',
     description='Automation wrapper for bash and python commands',
     keywords=['bash', 'shell', 'command', 'automation', 'process', 'wrapper', 'devops', 'system administration'],
     long_description=long_description,
@@ -28,6 +28,7 @@ setup(
             'automatix=automatix:main',
             'automatix-manager=automatix.parallel:run_manager',
             'automatix-from-file=automatix.parallel:run_auto_from_file',
+            'automatix-lint=automatix.lint:run_lint',
         ],
     },
     classifiers=[